@@ -0,0 +1,122 @@
+"""File size and query times with document text inline versus compressed in document_contents.
+
+Builds two scratch SQLite databases with the same synthetic corpus: the old
+layout (uncompressed content_text column in documents) and the new one
+(compressed body in a separate table, see DocumentContent), then times the
+queries listing, statistics and search run:
+
+    python benchmarks/content_storage.py --documents 2000 --words 3000 --codec zlib
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.document import TEXT_CODECS, compress_text, decompress_text  # noqa: E402
+
+WORDS = ('market analysis revenue growth software deployment research methodology learning data system '
+         'report quarterly customer security architecture experiment accuracy model training').split()
+PREVIEW_LENGTH = 200
+
+QUERIES = {
+    'listing page': "SELECT id, title, file_size, upload_date, classification FROM documents "
+                    "ORDER BY upload_date DESC LIMIT 50",
+    'full listing': "SELECT id, title, file_size, upload_date, classification FROM documents",
+    'aggregate': "SELECT classification, COUNT(*), SUM(file_size) FROM documents GROUP BY classification",
+    'unindexed filter': "SELECT COUNT(*) FROM documents WHERE filename LIKE '%7.pdf'",
+}
+
+
+def corpus(documents, words):
+    rng = random.Random(1)
+    for i in range(documents):
+        yield i + 1, f'Document {i}', ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def build(path, layout, documents, words, codec):
+    connection = sqlite3.connect(path)
+    inline = layout == 'inline'
+    connection.execute(f"""CREATE TABLE documents (
+        id INTEGER PRIMARY KEY, title VARCHAR(500), filename VARCHAR(255), file_size INTEGER,
+        upload_date DATETIME, classification VARCHAR(100){', content_text TEXT' if inline else ''})""")
+    connection.execute("CREATE INDEX ix_documents_upload_date ON documents (upload_date)")
+    if not inline:
+        connection.execute("""CREATE TABLE document_contents (
+            document_id INTEGER PRIMARY KEY, codec VARCHAR(10), body BLOB, length INTEGER, preview VARCHAR(200))""")
+    for document_id, title, text in corpus(documents, words):
+        row = (document_id, title, f'd{document_id}.pdf', len(text), f'2024-01-01 00:{document_id % 60:02d}:00',
+               ('Business', 'Technical', 'Academic')[document_id % 3])
+        if inline:
+            connection.execute("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?)", row + (text,))
+        else:
+            connection.execute("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)", row)
+            connection.execute("INSERT INTO document_contents VALUES (?, ?, ?, ?, ?)",
+                               (document_id, codec, compress_text(text, codec), len(text), text[:PREVIEW_LENGTH]))
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.close()
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def measure(path, layout, repeat):
+    connection = sqlite3.connect(path)
+    results = {name: timed(lambda: connection.execute(sql).fetchall(), repeat) for name, sql in QUERIES.items()}
+
+    ids = [row[0] for row in connection.execute("SELECT id FROM documents ORDER BY id LIMIT 50")]
+    placeholders = ','.join('?' * len(ids))
+    if layout == 'inline':
+        def fetch_text():
+            connection.execute(f"SELECT id, content_text FROM documents WHERE id IN ({placeholders})", ids).fetchall()
+    else:
+        def fetch_text():
+            rows = connection.execute(f"SELECT document_id, body, codec FROM document_contents "
+                                      f"WHERE document_id IN ({placeholders})", ids).fetchall()
+            [decompress_text(body, codec) for _, body, codec in rows]
+    results['50 texts'] = timed(fetch_text, repeat)
+    connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=3000)
+    parser.add_argument('--codec', choices=TEXT_CODECS, default='zlib')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='content-bench-')
+    try:
+        report = {}
+        for layout in ('inline', args.codec):
+            path = os.path.join(directory, f'{layout}.db')
+            build(path, layout, args.documents, args.words, args.codec)
+            report[layout] = dict(measure(path, layout, args.repeat), size_mb=os.path.getsize(path) / 1048576)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    layouts = list(report)
+    print(f"{args.documents} documents of {args.words} words (best of {args.repeat} runs)")
+    print(f"{'':<22}" + ''.join(f'{layout:>12}' for layout in layouts))
+    print(f"{'file size (MB)':<22}" + ''.join(f"{report[layout]['size_mb']:>12.1f}" for layout in layouts))
+    for name in list(QUERIES) + ['50 texts']:
+        print(f"{name + ' (ms)':<22}" + ''.join(f'{report[layout][name]:>12.2f}' for layout in layouts))
+
+
+if __name__ == '__main__':
+    main()
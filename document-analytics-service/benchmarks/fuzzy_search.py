@@ -0,0 +1,101 @@
+"""Cost of fuzzy search over exact search on the inverted index, and of a full vocabulary scan.
+
+Indexes a synthetic corpus with a large vocabulary in a scratch directory,
+then times exact queries, fuzzy queries (trigram candidates verified with a
+bounded edit distance, see InvertedIndex.expand_term) and, for comparison,
+checking the edit distance of every vocabulary term:
+
+    python benchmarks/fuzzy_search.py --documents 2000 --words 500 --vocabulary 50000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import string
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.search_index import InvertedIndex, auto_distance, bounded_levenshtein, tokenize  # noqa: E402
+
+
+def make_vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))))
+    return sorted(words)
+
+
+def misspell(word, rng):
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+def timed(function, queries, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            function(query)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=500)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    directory = tempfile.mkdtemp(prefix='fuzzy-bench-')
+    try:
+        index = InvertedIndex(directory)
+        index.rebuild((i + 1, f'Document {i}', ' '.join(rng.choice(vocabulary) for _ in range(args.words)), None)
+                      for i in range(args.documents))
+        terms = [term for term in index._postings if len(term) >= 4]
+        targets = [rng.choice(terms) for _ in range(args.queries)]
+        exact_queries = targets
+        typo_queries = [misspell(word, rng) for word in targets]
+
+        # Built by rebuild() and load(); timed again here on its own
+        index._trigrams = None
+        start = time.perf_counter()
+        index._trigram_index()
+        trigram_build_ms = (time.perf_counter() - start) * 1000
+
+        def scan(query):
+            token = tokenize(query)[0]
+            distance = auto_distance(token)
+            return [term for term in index._postings if bounded_levenshtein(token, term, distance) is not None]
+
+        found = sum(1 for query, target in zip(typo_queries, targets)
+                    if query == target or target in index.fuzzy_terms(query, max_distance='auto'))
+        results = {
+            'exact': timed(index.search, exact_queries, args.repeat),
+            'fuzzy (typo)': timed(lambda query: index.search(query, max_distance='auto'), typo_queries,
+                                  args.repeat),
+            'fuzzy (exact word)': timed(lambda query: index.search(query, max_distance='auto'), exact_queries,
+                                        args.repeat),
+            'substring': timed(lambda query: index.search(query[1:-1]), exact_queries, args.repeat),
+            'vocabulary scan': timed(scan, typo_queries[:max(1, args.queries // 10)], 1),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"{args.documents} documents, {len(index._postings)} indexed terms, {args.queries} queries")
+    print(f"trigram index built in {trigram_build_ms:.0f} ms when the index is loaded or rebuilt")
+    print(f"misspelled words whose original was found: {found}/{len(typo_queries)}")
+    for name, milliseconds in results.items():
+        print(f"{name + ' (ms/query)':<28}{milliseconds:>10.3f}{milliseconds / results['exact']:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
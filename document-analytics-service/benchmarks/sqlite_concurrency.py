@@ -0,0 +1,143 @@
+"""Read throughput and latency of SQLite while a writer commits continuously.
+
+Compares the previous default setup (rollback journal, one engine) with the
+storage layer in src/utils/storage.py (WAL, busy timeout, tuned pragmas and a
+separate read-only engine) on a scratch database:
+
+    python benchmarks/sqlite_concurrency.py --documents 5000 --seconds 3 --readers 1,2,4,8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.storage import create_read_engine, install_pragmas, sqlite_pragmas  # noqa: E402
+
+CONFIG = {
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_CACHE_SIZE_KB': 64 * 1024,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+    'SQLITE_READ_POOL_SIZE': 16,
+    'SQLITE_READ_MAX_OVERFLOW': 0,
+}
+BODY = ('market analysis revenue growth software deployment research methodology ' * 30).strip()
+# Listing page and the statistics-style aggregate the read endpoints run
+READ_QUERIES = [
+    text("SELECT id, title, file_size, upload_date FROM documents ORDER BY upload_date DESC, id DESC LIMIT 50"),
+    text("SELECT classification, COUNT(*), SUM(file_size) FROM documents GROUP BY classification"),
+]
+
+
+def create_database(path, documents):
+    engine = create_engine(f'sqlite:///{path}')
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        connection.execute(text("""CREATE TABLE documents (
+            id INTEGER PRIMARY KEY, title VARCHAR(500), file_size INTEGER, upload_date DATETIME,
+            classification VARCHAR(100), content_text TEXT)"""))
+        connection.execute(text("CREATE INDEX ix_documents_upload_date ON documents (upload_date)"))
+        connection.execute(text("CREATE INDEX ix_documents_classification ON documents (classification)"))
+        connection.execute(text("INSERT INTO documents (title, file_size, upload_date, classification, content_text) "
+                                "VALUES (:title, :size, :date, :classification, :body)"), [
+            {'title': f'Document {i}', 'size': 1000 + i, 'date': start + timedelta(minutes=i),
+             'classification': ('Business', 'Technical', 'Academic')[i % 3], 'body': BODY}
+            for i in range(documents)
+        ])
+    engine.dispose()
+
+
+def build_engines(path, tuned, readers):
+    if not tuned:
+        engine = create_engine(f'sqlite:///{path}', connect_args={'check_same_thread': False},
+                               pool_size=readers + 1, max_overflow=0)
+        return engine, engine
+    write_engine = create_engine(f'sqlite:///{path}', pool_size=1, max_overflow=0, connect_args={
+        'check_same_thread': False, 'timeout': CONFIG['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0})
+    install_pragmas(write_engine, sqlite_pragmas(CONFIG))
+    with write_engine.connect():
+        pass
+    return write_engine, create_read_engine(path, dict(CONFIG, SQLITE_READ_POOL_SIZE=readers))
+
+
+def run(path, tuned, readers, seconds):
+    write_engine, read_engine = build_engines(path, tuned, readers)
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    errors = [0] * readers
+    writes = [0]
+
+    def writer():
+        while not stop.is_set():
+            with write_engine.begin() as connection:
+                connection.execute(text("INSERT INTO documents (title, file_size, upload_date, classification, "
+                                        "content_text) VALUES ('new', 1, :date, 'Business', :body)"),
+                                   {'date': datetime.utcnow(), 'body': BODY})
+            writes[0] += 1
+
+    def reader(slot):
+        position = slot
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with read_engine.connect() as connection:
+                    connection.execute(READ_QUERIES[position % len(READ_QUERIES)]).fetchall()
+                latencies[slot].append(time.perf_counter() - start)
+            except Exception:
+                errors[slot] += 1
+            position += 1
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(slot,))
+                                                   for slot in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    samples = sorted(latency for slot in latencies for latency in slot)
+    p95 = samples[int(len(samples) * 0.95)] if samples else 0.0
+    return {
+        'reads_per_second': len(samples) / seconds,
+        'p95_ms': p95 * 1000,
+        'max_ms': (samples[-1] if samples else 0.0) * 1000,
+        'read_errors': sum(errors),
+        'writes_per_second': writes[0] / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--documents', type=int, default=5000)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--readers', default='1,2,4,8')
+    args = parser.parse_args()
+
+    print(f"{'setup':<10}{'readers':>8}{'reads/s':>10}{'p95 ms':>9}{'max ms':>9}{'errors':>8}{'writes/s':>10}")
+    for tuned in (False, True):
+        for readers in [int(value) for value in args.readers.split(',')]:
+            directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+            try:
+                path = os.path.join(directory, 'bench.db')
+                create_database(path, args.documents)
+                result = run(path, tuned, readers, args.seconds)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            print(f"{'wal' if tuned else 'default':<10}{readers:>8}{result['reads_per_second']:>10.0f}"
+                  f"{result['p95_ms']:>9.1f}{result['max_ms']:>9.1f}{result['read_errors']:>8}"
+                  f"{result['writes_per_second']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
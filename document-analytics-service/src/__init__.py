@@ -1,29 +1,131 @@
-import os
-from flask import Flask
-from flask_cors import CORS
-from src.models.user import db
-from src.routes.user import user_bp
-from src.routes.document import document_bp
-
-def create_app():
-    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-    app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-    db.init_app(app)
-    CORS(app)
-
-    app.register_blueprint(user_bp, url_prefix='/api')
-    app.register_blueprint(document_bp, url_prefix='/api')
-
-    # Add route for document interface
-    @app.route('/')
-    def index():
-        return app.send_static_file('documents.html')
-
-    with app.app_context():
-        db.create_all()
-
-    return app
+import os
+from flask import Flask
+from flask_cors import CORS
+from src.models.user import db
+from src.models.migrations import backfill_document_pages, migrate_document_content, upgrade_schema
+from src.routes.user import user_bp
+from src.routes.document import document_bp, ingestion_queue
+from src.utils.fts import ensure_fts_index
+from src.utils.near_duplicates import backfill_signatures
+from src.utils.similarity import backfill_vectors, prune_vector_deletions
+from src.utils.statistics import ensure_statistics
+from src.utils.storage import configure_storage, init_storage
+
+def create_app():
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
+    # Uploads are streamed to disk UPLOAD_CHUNK_SIZE bytes at a time
+    app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 64 * 1024))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # SQLite storage: WAL journaling so readers are not blocked by writers, a busy timeout instead
+    # of immediate "database is locked" errors, per-connection cache and mmap sizes, and pooled
+    # connections. Search, listing and statistics read through a separate read-only engine
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 5))
+    app.config['SQLITE_MAX_OVERFLOW'] = int(os.environ.get('SQLITE_MAX_OVERFLOW', 5))
+    app.config['SQLITE_READ_POOL_SIZE'] = int(os.environ.get('SQLITE_READ_POOL_SIZE', 10))
+    app.config['SQLITE_READ_MAX_OVERFLOW'] = int(os.environ.get('SQLITE_READ_MAX_OVERFLOW', 10))
+    app.config['SQLITE_READ_ONLY_ENGINE'] = os.environ.get('SQLITE_READ_ONLY_ENGINE', 'true').lower() == 'true'
+
+    # Extracted text is stored compressed in document_contents with DOCUMENT_TEXT_CODEC (zlib or lzma);
+    # rows keep the codec they were written with, so changing it only affects new documents
+    app.config['DOCUMENT_TEXT_CODEC'] = os.environ.get('DOCUMENT_TEXT_CODEC', 'zlib')
+
+    # Page-parallel PDF extraction: PDFs with at least PDF_PARALLEL_PAGE_THRESHOLD pages are
+    # split into PDF_PAGES_PER_CHUNK page chunks and extracted on a process pool
+    app.config['PDF_EXTRACTION_WORKERS'] = int(os.environ.get('PDF_EXTRACTION_WORKERS', os.cpu_count() or 1))
+    app.config['PDF_PARALLEL_PAGE_THRESHOLD'] = int(os.environ.get('PDF_PARALLEL_PAGE_THRESHOLD', 50))
+    app.config['PDF_PAGES_PER_CHUNK'] = int(os.environ.get('PDF_PAGES_PER_CHUNK', 16))
+
+    # Background ingestion: /api/upload?async=true returns 202 and a job id; uploads get
+    # 429 once INGESTION_MAX_PENDING jobs are queued or running. A running job whose worker has not
+    # renewed its lease for INGESTION_LEASE_SECONDS is requeued
+    app.config['INGESTION_WORKERS'] = int(os.environ.get('INGESTION_WORKERS', 2))
+    app.config['INGESTION_MAX_PENDING'] = int(os.environ.get('INGESTION_MAX_PENDING', 100))
+    app.config['INGESTION_LEASE_SECONDS'] = float(os.environ.get('INGESTION_LEASE_SECONDS', 60))
+    app.config['INGESTION_ASYNC_UPLOADS'] = os.environ.get('INGESTION_ASYNC_UPLOADS', 'false').lower() == 'true'
+
+    # Batch uploads: files are extracted on BATCH_WORKERS processes and inserted
+    # BATCH_COMMIT_SIZE documents per transaction
+    app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', os.cpu_count() or 1))
+    app.config['BATCH_COMMIT_SIZE'] = int(os.environ.get('BATCH_COMMIT_SIZE', 200))
+    app.config['BATCH_MAX_ARCHIVE_BYTES'] = int(os.environ.get('BATCH_MAX_ARCHIVE_BYTES', 500 * 1024 * 1024))
+
+    # Search snippets: default and maximum number of ranked contexts per hit and lines of context
+    app.config['SEARCH_SNIPPETS_PER_DOCUMENT'] = int(os.environ.get('SEARCH_SNIPPETS_PER_DOCUMENT', 5))
+    app.config['SEARCH_MAX_SNIPPETS'] = int(os.environ.get('SEARCH_MAX_SNIPPETS', 50))
+    app.config['SEARCH_CONTEXT_LINES'] = int(os.environ.get('SEARCH_CONTEXT_LINES', 1))
+    app.config['SEARCH_MAX_CONTEXT_LINES'] = int(os.environ.get('SEARCH_MAX_CONTEXT_LINES', 10))
+
+    # Page-granular search: page_hits searches load the SEARCH_PAGES_PER_DOCUMENT best matching pages
+    # of each hit (at most SEARCH_MAX_PAGES_PER_DOCUMENT); /api/document/<id>/pages returns at most
+    # DOCUMENT_MAX_PAGES_PER_REQUEST pages per call
+    app.config['SEARCH_PAGES_PER_DOCUMENT'] = int(os.environ.get('SEARCH_PAGES_PER_DOCUMENT', 3))
+    app.config['SEARCH_MAX_PAGES_PER_DOCUMENT'] = int(os.environ.get('SEARCH_MAX_PAGES_PER_DOCUMENT', 20))
+    app.config['DOCUMENT_MAX_PAGES_PER_REQUEST'] = int(os.environ.get('DOCUMENT_MAX_PAGES_PER_REQUEST', 50))
+
+    # Fuzzy search (fuzzy=true|auto|<edits>, infix=true): each query word expands to at most
+    # SEARCH_FUZZY_MAX_EXPANSIONS indexed words within SEARCH_FUZZY_MAX_DISTANCE edits
+    app.config['SEARCH_FUZZY_MAX_DISTANCE'] = int(os.environ.get('SEARCH_FUZZY_MAX_DISTANCE', 2))
+    app.config['SEARCH_FUZZY_MAX_EXPANSIONS'] = int(os.environ.get('SEARCH_FUZZY_MAX_EXPANSIONS', 50))
+
+    # Trained classifier models (one directory per version plus a CURRENT pointer); defaults to
+    # src/database/models, and the default model is trained there on first use
+    if os.environ.get('CLASSIFIER_MODEL_DIR'):
+        app.config['CLASSIFIER_MODEL_DIR'] = os.environ['CLASSIFIER_MODEL_DIR']
+
+    # Online classifier trained by /api/classifier/train and /api/classifier/feedback: hash space
+    # size (memory is bounded by this, not the vocabulary) and how many trained versions to keep
+    app.config['CLASSIFIER_HASH_FEATURES'] = int(os.environ.get('CLASSIFIER_HASH_FEATURES', 2 ** 17))
+    app.config['CLASSIFIER_KEEP_VERSIONS'] = int(os.environ.get('CLASSIFIER_KEEP_VERSIONS', 5))
+
+    # /api/classify reads, classifies and updates CLASSIFY_BATCH_SIZE documents per chunk
+    app.config['CLASSIFY_BATCH_SIZE'] = int(os.environ.get('CLASSIFY_BATCH_SIZE', 500))
+
+    # Search result cache: LRU of SEARCH_CACHE_SIZE responses, each valid for SEARCH_CACHE_TTL
+    # seconds and only for the corpus version it was computed against (0 disables the cache)
+    app.config['SEARCH_CACHE_SIZE'] = int(os.environ.get('SEARCH_CACHE_SIZE', 256))
+    app.config['SEARCH_CACHE_TTL'] = float(os.environ.get('SEARCH_CACHE_TTL', 300))
+
+    # Search log: searches are buffered in memory and written by a background thread every
+    # SEARCH_LOG_FLUSH_SIZE events or SEARCH_LOG_FLUSH_INTERVAL seconds; beyond SEARCH_LOG_MAX_BUFFER
+    # buffered events SEARCH_LOG_OVERFLOW (drop_oldest or drop_newest) decides which are lost.
+    # SEARCH_LOG_ASYNC=false writes each search synchronously as before
+    app.config['SEARCH_LOG_ASYNC'] = os.environ.get('SEARCH_LOG_ASYNC', 'true').lower() == 'true'
+    app.config['SEARCH_LOG_FLUSH_SIZE'] = int(os.environ.get('SEARCH_LOG_FLUSH_SIZE', 100))
+    app.config['SEARCH_LOG_FLUSH_INTERVAL'] = float(os.environ.get('SEARCH_LOG_FLUSH_INTERVAL', 1.0))
+    app.config['SEARCH_LOG_MAX_BUFFER'] = int(os.environ.get('SEARCH_LOG_MAX_BUFFER', 10000))
+    app.config['SEARCH_LOG_OVERFLOW'] = os.environ.get('SEARCH_LOG_OVERFLOW', 'drop_oldest')
+
+    configure_storage(app)
+    db.init_app(app)
+    init_storage(app)
+    CORS(app)
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(document_bp, url_prefix='/api')
+
+    # Add route for document interface
+    @app.route('/')
+    def index():
+        return app.send_static_file('documents.html')
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db)
+        migrate_document_content(db)
+        backfill_document_pages(db)
+        ensure_fts_index(db.engine)
+        backfill_signatures()
+        backfill_vectors()
+        prune_vector_deletions()
+        ensure_statistics()
+        ingestion_queue.resume_pending()
+
+    return app
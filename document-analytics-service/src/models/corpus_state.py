@@ -0,0 +1,56 @@
+from datetime import datetime
+from src.models.user import db
+
+class CorpusState(db.Model):
+    """Single-row table holding a version number that changes whenever the searchable corpus does.
+
+    Mutations bump the version once their changes are committed and indexed.
+    Caches key their entries by version, so they notice changes made by any
+    process without explicit invalidation.
+    """
+    __tablename__ = 'corpus_state'
+
+    ROW_ID = 1
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Stored similarity vectors are versioned on their own, so relabelling documents does not
+    # invalidate them; vector deletions at or below vectors_floor are no longer logged
+    vectors_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    vectors_floor = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    @classmethod
+    def current_version(cls):
+        version = db.session.query(cls.version).filter(cls.id == cls.ROW_ID).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls):
+        """Increment the corpus version in the current transaction; the caller commits"""
+        updated = cls.query.filter_by(id=cls.ROW_ID).update({
+            'version': cls.version + 1,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(cls(id=cls.ROW_ID, version=1))
+
+    @classmethod
+    def vector_versions(cls):
+        """(vectors_version, vectors_floor) of the stored similarity vectors"""
+        row = db.session.query(cls.vectors_version, cls.vectors_floor).filter(cls.id == cls.ROW_ID).first()
+        return (row.vectors_version or 0, row.vectors_floor or 0) if row else (0, 0)
+
+    @classmethod
+    def bump_vectors(cls, reset=False):
+        """Increment the vector version in the current transaction and return it; the caller commits.
+
+        reset also raises the floor to the new version, for when every vector was replaced.
+        """
+        values = {'vectors_version': cls.vectors_version + 1}
+        if reset:
+            values['vectors_floor'] = cls.vectors_version + 1
+        if not cls.query.filter_by(id=cls.ROW_ID).update(values, synchronize_session=False):
+            db.session.add(cls(id=cls.ROW_ID, version=0, vectors_version=1, vectors_floor=1 if reset else 0))
+            db.session.flush()
+        return db.session.query(cls.vectors_version).filter(cls.id == cls.ROW_ID).scalar()
@@ -1,22 +1,114 @@
+import json
+import lzma
+import zlib
 from datetime import datetime
 from src.models.user import db
 
+TEXT_CODECS = ('zlib', 'lzma')
+DEFAULT_TEXT_CODEC = 'zlib'
+
+
+def compress_text(text, codec=DEFAULT_TEXT_CODEC):
+    data = (text or '').encode('utf-8')
+    if codec == 'lzma':
+        return lzma.compress(data, preset=6)
+    if codec == 'zlib':
+        return zlib.compress(data, 6)
+    raise ValueError(f'Unknown text codec {codec}')
+
+
+def decompress_text(body, codec):
+    """Inverse of compress_text; also registered as the document_text() SQL function"""
+    if body is None:
+        return None
+    if codec == 'lzma':
+        return lzma.decompress(body).decode('utf-8')
+    return zlib.decompress(body).decode('utf-8')
+
+
+def page_offsets(pages):
+    """Start offset of each page within the document text, which extraction builds as
+    "\n".join of the non-empty pages, stripped"""
+    offsets = []
+    position = 0
+    for page_text in pages:
+        offsets.append(position)
+        if page_text:
+            position += len(page_text) + 1
+    joined = "\n".join(page_text for page_text in pages if page_text)
+    leading = len(joined) - len(joined.lstrip())
+    return [max(0, offset - leading) for offset in offsets]
+
 class Document(db.Model):
     __tablename__ = 'documents'
     
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(500), nullable=False)
+    title = db.Column(db.String(500), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
-    file_size = db.Column(db.Integer, nullable=False)
-    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    content_text = db.Column(db.Text)
-    classification = db.Column(db.String(100))
+    file_size = db.Column(db.Integer, nullable=False, index=True)
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    classification = db.Column(db.String(100), index=True)
     classification_confidence = db.Column(db.Float)
-    author = db.Column(db.String(255))
+    classifier_version = db.Column(db.String(64), index=True)
+    # 'model' for predicted labels, 'user' for labels given through /api/classifier/feedback
+    classification_source = db.Column(db.String(20), index=True)
+    author = db.Column(db.String(255), index=True)
     creation_date = db.Column(db.DateTime)
     last_modified = db.Column(db.DateTime)
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the uploaded bytes
     
+    # Extracted text lives compressed in document_contents and is only loaded when accessed
+    content = db.relationship('DocumentContent', uselist=False, lazy='select', cascade='all, delete-orphan')
+    # The same text split into the pages it was extracted from, so single pages can be loaded
+    pages = db.relationship('DocumentPage', lazy='select', order_by='DocumentPage.page_number',
+                            cascade='all, delete-orphan')
+
+    SOURCE_MODEL = 'model'
+    SOURCE_USER = 'user'
+
+    # Fields returned by listings unless a fields= projection asks for others
+    LIST_FIELDS = ('id', 'title', 'filename', 'file_path', 'file_size', 'upload_date', 'classification',
+                   'classification_confidence', 'classifier_version', 'classification_source', 'author',
+                   'creation_date', 'last_modified', 'content_hash')
+    # content_preview is computed in SQL from the first characters of content_text
+    PREVIEW_LENGTH = 200
+    PROJECTABLE_FIELDS = LIST_FIELDS + ('content_text', 'content_preview')
+
+    @property
+    def content_text(self):
+        return self.content.text if self.content is not None else None
+
+    @content_text.setter
+    def content_text(self, text):
+        if self.content is None:
+            self.content = DocumentContent()
+        self.content.set_text(text)
+
+    @classmethod
+    def content_text_column(cls):
+        """SQL expression for the decompressed text (document_text() runs only for the rows returned)"""
+        text = db.func.document_text(DocumentContent.body, DocumentContent.codec)
+        return DocumentContent.scalar_for(cls.id, text).label('content_text')
+
+    @classmethod
+    def has_content(cls):
+        """SQL condition: the document has non-empty text"""
+        return db.exists().where(DocumentContent.document_id == cls.id, DocumentContent.length > 0)
+
+    @classmethod
+    def projection_columns(cls, fields):
+        """SQL column expressions for a list of projectable field names"""
+        columns = []
+        for field in fields:
+            if field == 'content_preview':
+                columns.append(DocumentContent.scalar_for(cls.id, DocumentContent.preview).label(field))
+            elif field == 'content_text':
+                columns.append(cls.content_text_column())
+            else:
+                columns.append(cls.__table__.c[field].label(field))
+        return columns
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -28,11 +120,140 @@ class Document(db.Model):
             'content_text': self.content_text,
             'classification': self.classification,
             'classification_confidence': self.classification_confidence,
+            'classifier_version': self.classifier_version,
+            'classification_source': self.classification_source or self.SOURCE_MODEL,
             'author': self.author,
             'creation_date': self.creation_date.isoformat() if self.creation_date else None,
-            'last_modified': self.last_modified.isoformat() if self.last_modified else None
+            'last_modified': self.last_modified.isoformat() if self.last_modified else None,
+            'content_hash': self.content_hash
         }
 
+class DocumentContent(db.Model):
+    """Extracted text of a document, compressed and stored out of the documents row"""
+    __tablename__ = 'document_contents'
+
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True)
+    codec = db.Column(db.String(10), nullable=False, default=DEFAULT_TEXT_CODEC)
+    body = db.Column(db.LargeBinary, nullable=False)
+    length = db.Column(db.Integer, nullable=False, default=0)  # characters of uncompressed text
+    # Uncompressed prefix, so listings can return content_preview without decompressing
+    preview = db.Column(db.String(Document.PREVIEW_LENGTH))
+
+    codec_for_new_rows = DEFAULT_TEXT_CODEC
+
+    def set_text(self, text, codec=None):
+        text = text or ''
+        self.codec = codec or self.codec_for_new_rows
+        self.body = compress_text(text, self.codec)
+        self.length = len(text)
+        self.preview = text[:Document.PREVIEW_LENGTH]
+        self._text = text
+
+    @property
+    def text(self):
+        # Decompressed once per loaded instance
+        if getattr(self, '_text', None) is None:
+            self._text = decompress_text(self.body, self.codec)
+        return self._text
+
+    @classmethod
+    def scalar_for(cls, document_id_column, expression):
+        """Correlated subquery selecting expression from the content row of each document"""
+        return db.select(expression).where(cls.document_id == document_id_column).scalar_subquery()
+
+class DocumentPage(db.Model):
+    """Text of one extracted page (PDF page; a DOCX is a single page), compressed like DocumentContent"""
+    __tablename__ = 'document_pages'
+
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), primary_key=True)
+    page_number = db.Column(db.Integer, primary_key=True)  # 1-based
+    # Where the page starts in the document's content_text
+    start_offset = db.Column(db.Integer, nullable=False, default=0)
+    codec = db.Column(db.String(10), nullable=False, default=DEFAULT_TEXT_CODEC)
+    body = db.Column(db.LargeBinary, nullable=False)
+    length = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def build_all(cls, pages, codec=None):
+        """Page rows for a list of page texts, in extraction order"""
+        codec = codec or DocumentContent.codec_for_new_rows
+        return [cls(page_number=number, start_offset=offset, codec=codec, body=compress_text(page_text, codec),
+                    length=len(page_text or ''))
+                for number, (page_text, offset) in enumerate(zip(pages, page_offsets(pages)), start=1)]
+
+    @property
+    def text(self):
+        if getattr(self, '_text', None) is None:
+            self._text = decompress_text(self.body, self.codec)
+        return self._text
+
+class ExtractionCache(db.Model):
+    """Extraction and classification results keyed by the SHA-256 of the file content"""
+    __tablename__ = 'extraction_cache'
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    payload = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON extraction result
+    classification = db.Column(db.String(100))
+    classification_confidence = db.Column(db.Float)
+    classifier_version = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    hit_count = db.Column(db.Integer, nullable=False, default=0)
+
+    DATE_FIELDS = ('creation_date', 'last_modified')
+
+    def set_extraction(self, extracted):
+        metadata = {
+            key: value.isoformat() if isinstance(value, datetime) else value
+            for key, value in (extracted.get('metadata') or {}).items()
+        }
+        payload = {key: extracted.get(key) for key in ('title', 'text', 'pages')}
+        payload['metadata'] = metadata
+        self.payload = zlib.compress(json.dumps(payload).encode('utf-8'))
+
+    def get_extraction(self):
+        extracted = json.loads(zlib.decompress(self.payload).decode('utf-8'))
+        metadata = extracted.get('metadata') or {}
+        for key in self.DATE_FIELDS:
+            if metadata.get(key):
+                metadata[key] = datetime.fromisoformat(metadata[key])
+        extracted['metadata'] = metadata
+        return extracted
+
+class DocumentVector(db.Model):
+    """Hashed term-frequency vector of a document, stored once at ingestion for similarity search"""
+    __tablename__ = 'document_vectors'
+
+    document_id = db.Column(db.Integer, primary_key=True)
+    n_features = db.Column(db.Integer, nullable=False)
+    indices = db.Column(db.LargeBinary, nullable=False)  # int32 feature indices
+    weights = db.Column(db.LargeBinary, nullable=False)  # float32 weights, aligned with indices
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revision = db.Column(db.Integer, index=True)  # CorpusState.vectors_version that wrote the row
+
+class VectorDeletion(db.Model):
+    """Removed document vectors by vector version, so loaded similarity snapshots can drop them"""
+    __tablename__ = 'vector_deletions'
+
+    revision = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, primary_key=True)
+
+class DocumentSignature(db.Model):
+    """MinHash signature of a document's word shingles, for near-duplicate detection"""
+    __tablename__ = 'document_signatures'
+
+    document_id = db.Column(db.Integer, primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # uint32 minimum hash per permutation
+
+class LshBucket(db.Model):
+    """One LSH band of a document signature; documents sharing a (band, bucket) are near-duplicate candidates"""
+    __tablename__ = 'lsh_buckets'
+    __table_args__ = (db.Index('ix_lsh_buckets_band_bucket', 'band', 'bucket'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    band = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.BigInteger, nullable=False)
+    document_id = db.Column(db.Integer, nullable=False, index=True)
+
 class SearchLog(db.Model):
     __tablename__ = 'search_logs'
     
@@ -40,7 +261,8 @@ class SearchLog(db.Model):
     query = db.Column(db.String(500), nullable=False)
     results_count = db.Column(db.Integer, nullable=False)
     search_time = db.Column(db.Float, nullable=False)  # in seconds
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    cache_hit = db.Column(db.Boolean, default=False, server_default='0')
     
     def to_dict(self):
         return {
@@ -48,6 +270,7 @@ class SearchLog(db.Model):
             'query': self.query,
             'results_count': self.results_count,
             'search_time': self.search_time,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'cache_hit': bool(self.cache_hit)
         }
 
@@ -0,0 +1,50 @@
+import json
+import uuid
+from datetime import datetime
+from src.models.user import db
+
+class IngestionJob(db.Model):
+    __tablename__ = 'ingestion_jobs'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    PENDING_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    content_hash = db.Column(db.String(64))
+    duplicate_mode = db.Column(db.String(20))  # duplicates= mode of the upload, re-checked by the worker
+    document_id = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    stage_timings = db.Column(db.Text)  # JSON object of stage name -> seconds
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    # Lease of a running job: the claiming worker renews heartbeat_at while it works on it
+    worker_id = db.Column(db.String(64))
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def get_stage_timings(self):
+        return json.loads(self.stage_timings) if self.stage_timings else {}
+
+    def set_stage_timings(self, timings):
+        self.stage_timings = json.dumps(timings)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'filename': self.filename,
+            'document_id': self.document_id,
+            'error': self.error,
+            'stage_timings': self.get_stage_timings(),
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
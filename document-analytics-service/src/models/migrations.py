@@ -0,0 +1,145 @@
+import os
+import time
+from sqlalchemy import inspect, text
+from src.models.document import Document, DocumentContent, DocumentPage, ExtractionCache, compress_text
+
+
+def upgrade_schema(db):
+    """Bring existing tables up to date with the models.
+
+    db.create_all() only creates missing tables, so columns and indexes added
+    to a model later are created here. New columns must be nullable (or have a
+    server default) since SQLite can only append them.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                statement = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    statement += f" DEFAULT {default.text if hasattr(default, 'text') else repr(default)}"
+                connection.execute(text(statement))
+                print(f"Schema upgrade: added column {table.name}.{column.name}")
+
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def _database_size(engine):
+    path = engine.url.database
+    if engine.dialect.name != 'sqlite' or not path or not os.path.exists(path):
+        return None
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def migrate_document_content(db, batch_size=500):
+    """Move text from the old inline documents.content_text column into compressed document_contents rows.
+
+    Runs once: the column is dropped afterwards (along with the triggers of
+    the old FTS mirror that referenced it) and the file is vacuumed, so the
+    space is returned. Prints a size and timing report.
+    """
+    engine = db.engine
+    if 'content_text' not in {column['name'] for column in inspect(engine).get_columns('documents')}:
+        return 0
+
+    start_time = time.time()
+    size_before = _database_size(engine)
+    codec = DocumentContent.codec_for_new_rows
+    moved = text_bytes = stored_bytes = 0
+    with engine.begin() as connection:
+        triggers = connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'documents' "
+            "AND sql LIKE '%content_text%'"
+        )).scalars().all()
+        for name in triggers:
+            connection.execute(text(f'DROP TRIGGER "{name}"'))
+
+        last_id = 0
+        while True:
+            rows = connection.execute(text(
+                "SELECT id, content_text FROM documents WHERE id > :last_id AND content_text IS NOT NULL "
+                "AND id NOT IN (SELECT document_id FROM document_contents) ORDER BY id LIMIT :limit"
+            ), {'last_id': last_id, 'limit': batch_size}).all()
+            if not rows:
+                break
+            values = []
+            for document_id, content_text in rows:
+                body = compress_text(content_text, codec)
+                values.append({'document_id': document_id, 'codec': codec, 'body': body,
+                               'length': len(content_text), 'preview': content_text[:Document.PREVIEW_LENGTH]})
+                text_bytes += len(content_text.encode('utf-8'))
+                stored_bytes += len(body)
+            connection.execute(DocumentContent.__table__.insert(), values)
+            moved += len(rows)
+            last_id = rows[-1].id
+
+        dropped = True
+        try:
+            connection.execute(text('ALTER TABLE documents DROP COLUMN content_text'))
+        except Exception as e:
+            # SQLite before 3.35 cannot drop columns; clearing it still takes the text out of the rows
+            dropped = False
+            connection.execute(text('UPDATE documents SET content_text = NULL'))
+            if moved:
+                print(f"Could not drop documents.content_text ({e}); cleared it instead")
+
+    if not moved and not dropped:
+        return 0
+    if engine.dialect.name == 'sqlite':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('VACUUM'))
+            # VACUUM in WAL mode writes the new file through the WAL; fold it back in
+            connection.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+    size_after = _database_size(engine)
+    report = (f"Moved the text of {moved} documents to document_contents ({codec}): "
+              f"{text_bytes / 1048576:.1f} MB of text stored in {stored_bytes / 1048576:.1f} MB")
+    if size_before is not None and size_after is not None:
+        report += f"; database file {size_before / 1048576:.1f} MB -> {size_after / 1048576:.1f} MB"
+    print(f"{report} in {time.time() - start_time:.1f}s")
+    return moved
+
+
+def backfill_document_pages(db, batch_size=200):
+    """Create document_pages rows for documents stored before pages were kept.
+
+    Pages come from the cached extraction of the same content when it still
+    produces the stored text; otherwise the whole text becomes page 1.
+    """
+    created = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Document.id, Document.content_hash, Document.content_text_column()) \
+            .filter(Document.id > last_id, ~db.exists().where(DocumentPage.document_id == Document.id)) \
+            .order_by(Document.id).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            content_text = row.content_text or ''
+            pages = [content_text]
+            cached = db.session.get(ExtractionCache, row.content_hash) if row.content_hash else None
+            if cached is not None:
+                cached_pages = cached.get_extraction().get('pages') or []
+                if "\n".join(page_text for page_text in cached_pages if page_text).strip() == content_text:
+                    pages = cached_pages or pages
+            for page in DocumentPage.build_all(pages):
+                page.document_id = row.id
+                db.session.add(page)
+            created += 1
+        db.session.commit()
+        last_id = rows[-1].id
+    if created:
+        print(f"Stored pages for {created} documents")
+    return created
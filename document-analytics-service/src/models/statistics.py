@@ -0,0 +1,25 @@
+from src.models.user import db
+
+class StatisticCounter(db.Model):
+    """Named running totals (documents, bytes, searches, search time) kept up to date by each mutation"""
+    __tablename__ = 'statistic_counters'
+
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0)
+
+class ClassificationTotal(db.Model):
+    """Document count and bytes per classification ('' holds unclassified documents)"""
+    __tablename__ = 'classification_totals'
+
+    classification = db.Column(db.String(100), primary_key=True)
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    total_size = db.Column(db.Integer, nullable=False, default=0)
+
+class SearchLatencyBucket(db.Model):
+    """Per-minute histogram of search latencies on a logarithmic bucket scale"""
+    __tablename__ = 'search_latency_buckets'
+
+    minute = db.Column(db.Integer, primary_key=True)  # Unix time // 60
+    bucket = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_time = db.Column(db.Float, nullable=False, default=0)
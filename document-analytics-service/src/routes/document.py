@@ -1,13 +1,54 @@
 import os
+import json
 import time
-from flask import Blueprint, request, jsonify
+import itertools
+from datetime import datetime
+import zipfile
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from sqlalchemy import func, or_, tuple_, update
+from sqlalchemy.orm import selectinload
 from werkzeug.utils import secure_filename
 from src.models.user import db
-from src.models.document import Document, SearchLog
+from src.models.document import Document, DocumentContent, DocumentPage, SearchLog
+from src.models.ingestion_job import IngestionJob
+from src.models.corpus_state import CorpusState
 from src.utils.document_processor import DocumentProcessor
+from src.utils.search_index import InvertedIndex
+from src.utils.fts import fts_add, fts_available, fts_clear, fts_delete, fts_search
+from src.utils.ingestion import DuplicateContentError, IngestionQueue, QueueFullError
+from src.utils.batch_processing import iter_processed_files
+from src.utils.upload_storage import UploadStore, hash_file
+from src.utils.extraction_cache import lookup_extraction, store_extraction
+from src.utils.query_cache import QueryCache
+from src.utils.model_store import ModelNotFoundError
+from src.utils.similarity import VectorIndex, backfill_vectors, delete_document_vectors, store_document_vectors
+from src.utils.statistics import (get_statistics_snapshot, rebuild_statistics, record_documents_added,
+                                   record_documents_removed, record_reclassified, record_search)
+from src.utils.search_log import SearchLogWriter
+from src.utils.storage import read_session
+from src.utils.near_duplicates import (DEFAULT_THRESHOLD, backfill_signatures, delete_signatures,
+                                       find_duplicate_clusters, find_near_duplicates, store_signature)
+from src.utils.pagination import (InvalidCursorError, decode_cursor, encode_cursor, following_range,
+                                  keyset_condition, keyset_order)
 
 document_bp = Blueprint('document', __name__)
 processor = DocumentProcessor()
+search_index = InvertedIndex(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'search_index'))
+query_cache = QueryCache()
+vector_index = VectorIndex()
+search_log_writer = SearchLogWriter()
+
+@document_bp.record_once
+def configure_processor(state):
+    """Apply the app configuration to the shared document processor"""
+    config = state.app.config
+    processor.configure_extraction(
+        workers=config.get('PDF_EXTRACTION_WORKERS'),
+        parallel_page_threshold=config.get('PDF_PARALLEL_PAGE_THRESHOLD'),
+        pages_per_chunk=config.get('PDF_PAGES_PER_CHUNK')
+    )
+    processor.configure_classifier(model_dir=config.get('CLASSIFIER_MODEL_DIR'))
+    query_cache.configure(max_entries=config.get('SEARCH_CACHE_SIZE'), ttl=config.get('SEARCH_CACHE_TTL'))
 
 @document_bp.route('/health', methods=['GET'])
 def health_check():
@@ -20,126 +61,751 @@ def health_check():
             '/api/statistics',
             '/api/debug/reset-db',
             '/api/search',
+            '/api/search/cache',
+            '/api/classifier/models',
+            '/api/classifier/train',
+            '/api/classifier/feedback',
             '/api/documents',
-            '/api/upload'
+            '/api/upload',
+            '/api/upload/batch',
+            '/api/jobs/<job_id>',
+            '/api/document/<document_id>/highlight',
+            '/api/document/<document_id>/pages',
+            '/api/document/<document_id>/similar',
+            '/api/document/<document_id>/near-duplicates',
+            '/api/duplicates/clusters'
         ]
     }), 200
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'docx'}
+SEARCH_MODES = {'index', 'fts'}
+DUPLICATE_MODES = {'existing', 'reuse'}
+LIST_FORMATS = {'json', 'ndjson'}
+LIST_BATCH_SIZE = 500
+MAX_PAGE_SIZE = 1000
+# sort_by values and the indexed Document columns behind them
+SORT_COLUMNS = {
+    'title': 'title',
+    'upload_date': 'upload_date',
+    'file_size': 'file_size',
+    'classification': 'classification',
+    'author': 'author'
+}
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+CLASSIFY_SCOPES = {'all', 'stale'}
+MAX_FEEDBACK_LABELS = 1000
+DEFAULT_SIMILAR_K = 10
+MAX_SIMILAR_K = 100
+# Request options, besides the query, mode and compact flag, that are part of the search cache key
+CACHED_SEARCH_OPTIONS = ('snippets', 'context_lines', 'limit', 'offset', 'page_hits', 'pages_per_document',
+                         'fuzzy', 'infix')
+# (document, page) pairs per query when loading the pages of search hits
+PAGE_LOAD_BATCH_SIZE = 500
+# Longest page range accepted in pages=first-last
+MAX_PAGE_RANGE = 10000
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def ensure_upload_folder():
-    upload_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), UPLOAD_FOLDER)
-    if not os.path.exists(upload_path):
-        os.makedirs(upload_path)
-    return upload_path
+upload_store = UploadStore(os.path.join(os.path.dirname(os.path.dirname(__file__)), UPLOAD_FOLDER))
+
+@document_bp.record_once
+def configure_uploads(state):
+    """Apply the upload chunk size and clear temp files of interrupted uploads"""
+    upload_store.configure(chunk_size=state.app.config.get('UPLOAD_CHUNK_SIZE'))
+    removed = upload_store.remove_stale_temp_files()
+    if removed:
+        print(f"Removed {removed} temporary files of interrupted uploads")
+
+def rebuild_search_index():
+    """Rebuild the inverted index from every document in the database"""
+    offsets = {}
+    for document_id, start_offset in db.session.query(DocumentPage.document_id, DocumentPage.start_offset) \
+            .order_by(DocumentPage.document_id, DocumentPage.page_number):
+        offsets.setdefault(document_id, []).append(start_offset)
+    rows = db.session.query(Document.id, Document.title, Document.content_text_column()).yield_per(200)
+    search_index.rebuild((row.id, row.title, row.content_text, offsets.get(row.id)) for row in rows)
+
+def get_search_index():
+    """Return the inverted index, loading it from disk or rebuilding it on first use"""
+    if not search_index.loaded:
+        if not search_index.load() or search_index.document_count != Document.query.count():
+            rebuild_search_index()
+    else:
+        search_index.refresh()
+    return search_index
+
+def bump_corpus_version():
+    """Invalidate cached search results; called once a mutation is visible in the database and the index"""
+    CorpusState.bump()
+    db.session.commit()
+
+def log_search(keywords, results_count, search_time, cache_hit=False):
+    """Record a search in the search log, through the background writer unless SEARCH_LOG_ASYNC is off"""
+    if search_log_writer.enabled:
+        search_log_writer.record(keywords, results_count, search_time, cache_hit=cache_hit)
+        return
+    search_log = SearchLog(
+        query=keywords,
+        results_count=results_count,
+        search_time=search_time,
+        cache_hit=cache_hit
+    )
+    db.session.add(search_log)
+    record_search(search_time)
+    db.session.commit()
+
+def build_document(file_path, filename, extracted, classification, confidence, file_size, content_hash=None,
+                   classifier_version=None):
+    """Create a Document from an extraction result"""
+    metadata = extracted['metadata']
+    return Document(
+        title=extracted['title'],
+        filename=filename,
+        file_path=file_path,
+        file_size=file_size,
+        content_hash=content_hash,
+        content_text=extracted['text'],
+        pages=DocumentPage.build_all(extracted.get('pages') or [extracted['text']]),
+        classification=classification,
+        classification_confidence=confidence,
+        classifier_version=classifier_version or processor.classifier_version,
+        classification_source=Document.SOURCE_MODEL,
+        author=metadata.get('author'),
+        creation_date=metadata.get('creation_date'),
+        last_modified=metadata.get('last_modified')
+    )
+
+def ingest_file(file_path, filename, timings=None, content_hash=None, file_size=None, duplicate_mode=None):
+    """Extract, classify, store and index a saved upload; returns the new Document.
+
+    Content already seen (same SHA-256) reuses the cached extraction and
+    classification instead of processing the file again. With
+    duplicate_mode 'existing', raises DuplicateContentError instead of
+    storing a second document with the same content.
+    """
+    timings = timings if timings is not None else {}
+
+    if content_hash is None:
+        stage_start = time.time()
+        content_hash = hash_file(file_path)
+        timings['hash'] = time.time() - stage_start
+    if file_size is None:
+        file_size = os.path.getsize(file_path)
+
+    if duplicate_mode == 'existing':
+        # Stored since the request checked, e.g. by an earlier queued job
+        existing = find_duplicate(content_hash)
+        if existing:
+            raise DuplicateContentError(existing)
+
+    # Pin one model so the recorded version is the one that produced the label, even if
+    # another model is activated while this file is processed
+    model = processor.get_model()
+    classifier_version = model[0]
+    cached = lookup_extraction(content_hash, classifier_version)
+    if cached:
+        extracted, classification, confidence = cached
+        timings['extraction_cache_hit'] = True
+        if classification is None:
+            # Cached classification came from an older model
+            stage_start = time.time()
+            classification, confidence = processor.classify_documents([extracted['text']], model)[0]
+            timings['classify'] = time.time() - stage_start
+            store_extraction(content_hash, extracted, classification, confidence, replace=True,
+                             classifier_version=classifier_version)
+    else:
+        # Process the document in a single pass over the file
+        stage_start = time.time()
+        extracted = processor.extract_document(file_path, filename)
+        timings['extract'] = time.time() - stage_start
+
+        # Classify the document
+        stage_start = time.time()
+        classification, confidence = processor.classify_documents([extracted['text']], model)[0]
+        timings['classify'] = time.time() - stage_start
+
+        store_extraction(content_hash, extracted, classification, confidence,
+                         classifier_version=classifier_version)
+
+    # Create document record
+    stage_start = time.time()
+    document = build_document(file_path, filename, extracted, classification, confidence, file_size, content_hash,
+                              classifier_version)
+
+    db.session.add(document)
+    db.session.flush()
+    if duplicate_mode == 'existing':
+        # Checked again inside the insert's write transaction: SQLite lets one writer in at a time,
+        # so a concurrent upload of the same content has either committed (and is seen here) or
+        # will see this document when it gets here
+        existing = Document.query.filter(Document.content_hash == content_hash, Document.id != document.id) \
+            .order_by(Document.id).first()
+        if existing:
+            db.session.rollback()
+            raise DuplicateContentError(db.session.get(Document, existing.id))
+    page_offsets = [page.start_offset for page in document.pages]
+    fts_add(db.session, [(document.id, document.title, extracted['text'])])
+    store_document_vectors([document.id], [extracted['text']])
+    store_signature(document.id, extracted['text'])
+    record_documents_added([(classification, file_size)])
+    db.session.commit()
+    timings['store'] = time.time() - stage_start
+
+    stage_start = time.time()
+    get_search_index().add_document(document.id, extracted['title'], extracted['text'], page_offsets)
+    bump_corpus_version()
+    timings['index'] = time.time() - stage_start
+
+    return document
+
+def ingest_job(file_path, filename, timings, content_hash=None, duplicate_mode=None):
+    """Ingestion queue worker; a job whose content turns out to be stored already completes with that document"""
+    try:
+        return ingest_file(file_path, filename, timings, content_hash=content_hash, duplicate_mode=duplicate_mode)
+    except DuplicateContentError as e:
+        timings['duplicate'] = True
+        discard_upload(file_path)
+        return e.document
+
+ingestion_queue = IngestionQueue(ingest_job)
+
+@document_bp.record_once
+def configure_ingestion(state):
+    """Bind the ingestion queue to the app so workers can open app contexts"""
+    ingestion_queue.init_app(state.app)
+
+@document_bp.record_once
+def configure_search_log(state):
+    """Bind the search log writer to the app so its thread can open app contexts"""
+    search_log_writer.init_app(state.app)
+
+def describe_near_duplicates(document_id, threshold=DEFAULT_THRESHOLD):
+    """Near-duplicate candidates of a stored document with their estimated Jaccard similarity"""
+    matches = find_near_duplicates(document_id, threshold=threshold)
+    if not matches:
+        return []
+    titles = dict(db.session.query(Document.id, Document.title)
+                  .filter(Document.id.in_([match_id for match_id, _ in matches])).all())
+    return [{'document_id': match_id, 'title': titles[match_id], 'similarity': round(similarity, 4)}
+            for match_id, similarity in matches if match_id in titles]
+
+def find_duplicate(content_hash):
+    """Return an existing document with identical content, if any"""
+    return Document.query.filter_by(content_hash=content_hash).order_by(Document.id).first()
+
+def duplicate_response(existing):
+    return jsonify({
+        'message': 'Document with identical content already exists',
+        'duplicate': True,
+        'document': existing.to_dict()
+    }), 200
+
+def discard_upload(file_path):
+    """Remove a just-saved duplicate upload unless a stored document points at the same file"""
+    if not Document.query.filter_by(file_path=file_path).first() and os.path.exists(file_path):
+        os.remove(file_path)
+
+def get_duplicate_mode():
+    """How uploads of already-stored content are handled: 'existing' returns the stored
+    document, 'reuse' creates a new document from the cached extraction"""
+    return request.args.get('duplicates', request.form.get('duplicates', 'existing'))
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes') if value is not None else False
+
+def wants_async_upload():
+    value = request.args.get('async', request.form.get('async'))
+    if value is None:
+        return bool(current_app.config.get('INGESTION_ASYNC_UPLOADS', False))
+    return parse_bool(value)
+
+def get_upload_source():
+    """(filename, stream) of the uploaded file.
+
+    Multipart requests use the 'file' field. Any other body is the file
+    itself, named by ?filename= or an X-Filename header, and is streamed
+    straight from the request to the upload store without being spooled first.
+    """
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        file = request.files.get('file')
+        if file is None:
+            return None, None
+        return file.filename, file.stream
+    filename = request.args.get('filename') or request.headers.get('X-Filename')
+    if filename is None:
+        return None, None
+    return filename, request.stream
 
 @document_bp.route('/upload', methods=['POST'])
 def upload_document():
-    """Upload and process a document"""
+    """Upload and process a document (?async=true queues the processing and returns 202)"""
     try:
-        if 'file' not in request.files:
+        original_filename, stream = get_upload_source()
+        if stream is None:
             return jsonify({'error': 'No file provided'}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
+
+        if original_filename == '':
             return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
+
+        filename = secure_filename(original_filename)
+        if not allowed_file(filename):
             return jsonify({'error': 'File type not allowed. Only PDF and DOCX files are supported.'}), 400
+
+        duplicate_mode = get_duplicate_mode()
+        if duplicate_mode not in DUPLICATE_MODES:
+            return jsonify({'error': f"Invalid duplicates mode. Use one of: {', '.join(sorted(DUPLICATE_MODES))}"}), 400
+
+        run_async = wants_async_upload()
+        if run_async and ingestion_queue.pending_count() >= ingestion_queue.max_pending:
+            return jsonify({'error': 'Ingestion queue is full, please retry later'}), 429
         
-        # Save the file
-        upload_path = ensure_upload_folder()
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(upload_path, filename)
-        file.save(file_path)
-        
-        # Process the document
-        file_extension = filename.rsplit('.', 1)[1].lower()
-        
-        if file_extension == 'pdf':
-            title = processor.extract_title_from_pdf(file_path)
-            content_text = processor.extract_text_from_pdf(file_path)
-            metadata = processor.extract_metadata_from_pdf(file_path)
-        else:  # docx
-            title = processor.extract_title_from_docx(file_path)
-            content_text = processor.extract_text_from_docx(file_path)
-            metadata = processor.extract_metadata_from_docx(file_path)
-        
-        # Classify the document
-        classification, confidence = processor.classify_document(content_text)
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Create document record
-        document = Document(
-            title=title,
-            filename=filename,
-            file_path=file_path,
-            file_size=file_size,
-            content_text=content_text,
-            classification=classification,
-            classification_confidence=confidence,
-            author=metadata.get('author'),
-            creation_date=metadata.get('creation_date'),
-            last_modified=metadata.get('last_modified')
-        )
-        
-        db.session.add(document)
-        db.session.commit()
+        # Stream the file into content-addressed storage, hashing it on the way
+        timings = {}
+        stage_start = time.time()
+        file_path, file_size, content_hash = upload_store.save(stream, filename)
+        timings['save'] = time.time() - stage_start
+
+        if duplicate_mode == 'existing':
+            existing = find_duplicate(content_hash)
+            if existing:
+                discard_upload(file_path)
+                return duplicate_response(existing)
+
+        if run_async:
+            try:
+                job = ingestion_queue.submit(file_path, filename, timings, content_hash=content_hash,
+                                             duplicate_mode=duplicate_mode)
+            except QueueFullError:
+                return jsonify({'error': 'Ingestion queue is full, please retry later'}), 429
+            return jsonify({
+                'message': 'Document accepted for processing',
+                'job_id': job.id,
+                'status_url': f'/api/jobs/{job.id}',
+                'job': job.to_dict()
+            }), 202
+
+        try:
+            document = ingest_file(file_path, filename, timings, content_hash=content_hash, file_size=file_size,
+                                   duplicate_mode=duplicate_mode)
+        except DuplicateContentError as e:
+            # Another upload of the same content was stored while this one was processed
+            discard_upload(file_path)
+            return duplicate_response(e.document)
+
+        stage_start = time.time()
+        near_duplicates = describe_near_duplicates(document.id)
+        timings['near_duplicates'] = time.time() - stage_start
         
         return jsonify({
             'message': 'Document uploaded and processed successfully',
-            'document': document.to_dict()
+            'document': document.to_dict(),
+            'near_duplicates': near_duplicates,
+            'stage_timings': timings
         }), 201
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error processing document: {str(e)}'}), 500
 
-@document_bp.route('/documents', methods=['GET'])
-def get_documents():
-    """Get all documents with optional sorting"""
+def save_batch_files():
+    """Save every file of a batch request (multipart files and/or zip archives).
+
+    Returns (saved, rejected) where saved is a list of (filename, file_path,
+    file_size, content_hash) and rejected is a list of per-file error results.
+    """
+    saved = []
+    rejected = []
+    max_archive_bytes = current_app.config.get('BATCH_MAX_ARCHIVE_BYTES', 500 * 1024 * 1024)
+
+    def save_file(name, stream):
+        filename = secure_filename(os.path.basename(name))
+        if not filename or not allowed_file(filename):
+            rejected.append({'filename': name, 'status': 'error',
+                             'error': 'File type not allowed. Only PDF and DOCX files are supported.'})
+            return
+        file_path, file_size, content_hash = upload_store.save(stream, filename)
+        saved.append((filename, file_path, file_size, content_hash))
+
+    for file in request.files.getlist('files') + request.files.getlist('file') + request.files.getlist('archive'):
+        if not file or file.filename == '':
+            continue
+        if file.filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(file.stream) as archive:
+                    members = [member for member in archive.infolist() if not member.is_dir()]
+                    if sum(member.file_size for member in members) > max_archive_bytes:
+                        rejected.append({'filename': file.filename, 'status': 'error',
+                                         'error': 'Archive is too large when uncompressed'})
+                        continue
+                    for member in members:
+                        with archive.open(member) as member_stream:
+                            save_file(member.filename, member_stream)
+            except zipfile.BadZipFile:
+                rejected.append({'filename': file.filename, 'status': 'error', 'error': 'Invalid zip archive'})
+        else:
+            save_file(file.filename, file.stream)
+
+    return saved, rejected
+
+@document_bp.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Upload many documents (multipart 'files' and/or zip 'archive') and process them concurrently"""
     try:
-        sort_by = request.args.get('sort_by', 'upload_date')
-        sort_order = request.args.get('sort_order', 'desc')
-        
-        # Measure sorting time
+        # Validated before anything is written to the upload store
+        duplicate_mode = get_duplicate_mode()
+        if duplicate_mode not in DUPLICATE_MODES:
+            return jsonify({'error': f"Invalid duplicates mode. Use one of: {', '.join(sorted(DUPLICATE_MODES))}"}), 400
+
         start_time = time.time()
-        
-        query = Document.query
-        
-        if sort_by == 'title':
-            if sort_order == 'asc':
-                query = query.order_by(Document.title.asc())
-            else:
-                query = query.order_by(Document.title.desc())
-        elif sort_by == 'upload_date':
-            if sort_order == 'asc':
-                query = query.order_by(Document.upload_date.asc())
-            else:
-                query = query.order_by(Document.upload_date.desc())
-        elif sort_by == 'file_size':
-            if sort_order == 'asc':
-                query = query.order_by(Document.file_size.asc())
+        saved, results = save_batch_files()
+        if not saved and not results:
+            return jsonify({'error': 'No files provided'}), 400
+        save_time = time.time() - start_time
+
+        workers = current_app.config.get('BATCH_WORKERS', 1)
+        commit_size = current_app.config.get('BATCH_COMMIT_SIZE', 200)
+
+        index = get_search_index()
+        process_start = time.time()
+        store_time = 0.0
+        total_bytes = 0
+        pending = []
+        to_process = {}
+        seen_hashes = {}
+
+        def flush(pending):
+            # One bulk insert and commit per chunk
+            chunk_start = time.time()
+            # Keep the indexed text before the commit expires the attributes
+            indexed_text = [(document.title, document.content_text) for document, _ in pending]
+            page_offsets = [[page.start_offset for page in document.pages] for document, _ in pending]
+            db.session.add_all([document for document, _ in pending])
+            db.session.flush()
+            fts_add(db.session, [(document.id, title, content_text)
+                                 for (document, _), (title, content_text) in zip(pending, indexed_text)])
+            store_document_vectors([document.id for document, _ in pending],
+                                   [content_text for _, content_text in indexed_text])
+            for (document, _), (_, content_text) in zip(pending, indexed_text):
+                store_signature(document.id, content_text)
+            record_documents_added([(document.classification, document.file_size) for document, _ in pending])
+            db.session.commit()
+            for (document, result), (title, content_text), offsets in zip(pending, indexed_text, page_offsets):
+                index.add_document(document.id, title, content_text, offsets)
+                result.update({'status': 'created', 'document_id': document.id,
+                               'classification': document.classification,
+                               'near_duplicates': describe_near_duplicates(document.id)})
+            bump_corpus_version()
+            return time.time() - chunk_start
+
+        def add_pending(document, result):
+            nonlocal pending, store_time, total_bytes
+            total_bytes += document.file_size
+            pending.append((document, result))
+            if len(pending) >= commit_size:
+                store_time += flush(pending)
+                pending = []
+
+        # Skip content that is already stored or repeated within the batch, and reuse cached
+        # extractions; only new content goes to the worker pool. Files classified here use one
+        # pinned model (pool workers record the version of the model they used)
+        model = processor.get_model()
+        classifier_version = model[0]
+        existing_by_hash = {}
+        if duplicate_mode == 'existing':
+            hashes = list({content_hash for _, _, _, content_hash in saved})
+            existing_by_hash = dict(db.session.query(Document.content_hash, Document.id)
+                                    .filter(Document.content_hash.in_(hashes)).all()) if hashes else {}
+
+        for filename, file_path, file_size, content_hash in saved:
+            result = {'filename': filename}
+            results.append(result)
+            if duplicate_mode == 'existing' and content_hash in existing_by_hash:
+                result.update({'status': 'duplicate', 'document_id': existing_by_hash[content_hash]})
+                discard_upload(file_path)
+                continue
+            if duplicate_mode == 'existing' and content_hash in seen_hashes:
+                result.update({'status': 'duplicate', 'duplicate_of': seen_hashes[content_hash][0]})
+                if file_path != seen_hashes[content_hash][1]:
+                    discard_upload(file_path)
+                continue
+            seen_hashes[content_hash] = (filename, file_path)
+
+            cached = lookup_extraction(content_hash, classifier_version)
+            if cached:
+                extracted, classification, confidence = cached
+                result['extraction_cache_hit'] = True
+                if classification is None:
+                    classification, confidence = processor.classify_documents([extracted['text']], model)[0]
+                    store_extraction(content_hash, extracted, classification, confidence, replace=True,
+                                     classifier_version=classifier_version)
+                add_pending(build_document(file_path, filename, extracted, classification, confidence,
+                                           file_size, content_hash, classifier_version), result)
             else:
-                query = query.order_by(Document.file_size.desc())
-        
-        documents = query.all()
-        sort_time = time.time() - start_time
-        
+                # Files with the same content share one stored path and are extracted once
+                to_process.setdefault(file_path, []).append((filename, file_size, content_hash, result))
+
+        files = [(file_path, entries[0][0]) for file_path, entries in to_process.items()]
+        for file_path, extracted, error in iter_processed_files(files, workers, processor):
+            entries = to_process[file_path]
+            if error:
+                for _, _, _, result in entries:
+                    result.update({'status': 'error', 'error': error})
+                continue
+            classification = extracted['classification']
+            confidence = extracted['classification_confidence']
+            store_extraction(entries[0][2], extracted, classification, confidence,
+                             classifier_version=extracted.get('classifier_version'))
+            for filename, file_size, content_hash, result in entries:
+                add_pending(build_document(file_path, filename, extracted, classification, confidence,
+                                           file_size, content_hash, extracted.get('classifier_version')), result)
+
+        if pending:
+            store_time += flush(pending)
+
+        total_time = time.time() - start_time
+        created_count = sum(1 for result in results if result.get('status') == 'created')
+        duplicate_count = sum(1 for result in results if result.get('status') == 'duplicate')
+
         return jsonify({
-            'documents': [doc.to_dict() for doc in documents],
-            'sort_time': sort_time,
-            'total_count': len(documents)
+            'message': f'Processed {len(results)} files, {created_count} documents created',
+            'results': results,
+            'created_count': created_count,
+            'duplicate_count': duplicate_count,
+            'failed_count': len(results) - created_count - duplicate_count,
+            'throughput': {
+                'total_time': total_time,
+                'save_time': save_time,
+                'processing_time': time.time() - process_start - store_time,
+                'store_time': store_time,
+                'total_bytes': total_bytes,
+                'files_per_second': created_count / total_time if total_time > 0 else 0,
+                'mb_per_second': total_bytes / (1024 * 1024) / total_time if total_time > 0 else 0,
+                'workers': workers
+            }
         }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error processing batch upload: {str(e)}'}), 500
+
+@document_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the state, stage timings and errors of an ingestion job"""
+    try:
+        job = db.session.get(IngestionJob, job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        response = {'job': job.to_dict()}
+        if job.status == IngestionJob.STATUS_COMPLETED and job.document_id:
+            response['near_duplicates'] = describe_near_duplicates(job.document_id)
+        return jsonify(response), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error retrieving job: {str(e)}'}), 500
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def parse_fields(fields_param):
+    """Validate a comma-separated fields= projection; returns (fields, error)"""
+    if not fields_param:
+        return list(Document.LIST_FIELDS), None
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in Document.PROJECTABLE_FIELDS]
+    if unknown:
+        return None, f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(Document.PROJECTABLE_FIELDS)}"
+    return list(dict.fromkeys(fields)), None
+
+@document_bp.route('/documents', methods=['GET'])
+def get_documents():
+    """List documents with index-backed sorting.
+
+    Supports a fields= projection and format=json|ndjson. Without limit= the
+    whole listing is streamed; with limit= one keyset page is returned along
+    with a next_cursor token to pass back as after=.
+    """
+    try:
+        sort_by = request.args.get('sort_by', 'upload_date')
+        sort_order = request.args.get('sort_order', 'desc')
+        output_format = request.args.get('format', 'json')
+        if sort_by not in SORT_COLUMNS:
+            return jsonify({'error': f"Invalid sort_by. Use one of: {', '.join(SORT_COLUMNS)}"}), 400
+        if sort_order not in ('asc', 'desc'):
+            return jsonify({'error': 'sort_order must be asc or desc'}), 400
+        if output_format not in LIST_FORMATS:
+            return jsonify({'error': f"Invalid format. Use one of: {', '.join(sorted(LIST_FORMATS))}"}), 400
+
+        fields, error = parse_fields(request.args.get('fields'))
+        if error:
+            return jsonify({'error': error}), 400
+
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                return jsonify({'error': 'limit must be an integer'}), 400
+            if limit < 1 or limit > MAX_PAGE_SIZE:
+                return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+        # Order by (sort column, id) so every row has a unique, index-backed position
+        sort_column = getattr(Document, SORT_COLUMNS[sort_by])
+        query = read_session().query(*Document.projection_columns(fields),
+                                     sort_column.label('_sort_value'), Document.id.label('_row_id'))
+        query = query.order_by(*keyset_order(sort_column, Document.id, sort_order))
+
+        # Without a cursor one query covers every row; after a cursor the rest of its range is read
+        # first, then the range that follows it (see following_range)
+        queries = [query]
+        after = request.args.get('after')
+        if after:
+            try:
+                sort_value, row_id = decode_cursor(after, sort_by, sort_order)
+            except InvalidCursorError as e:
+                return jsonify({'error': str(e)}), 400
+            queries = [query.filter(keyset_condition(sort_column, Document.id, sort_order, sort_value, row_id))]
+            following = following_range(sort_column, sort_order, sort_value)
+            if following is not None:
+                queries.append(query.filter(following))
+
+        def serialize(row):
+            mapping = row._mapping
+            return {field: mapping[field] for field in fields}
+
+        if limit is not None:
+            return get_documents_page(queries, limit, sort_by, sort_order, output_format, serialize)
+
+        rows = itertools.chain.from_iterable(query.yield_per(LIST_BATCH_SIZE) for query in queries)
+
+        def generate():
+            # Only the time spent fetching rows from the database counts as sort time
+            sort_time = 0.0
+            total_count = 0
+            if output_format == 'json':
+                yield '{"documents": ['
+            iterator = iter(rows)
+            while True:
+                fetch_start = time.time()
+                row = next(iterator, None)
+                sort_time += time.time() - fetch_start
+                if row is None:
+                    break
+                line = json.dumps(serialize(row), default=json_default)
+                if output_format == 'ndjson':
+                    yield line + '\n'
+                else:
+                    yield (',' if total_count else '') + line
+                total_count += 1
+            if output_format == 'json':
+                yield f'], "sort_time": {sort_time}, "total_count": {total_count}}}'
+
+        mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'application/json'
+        return Response(stream_with_context(generate()), mimetype=mimetype)
         
     except Exception as e:
         return jsonify({'error': f'Error retrieving documents: {str(e)}'}), 500
 
+def get_documents_page(queries, limit, sort_by, sort_order, output_format, serialize):
+    """Return one keyset page; page N costs the same as page 1"""
+    # sort_time covers only the queries, not the serialization below
+    start_time = time.time()
+    rows = []
+    for query in queries:
+        rows.extend(query.limit(limit + 1 - len(rows)).all())
+        if len(rows) > limit:
+            break
+    sort_time = time.time() - start_time
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last_row = rows[-1]
+        next_cursor = encode_cursor(sort_by, sort_order, last_row._sort_value, last_row._row_id)
+
+    documents = [serialize(row) for row in rows]
+    if output_format == 'ndjson':
+        body = ''.join(json.dumps(document, default=json_default) + '\n' for document in documents)
+        response = Response(body, mimetype='application/x-ndjson')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+
+    return Response(json.dumps({
+        'documents': documents,
+        'sort_time': sort_time,
+        'count': len(documents),
+        'limit': limit,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }, default=json_default), mimetype='application/json')
+
+def parse_snippet_options(data):
+    """Per-request snippet count and context window size, bounded by the app config"""
+    config = current_app.config
+    try:
+        max_snippets = int(data.get('snippets', config.get('SEARCH_SNIPPETS_PER_DOCUMENT', 5)))
+        context_lines = int(data.get('context_lines', config.get('SEARCH_CONTEXT_LINES', 1)))
+    except (TypeError, ValueError):
+        return None, 'snippets and context_lines must be integers'
+    max_allowed_snippets = config.get('SEARCH_MAX_SNIPPETS', 50)
+    max_allowed_context = config.get('SEARCH_MAX_CONTEXT_LINES', 10)
+    if max_snippets < 0 or max_snippets > max_allowed_snippets:
+        return None, f'snippets must be between 0 and {max_allowed_snippets}'
+    if context_lines < 0 or context_lines > max_allowed_context:
+        return None, f'context_lines must be between 0 and {max_allowed_context}'
+    return {'max_snippets': max_snippets, 'context_lines': context_lines}, None
+
+def parse_fuzzy_options(data):
+    """Keyword arguments for InvertedIndex.search/fuzzy_terms from the fuzzy and infix options.
+
+    fuzzy is true or 'auto' (edits allowed by word length), false, or a number
+    of edits up to SEARCH_FUZZY_MAX_DISTANCE; infix also matches indexed words
+    containing a query word in FTS mode (index mode always matches substrings).
+    """
+    config = current_app.config
+    value = data.get('fuzzy')
+    max_allowed = config.get('SEARCH_FUZZY_MAX_DISTANCE', 2)
+    if value is None or isinstance(value, bool) or str(value).lower() in ('auto', 'true', 'false', 'yes', 'no'):
+        max_distance = 'auto' if parse_bool(value) or str(value).lower() == 'auto' else 0
+    else:
+        try:
+            max_distance = int(value)
+        except (TypeError, ValueError):
+            return None, f"fuzzy must be true, false, 'auto' or a number of edits up to {max_allowed}"
+        if max_distance < 0 or max_distance > max_allowed:
+            return None, f"fuzzy must be true, false, 'auto' or a number of edits up to {max_allowed}"
+    return {
+        'max_distance': max_distance,
+        'infix': parse_bool(data.get('infix')),
+        'max_expansions': config.get('SEARCH_FUZZY_MAX_EXPANSIONS', 50)
+    }, None
+
+def parse_pages_per_document(data):
+    """How many matching pages a page_hits search loads per document, bounded by the app config"""
+    config = current_app.config
+    try:
+        pages_per_document = int(data.get('pages_per_document', config.get('SEARCH_PAGES_PER_DOCUMENT', 3)))
+    except (TypeError, ValueError):
+        return None, 'pages_per_document must be an integer'
+    max_pages = config.get('SEARCH_MAX_PAGES_PER_DOCUMENT', 20)
+    if pages_per_document < 1 or pages_per_document > max_pages:
+        return None, f'pages_per_document must be between 1 and {max_pages}'
+    return pages_per_document, None
+
+def describe_matched_pages(matched_pages):
+    """JSON form of InvertedIndex.matched_pages; None when the document has no page positions"""
+    if matched_pages is None:
+        return None
+    return [{'page': page_number, 'matches': matches} for page_number, matches in matched_pages]
+
 @document_bp.route('/search', methods=['POST'])
 def search_documents():
     """Search documents by keywords"""
@@ -149,112 +815,480 @@ def search_documents():
         
         if not keywords:
             return jsonify({'error': 'Keywords are required'}), 400
-        
+
+        mode = data.get('mode', 'index')
+        if mode not in SEARCH_MODES:
+            return jsonify({'error': f"Invalid search mode. Use one of: {', '.join(sorted(SEARCH_MODES))}"}), 400
+
+        compact = parse_bool(data.get('compact'))
+
         # Measure search time
         start_time = time.time()
-        
-        # Get all documents
-        all_documents = Document.query.all()
-        documents_data = [doc.to_dict() for doc in all_documents]
-        
-        # Search and highlight
-        matching_documents = processor.search_documents(documents_data, keywords)
-        
+
+        # Same normalized query and options against the same corpus version -> cached response
+        cache_key = query_cache.make_key(keywords, CorpusState.current_version(), mode=mode, compact=compact,
+                                         **{name: data.get(name) for name in CACHED_SEARCH_OPTIONS})
+        cached = query_cache.get(cache_key)
+        if cached is not None:
+            search_time = time.time() - start_time
+            log_search(keywords, cached['results_count'], search_time, cache_hit=True)
+            return jsonify(dict(cached, search_time=search_time, cache_hit=True, query=keywords,
+                                keywords_searched=keywords.split())), 200
+
+        if mode == 'fts':
+            result, error = search_documents_fts(data, keywords, compact)
+        else:
+            result, error = search_documents_index(data, keywords, compact)
+        if error:
+            return jsonify({'error': error}), 400
+
         search_time = time.time() - start_time
         
         # Log the search
-        search_log = SearchLog(
-            query=keywords,
-            results_count=len(matching_documents),
-            search_time=search_time
-        )
-        db.session.add(search_log)
-        db.session.commit()
+        log_search(keywords, result['results_count'], search_time)
+        query_cache.set(cache_key, result)
         
-        return jsonify({
-            'documents': matching_documents,
-            'search_time': search_time,
-            'results_count': len(matching_documents),
-            'total_documents': len(all_documents),
-            'query': keywords,
-            'keywords_searched': keywords.split()
-        }), 200
+        return jsonify(dict(result, search_time=search_time, cache_hit=False, query=keywords,
+                            keywords_searched=keywords.split())), 200
         
     except Exception as e:
         return jsonify({'error': f'Error searching documents: {str(e)}'}), 500
 
+def search_documents_index(data, keywords, compact=False):
+    """Substring search answered from the inverted index's postings; returns (result, error)"""
+    snippet_options, error = parse_snippet_options(data)
+    if error:
+        return None, error
+    fuzzy_options, error = parse_fuzzy_options(data)
+    if error:
+        return None, error
+
+    # Find matching documents from the inverted index, then load only those rows
+    index = get_search_index()
+    # Term expansions of the query, reused by matched_pages for every hit
+    expansions = {}
+    hits = index.search(keywords, expansions=expansions, **fuzzy_options)
+    if parse_bool(data.get('page_hits')):
+        pages_per_document, error = parse_pages_per_document(data)
+        if error:
+            return None, error
+        return search_page_hits(index, hits, expansions, keywords, pages_per_document, snippet_options), None
+
+    matching_rows = read_session().query(Document).options(selectinload(Document.content)) \
+        .filter(Document.id.in_(hits)).order_by(Document.id).all() if hits else []
+
+    # Highlight and extract contexts for the matches
+    matching_documents = []
+    for doc in matching_rows:
+        match_type, matched_terms = hits[doc.id]
+        if compact:
+            result = processor.build_compact_result(doc.id, doc.title, doc.content_text, keywords,
+                                                    matched_terms, match_type, **snippet_options)
+            result['filename'] = doc.filename
+            result['classification'] = doc.classification
+        else:
+            result = processor.build_search_result(doc.to_dict(), keywords, matched_terms, match_type,
+                                                   **snippet_options)
+        result['matched_pages'] = describe_matched_pages(index.matched_pages(doc.id, matched_terms, expansions))
+        matching_documents.append(result)
+    if compact:
+        matching_documents.sort(key=lambda result: (-result['score'], result['id']))
+
+    return {
+        'documents': matching_documents,
+        'results_count': len(matching_documents),
+        'total_documents': index.document_count,
+        'compact': compact
+    }, None
+
+def search_page_hits(index, hits, expansions, keywords, pages_per_document, snippet_options):
+    """Index search hits with snippets from their best matching pages only.
+
+    Matching pages come from the index positions; only those page rows are
+    loaded, so the text read per hit is bounded by pages_per_document pages
+    whatever the size of the document.
+    """
+    session = read_session()
+    matched_pages = {doc_id: index.matched_pages(doc_id, matched_terms, expansions)
+                     for doc_id, (_, matched_terms) in hits.items()}
+    # Pages with the most matches first, then in page order
+    selected = {doc_id: sorted(pages or [], key=lambda item: (-item[1], item[0]))[:pages_per_document]
+                for doc_id, pages in matched_pages.items()}
+
+    metadata_by_id = {}
+    pages_by_key = {}
+    if hits:
+        metadata_by_id = {row.id: row for row in session.query(Document.id, Document.title, Document.filename,
+                                                               Document.classification, DocumentContent.length)
+                          .outerjoin(DocumentContent, DocumentContent.document_id == Document.id)
+                          .filter(Document.id.in_(hits)).all()}
+        keys = [(doc_id, page_number) for doc_id, pages in selected.items() for page_number, _ in pages]
+        for start in range(0, len(keys), PAGE_LOAD_BATCH_SIZE):
+            batch = keys[start:start + PAGE_LOAD_BATCH_SIZE]
+            for page in session.query(DocumentPage).filter(
+                    tuple_(DocumentPage.document_id, DocumentPage.page_number).in_(batch)):
+                pages_by_key[(page.document_id, page.page_number)] = page
+
+    matching_documents = []
+    for doc_id, (match_type, matched_terms) in hits.items():
+        metadata = metadata_by_id.get(doc_id)
+        if metadata is None:
+            continue
+        highlight_terms = [keywords] if match_type == 'exact_phrase' else matched_terms
+        total_matches = sum(matches for _, matches in matched_pages[doc_id] or [])
+        page_results = []
+        for page_number, matches in sorted(selected[doc_id]):
+            page = pages_by_key.get((doc_id, page_number))
+            if page is None:
+                continue
+            page_result = processor.build_page_hit(page_number, page.start_offset, page.text, highlight_terms,
+                                                   **snippet_options)
+            page_result['matches'] = matches
+            page_results.append(page_result)
+        matching_documents.append({
+            'id': doc_id,
+            'title': metadata.title,
+            'highlighted_title': processor.highlight_text(metadata.title or '', highlight_terms),
+            'filename': metadata.filename,
+            'classification': metadata.classification,
+            'score': processor.score_match(keywords, matched_terms, match_type, total_matches, metadata.length or 0),
+            'match_type': match_type,
+            'matched_terms': matched_terms,
+            'matched_pages': describe_matched_pages(matched_pages[doc_id]),
+            'total_matches': total_matches,
+            'pages': page_results
+        })
+    matching_documents.sort(key=lambda result: (-result['score'], result['id']))
+
+    return {
+        'documents': matching_documents,
+        'results_count': len(matching_documents),
+        'total_documents': index.document_count,
+        'compact': True,
+        'page_hits': True
+    }
+
+def search_documents_fts(data, keywords, compact=False):
+    """Ranked search where SQLite FTS5 does the matching, BM25 scoring and highlighting; returns (result, error)"""
+    if not fts_available():
+        return None, 'Full-text search is not available on this database'
+
+    try:
+        limit = int(data.get('limit', DEFAULT_SEARCH_LIMIT))
+        offset = int(data.get('offset', 0))
+    except (TypeError, ValueError):
+        return None, 'limit and offset must be integers'
+    if limit < 1 or limit > MAX_SEARCH_LIMIT or offset < 0:
+        return None, f'limit must be between 1 and {MAX_SEARCH_LIMIT} and offset must not be negative'
+    fuzzy_options, error = parse_fuzzy_options(data)
+    if error:
+        return None, error
+
+    # Fuzzy and infix matches are expanded to indexed words through the inverted index's trigrams
+    extra_terms = []
+    if fuzzy_options['max_distance'] or fuzzy_options['infix']:
+        extra_terms = get_search_index().fuzzy_terms(keywords, **fuzzy_options)
+
+    session = read_session()
+    rows, total = fts_search(session, keywords, limit=limit, offset=offset, include_content=not compact,
+                             extra_terms=extra_terms)
+
+    matching_documents = []
+    if compact:
+        # Ids, titles, scores and SQLite's snippet only; no document bodies are loaded or returned
+        metadata_by_id = {}
+        if rows:
+            metadata_by_id = {row.id: row for row in session.query(Document.id, Document.title, Document.filename,
+                                                                   Document.classification)
+                              .filter(Document.id.in_([row['id'] for row in rows])).all()}
+        for row in rows:
+            metadata = metadata_by_id.get(row['id'])
+            if metadata is None:
+                continue
+            matching_documents.append({
+                'id': row['id'],
+                'title': metadata.title,
+                'highlighted_title': row['highlighted_title'],
+                'filename': metadata.filename,
+                'classification': metadata.classification,
+                'score': row['score'],
+                'snippet': row['snippet']
+            })
+    else:
+        documents_by_id = {}
+        if rows:
+            ids = [row['id'] for row in rows]
+            documents_by_id = {doc.id: doc for doc in session.query(Document).options(selectinload(Document.content))
+                               .filter(Document.id.in_(ids)).all()}
+
+        for row in rows:
+            document = documents_by_id.get(row['id'])
+            if document is None:
+                continue
+            doc_dict = document.to_dict()
+            doc_dict['score'] = row['score']
+            doc_dict['highlighted_title'] = row['highlighted_title']
+            doc_dict['highlighted_content'] = row['highlighted_content']
+            doc_dict['snippet'] = row['snippet']
+            doc_dict['search_query'] = keywords
+            matching_documents.append(doc_dict)
+
+    return {
+        'documents': matching_documents,
+        'results_count': total,
+        'returned_count': len(matching_documents),
+        'limit': limit,
+        'offset': offset,
+        'mode': 'fts',
+        'compact': compact
+    }, None
+
+@document_bp.route('/search/cache', methods=['GET'])
+def get_search_cache_stats():
+    """Hit/miss statistics of the search result cache"""
+    try:
+        stats = query_cache.stats()
+        stats['corpus_version'] = CorpusState.current_version()
+        return jsonify(stats), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error retrieving cache statistics: {str(e)}'}), 500
+
 @document_bp.route('/classify', methods=['POST'])
 def classify_documents():
-    """Classify all documents or reclassify existing ones"""
+    """Classify all documents or, with ?scope=stale, only unclassified ones and ones classified by an older model"""
+    classified_count = 0
     try:
         start_time = time.time()
-        
-        documents = Document.query.all()
-        classified_count = 0
-        
-        for document in documents:
-            if document.content_text:
-                classification, confidence = processor.classify_document(document.content_text)
-                document.classification = classification
-                document.classification_confidence = confidence
-                classified_count += 1
-        
-        db.session.commit()
+
+        scope = request.args.get('scope', 'all')
+        if scope not in CLASSIFY_SCOPES:
+            return jsonify({'error': f"Invalid scope. Use one of: {', '.join(sorted(CLASSIFY_SCOPES))}"}), 400
+
+        batch_size = current_app.config.get('CLASSIFY_BATCH_SIZE', 500)
+        # Pin one model for the whole run even if another one is activated meanwhile
+        model = processor.get_model()
+        classifier_version = model[0]
+        # Labels given as feedback are never overwritten by predictions
+        query = db.session.query(Document.id, Document.content_text_column(), Document.classification,
+                                 Document.file_size) \
+            .filter(Document.has_content(), model_labelled())
+        if scope == 'stale':
+            query = query.filter(or_(Document.classification.is_(None), Document.classifier_version.is_(None),
+                                     Document.classifier_version != classifier_version))
+
+        # Walk the table in id order one chunk at a time: one predict_proba and one bulk update per chunk
+        last_id = 0
+        while True:
+            rows = query.filter(Document.id > last_id).order_by(Document.id).limit(batch_size).all()
+            if not rows:
+                break
+            predictions = processor.classify_documents([row.content_text for row in rows], model)
+            db.session.execute(update(Document), [
+                {'id': row.id, 'classification': classification, 'classification_confidence': confidence,
+                 'classifier_version': classifier_version, 'classification_source': Document.SOURCE_MODEL}
+                for row, (classification, confidence) in zip(rows, predictions)
+            ])
+            record_reclassified((row.classification, classification, row.file_size)
+                                for row, (classification, _) in zip(rows, predictions))
+            db.session.commit()
+            classified_count += len(rows)
+            last_id = rows[-1].id
+
+        if classified_count:
+            bump_corpus_version()
         classification_time = time.time() - start_time
         
         return jsonify({
             'message': f'Successfully classified {classified_count} documents',
             'classification_time': classification_time,
-            'classified_count': classified_count
+            'classified_count': classified_count,
+            'scope': scope,
+            'classifier_version': classifier_version
         }), 200
         
     except Exception as e:
+        db.session.rollback()
+        # Chunks committed before the failure still changed labels that cached results may show
+        if classified_count:
+            bump_corpus_version()
         return jsonify({'error': f'Error classifying documents: {str(e)}'}), 500
 
+@document_bp.route('/classifier/models', methods=['GET'])
+def list_classifier_models():
+    """List the stored classifier model versions and the active one"""
+    try:
+        active_version = processor.classifier_version
+        store = processor.model_store
+        models = [dict(store.metadata(version), active=version == active_version)
+                  for version in store.list_versions()]
+        return jsonify({'models': models, 'active_version': active_version}), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error listing classifier models: {str(e)}'}), 500
+
+@document_bp.route('/classifier/models/<version>/activate', methods=['POST'])
+def activate_classifier_model(version):
+    """Switch every process to a stored model version without a restart"""
+    try:
+        processor.activate_model(version)
+        stale_count = Document.query.filter(model_labelled(), or_(Document.classifier_version.is_(None),
+                                                                  Document.classifier_version != version)).count()
+        return jsonify({
+            'message': f'Activated classifier model {version}',
+            'active_version': version,
+            'stale_documents': stale_count
+        }), 200
+
+    except ModelNotFoundError:
+        return jsonify({'error': f'Unknown classifier model: {version}'}), 404
+    except Exception as e:
+        return jsonify({'error': f'Error activating classifier model: {str(e)}'}), 500
+
+def model_labelled():
+    """Filter for documents whose label was predicted rather than given as feedback"""
+    return or_(Document.classification_source.is_(None), Document.classification_source != Document.SOURCE_USER)
+
+def publish_online_model(pipeline, metadata):
+    return processor.publish_model(pipeline, metadata, keep=current_app.config.get('CLASSIFIER_KEEP_VERSIONS', 5))
+
+@document_bp.route('/classifier/train', methods=['POST'])
+def train_classifier():
+    """Train a new hashing classifier from labeled documents, one partial_fit per chunk of rows"""
+    try:
+        start_time = time.time()
+        data = request.get_json(silent=True) or {}
+        include_model_labels = parse_bool(data.get('include_model_labels'))
+        try:
+            min_confidence = float(data.get('min_confidence', 0.0))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'min_confidence must be a number'}), 400
+
+        # Feedback labels, plus confident predictions when include_model_labels is set
+        query = db.session.query(Document.id, Document.content_text_column(), Document.classification) \
+            .filter(Document.has_content(), Document.classification.in_(processor.categories))
+        if include_model_labels:
+            query = query.filter(or_(Document.classification_source == Document.SOURCE_USER,
+                                     Document.classification_confidence >= min_confidence))
+        else:
+            query = query.filter(Document.classification_source == Document.SOURCE_USER)
+
+        batch_size = current_app.config.get('CLASSIFY_BATCH_SIZE', 500)
+        with processor.training_lock:
+            pipeline = processor.new_online_model(current_app.config.get('CLASSIFIER_HASH_FEATURES'))
+            label_counts = {}
+            last_id = 0
+            while True:
+                rows = query.filter(Document.id > last_id).order_by(Document.id).limit(batch_size).all()
+                if not rows:
+                    break
+                processor.train_online_model(pipeline, [row.content_text for row in rows],
+                                             [row.classification for row in rows])
+                for row in rows:
+                    label_counts[row.classification] = label_counts.get(row.classification, 0) + 1
+                last_id = rows[-1].id
+
+            trained_count = sum(label_counts.values())
+            if not trained_count:
+                return jsonify({'error': 'No labeled documents to train on'}), 400
+            version = publish_online_model(pipeline, {'trained_documents': trained_count,
+                                                      'include_model_labels': include_model_labels})
+
+        stale_count = Document.query.filter(model_labelled()).count()
+        return jsonify({
+            'message': f'Trained classifier model {version} on {trained_count} documents',
+            'active_version': version,
+            'trained_documents': trained_count,
+            'label_counts': label_counts,
+            'training_time': time.time() - start_time,
+            'stale_documents': stale_count
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error training classifier: {str(e)}'}), 500
+
+@document_bp.route('/classifier/feedback', methods=['POST'])
+def classifier_feedback():
+    """Record corrected labels and update the active hashing classifier with just those documents"""
+    try:
+        start_time = time.time()
+        data = request.get_json(silent=True) or {}
+        items = data.get('labels') if 'labels' in data else [data]
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'labels must be a non-empty list of {document_id, classification}'}), 400
+        if len(items) > MAX_FEEDBACK_LABELS:
+            return jsonify({'error': f'At most {MAX_FEEDBACK_LABELS} labels per request'}), 400
+
+        labels = {}
+        for item in items:
+            try:
+                document_id = int(item.get('document_id'))
+            except (AttributeError, TypeError, ValueError):
+                return jsonify({'error': 'Each label needs an integer document_id'}), 400
+            classification = item.get('classification')
+            if classification not in processor.categories:
+                return jsonify({'error': f"Invalid classification. Use one of: {', '.join(processor.categories)}"}), 400
+            labels[document_id] = classification
+
+        rows = db.session.query(Document.id, Document.content_text_column(), Document.classification,
+                                Document.file_size) \
+            .filter(Document.id.in_(labels)).all()
+        missing = sorted(set(labels) - {row.id for row in rows})
+        if missing:
+            return jsonify({'error': 'Documents not found', 'missing_document_ids': missing}), 404
+
+        training_rows = [row for row in rows if row.content_text]
+        with processor.training_lock:
+            pipeline, base_version = processor.online_model_for_update(
+                current_app.config.get('CLASSIFIER_HASH_FEATURES'))
+            if training_rows:
+                processor.train_online_model(pipeline, [row.content_text for row in training_rows],
+                                             [labels[row.id] for row in training_rows])
+            version = publish_online_model(pipeline, {'base_version': base_version,
+                                                      'feedback_documents': len(training_rows)})
+
+        db.session.execute(update(Document), [
+            {'id': document_id, 'classification': classification, 'classification_confidence': 1.0,
+             'classification_source': Document.SOURCE_USER, 'classifier_version': version}
+            for document_id, classification in labels.items()
+        ])
+        record_reclassified((row.classification, labels[row.id], row.file_size) for row in rows)
+        db.session.commit()
+        bump_corpus_version()
+
+        return jsonify({
+            'message': f'Recorded {len(labels)} labels and updated classifier model {version}',
+            'active_version': version,
+            'base_version': base_version,
+            'labeled_documents': len(labels),
+            'training_time': time.time() - start_time
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error recording classifier feedback: {str(e)}'}), 500
+
 @document_bp.route('/statistics', methods=['GET'])
 def get_statistics():
-    """Get system statistics"""
+    """Get system statistics from the incrementally maintained counters"""
     try:
-        # Document statistics
-        total_documents = Document.query.count()
-        total_size = db.session.query(db.func.sum(Document.file_size)).scalar() or 0
-
-        # Classification statistics
-        classification_stats = db.session.query(
-            Document.classification,
-            db.func.count(Document.id)
-        ).filter(Document.classification.isnot(None)).group_by(Document.classification).all()
-
-        # Convert classification stats to dictionary
-        classification_distribution = {}
-        for category, count in classification_stats:
-            if category:  # Only include non-null categories
-                classification_distribution[category] = count
-
-        # Search statistics - Fixed the query issue
-        try:
-            # Check if SearchLog table exists and has data
-            total_searches = SearchLog.query.count()
-            if total_searches > 0:
-                recent_searches = SearchLog.query.order_by(SearchLog.timestamp.desc()).limit(10).all()
-                avg_search_time = db.session.query(db.func.avg(SearchLog.search_time)).scalar() or 0
-            else:
-                recent_searches = []
-                avg_search_time = 0
-        except Exception as search_error:
-            print(f"Search statistics error: {str(search_error)}")
-            recent_searches = []
-            avg_search_time = 0
-            total_searches = 0
+        session = read_session()
+        statistics = get_statistics_snapshot(session)
+        total_size = statistics['total_size_bytes']
+        total_searches = statistics['total_searches']
+        recent_searches = session.query(SearchLog).order_by(SearchLog.timestamp.desc()).limit(10).all()
 
         return jsonify({
-            'total_documents': total_documents,
-            'total_size_bytes': int(total_size),
+            'total_documents': statistics['total_documents'],
+            'total_size_bytes': total_size,
             'total_size_mb': round(total_size / (1024 * 1024), 2) if total_size > 0 else 0,
-            'classification_distribution': classification_distribution,
-            'recent_searches': [search.to_dict() for search in recent_searches] if recent_searches else [],
-            'average_search_time': round(float(avg_search_time), 4) if avg_search_time else 0,
-            'total_searches': total_searches
+            'classification_distribution': statistics['classification_distribution'],
+            'recent_searches': [search.to_dict() for search in recent_searches],
+            'average_search_time': round(statistics['total_search_time'] / total_searches, 4) if total_searches else 0,
+            'total_searches': total_searches,
+            'search_latency': statistics['search_latency'],
+            'search_log': search_log_writer.stats()
         }), 200
 
     except Exception as e:
@@ -271,32 +1305,276 @@ def get_document(document_id):
     except Exception as e:
         return jsonify({'error': f'Error retrieving document: {str(e)}'}), 500
 
+@document_bp.route('/document/<int:document_id>/highlight', methods=['GET'])
+def highlight_document(document_id):
+    """Highlighted content and match offsets for one document, fetched on demand after a compact search"""
+    try:
+        keywords = request.args.get('q', '').strip()
+        if not keywords:
+            return jsonify({'error': 'Query parameter q is required'}), 400
+
+        document = db.session.get(Document, document_id, options=[selectinload(Document.content)])
+        if document is None:
+            return jsonify({'error': 'Document not found'}), 404
+        content_text = document.content_text or ''
+        title = document.title or ''
+
+        found_matches, match_type = processor.match_query(content_text, title, keywords)
+        highlight_terms = [keywords] if match_type == 'exact_phrase' else found_matches
+        spans = processor.find_matches(content_text, highlight_terms)
+
+        return jsonify({
+            'id': document.id,
+            'title': title,
+            'highlighted_title': processor.highlight_text(title, highlight_terms),
+            'highlighted_content': processor.highlight_text(content_text, highlight_terms, spans),
+            'match_type': match_type,
+            'matched_terms': found_matches,
+            'match_offsets': [[start, end] for start, end, _ in spans],
+            'total_matches': len(spans),
+            'query': keywords
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error highlighting document: {str(e)}'}), 500
+
+def parse_page_numbers(value):
+    """Page numbers from a list like "1,3-5"; None if it is malformed"""
+    page_numbers = set()
+    for part in value.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            return None
+        if first < 1 or last < first or last - first >= MAX_PAGE_RANGE:
+            return None
+        page_numbers.update(range(first, last + 1))
+    return sorted(page_numbers)
+
+@document_bp.route('/document/<int:document_id>/pages', methods=['GET'])
+def document_pages(document_id):
+    """Text of selected pages of a document: the pages=1,3-5 given, or the pages matching q.
+
+    Only the requested page rows are read, so large documents can be opened
+    at their matches without loading the whole text.
+    """
+    try:
+        keywords = request.args.get('q', '').strip()
+        page_param = request.args.get('pages', '').strip()
+        if not keywords and not page_param:
+            return jsonify({'error': 'Query parameter pages or q is required'}), 400
+
+        session = read_session()
+        document = session.query(Document.id, Document.title).filter(Document.id == document_id).first()
+        if document is None:
+            return jsonify({'error': 'Document not found'}), 404
+
+        highlight_terms = []
+        if keywords:
+            # Same precedence as search: the whole phrase, otherwise its individual words
+            index = get_search_index()
+            highlight_terms = [keywords]
+            matched_pages = index.matched_pages(document_id, highlight_terms)
+            if not matched_pages:
+                highlight_terms = keywords.split()
+                matched_pages = index.matched_pages(document_id, highlight_terms)
+
+        if page_param:
+            page_numbers = parse_page_numbers(page_param)
+            if page_numbers is None:
+                return jsonify({'error': 'pages must be a list of page numbers or ranges, e.g. 1,3-5'}), 400
+        else:
+            page_numbers = [page_number for page_number, _ in matched_pages or []]
+
+        max_pages = current_app.config.get('DOCUMENT_MAX_PAGES_PER_REQUEST', 50)
+        truncated = len(page_numbers) > max_pages
+        page_numbers = page_numbers[:max_pages]
+
+        page_count = session.query(func.count(DocumentPage.page_number)) \
+            .filter(DocumentPage.document_id == document_id).scalar()
+        rows = session.query(DocumentPage).filter(DocumentPage.document_id == document_id,
+                                                  DocumentPage.page_number.in_(page_numbers)) \
+            .order_by(DocumentPage.page_number).all() if page_numbers else []
+
+        pages = []
+        for page in rows:
+            page_text = page.text
+            page_result = {'page': page.page_number, 'start_offset': page.start_offset, 'length': page.length,
+                           'text': page_text}
+            if highlight_terms:
+                spans = processor.find_matches(page_text, highlight_terms)
+                page_result['highlighted_text'] = processor.highlight_text(page_text, highlight_terms, spans)
+                page_result['match_offsets'] = [[start, end] for start, end, _ in spans]
+                page_result['total_matches'] = len(spans)
+            pages.append(page_result)
+
+        result = {
+            'id': document.id,
+            'title': document.title,
+            'page_count': page_count,
+            'pages': pages,
+            'truncated': truncated
+        }
+        if keywords:
+            result['query'] = keywords
+            result['matched_pages'] = describe_matched_pages(matched_pages)
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error retrieving document pages: {str(e)}'}), 500
+
+@document_bp.route('/document/<int:document_id>/similar', methods=['GET'])
+def similar_documents(document_id):
+    """Top-k documents most similar to this one (cosine similarity of TF-IDF vectors)"""
+    try:
+        try:
+            k = int(request.args.get('k', DEFAULT_SIMILAR_K))
+        except ValueError:
+            return jsonify({'error': 'k must be an integer'}), 400
+        if k < 1 or k > MAX_SIMILAR_K:
+            return jsonify({'error': f'k must be between 1 and {MAX_SIMILAR_K}'}), 400
+
+        document = db.session.get(Document, document_id)
+        if document is None:
+            return jsonify({'error': 'Document not found'}), 404
+        start_time = time.time()
+        matches = vector_index.ensure_current().similar(document_id, k)
+
+        metadata_by_id = {}
+        if matches:
+            metadata_by_id = {row.id: row for row in db.session.query(Document.id, Document.title, Document.filename,
+                                                                      Document.classification)
+                              .filter(Document.id.in_([match_id for match_id, _ in matches])).all()}
+        similar = []
+        for match_id, score in matches:
+            metadata = metadata_by_id.get(match_id)
+            if metadata is None:
+                continue
+            similar.append({
+                'id': match_id,
+                'title': metadata.title,
+                'filename': metadata.filename,
+                'classification': metadata.classification,
+                'score': round(score, 6)
+            })
+
+        return jsonify({
+            'document_id': document.id,
+            'title': document.title,
+            'similar': similar,
+            'k': k,
+            'search_time': time.time() - start_time
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error finding similar documents: {str(e)}'}), 500
+
+def parse_threshold():
+    try:
+        threshold = float(request.args.get('threshold', DEFAULT_THRESHOLD))
+    except ValueError:
+        return None
+    return threshold if 0.0 < threshold <= 1.0 else None
+
+@document_bp.route('/document/<int:document_id>/near-duplicates', methods=['GET'])
+def near_duplicate_documents(document_id):
+    """Near-duplicates of one document with their estimated Jaccard similarity"""
+    try:
+        threshold = parse_threshold()
+        if threshold is None:
+            return jsonify({'error': 'threshold must be a number in (0, 1]'}), 400
+        if db.session.get(Document, document_id) is None:
+            return jsonify({'error': 'Document not found'}), 404
+
+        return jsonify({
+            'document_id': document_id,
+            'threshold': threshold,
+            'near_duplicates': describe_near_duplicates(document_id, threshold)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error finding near-duplicates: {str(e)}'}), 500
+
+@document_bp.route('/duplicates/clusters', methods=['GET'])
+def duplicate_clusters():
+    """Corpus-wide report of near-duplicate clusters"""
+    try:
+        threshold = parse_threshold()
+        if threshold is None:
+            return jsonify({'error': 'threshold must be a number in (0, 1]'}), 400
+
+        start_time = time.time()
+        backfill_signatures()
+        clusters = find_duplicate_clusters(threshold)
+
+        member_ids = {document_id for cluster in clusters for document_id in cluster['document_ids']}
+        documents_by_id = {}
+        if member_ids:
+            documents_by_id = {row.id: {'id': row.id, 'title': row.title, 'filename': row.filename}
+                               for row in db.session.query(Document.id, Document.title, Document.filename)
+                               .filter(Document.id.in_(member_ids))}
+        for cluster in clusters:
+            cluster['documents'] = [documents_by_id[document_id] for document_id in cluster['document_ids']
+                                    if document_id in documents_by_id]
+
+        return jsonify({
+            'clusters': clusters,
+            'cluster_count': len(clusters),
+            'duplicate_documents': len(member_ids),
+            'threshold': threshold,
+            'report_time': time.time() - start_time
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': f'Error building duplicate clusters: {str(e)}'}), 500
+
 @document_bp.route('/document/<int:document_id>', methods=['DELETE'])
 def delete_document(document_id):
     """Delete a specific document"""
     try:
         document = Document.query.get_or_404(document_id)
-        
-        # Delete the file from filesystem
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-        
+        file_path = document.file_path
+
         # Delete from database
+        fts_delete(db.session, [(document.id, document.title, document.content_text)])
+        # Removed in one statement instead of loading every page for the ORM cascade
+        DocumentPage.query.filter_by(document_id=document_id).delete()
         db.session.delete(document)
+        record_documents_removed([(document.classification, document.file_size)])
+        delete_document_vectors([document_id])
+        delete_signatures([document_id])
         db.session.commit()
+
+        # Delete the file once the row is gone, unless another document (same content) still uses it
+        discard_upload(file_path)
+
+        get_search_index().remove_document(document_id)
+        bump_corpus_version()
         
         return jsonify({'message': 'Document deleted successfully'}), 200
 
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error deleting document: {str(e)}'}), 500
 
 @document_bp.route('/debug/reset-db', methods=['POST'])
 def reset_database():
     """Reset database and create sample data for testing"""
     try:
-        # Clear existing data
-        SearchLog.query.delete()
+        # Clear existing data, including searches still waiting in the log writer's buffer
+        search_log_writer.discard()
+        db.session.query(SearchLog).delete()
+        fts_clear(db.session)
+        DocumentPage.query.delete()
+        DocumentContent.query.delete()
         Document.query.delete()
+        delete_document_vectors()
+        delete_signatures()
         db.session.commit()
 
         # Create sample documents for testing
@@ -330,9 +1608,9 @@ def reset_database():
             }
         ]
 
-        for doc_data in sample_docs:
-            doc = Document(**doc_data)
-            db.session.add(doc)
+        sample_documents = [Document(**doc_data, pages=DocumentPage.build_all([doc_data['content_text']]))
+                            for doc_data in sample_docs]
+        db.session.add_all(sample_documents)
 
         # Create sample search logs
         sample_searches = [
@@ -346,7 +1624,14 @@ def reset_database():
             search_log = SearchLog(**search_data)
             db.session.add(search_log)
 
+        db.session.flush()
+        fts_add(db.session, [(doc.id, doc.title, doc.content_text) for doc in sample_documents])
+        rebuild_statistics()
         db.session.commit()
+        rebuild_search_index()
+        backfill_signatures()
+        backfill_vectors()
+        bump_corpus_version()
 
         return jsonify({
             'message': 'Database reset successfully',
@@ -369,7 +1654,7 @@ def test_search():
             return jsonify({'error': 'Keywords are required'}), 400
 
         # Get all documents
-        all_documents = Document.query.all()
+        all_documents = Document.query.options(selectinload(Document.content)).all()
         documents_data = [doc.to_dict() for doc in all_documents]
 
         # Debug information
@@ -430,32 +1715,45 @@ def reprocess_documents():
     """Reprocess all documents to extract text content again"""
     try:
         documents = Document.query.all()
+        # Pin one model for the whole run, as /classify does
+        model = processor.get_model()
+        classifier_version = model[0]
         processed_count = 0
         errors = []
+        reindexed = []
+        unindexed = []
+        page_offsets = {}
 
         for document in documents:
             try:
                 if os.path.exists(document.file_path):
                     # Re-extract text content
-                    if document.filename.lower().endswith('.pdf'):
-                        new_content = processor.extract_text_from_pdf(document.file_path)
-                        new_title = processor.extract_title_from_pdf(document.file_path)
-                    elif document.filename.lower().endswith('.docx'):
-                        new_content = processor.extract_text_from_docx(document.file_path)
-                        new_title = processor.extract_title_from_docx(document.file_path)
-                    else:
+                    if not allowed_file(document.filename):
                         continue
+                    extracted = processor.extract_document(document.file_path, document.filename)
+                    new_content = extracted['text']
+                    new_title = extracted['title']
 
                     # Update document with new content
+                    previous = (document.id, document.title, document.content_text)
                     document.content_text = new_content
+                    document.pages = DocumentPage.build_all(extracted['pages'] or [new_content])
                     document.title = new_title
 
-                    # Re-classify if content changed
-                    if new_content:
-                        classification, confidence = processor.classify_document(new_content)
+                    # Re-classify if content changed, keeping labels given as feedback
+                    if new_content and document.classification_source != Document.SOURCE_USER:
+                        classification, confidence = processor.classify_documents([new_content], model)[0]
+                        record_reclassified([(document.classification, classification, document.file_size)])
                         document.classification = classification
                         document.classification_confidence = confidence
+                        document.classifier_version = classifier_version
+                        document.classification_source = Document.SOURCE_MODEL
+                        store_extraction(document.content_hash, extracted, classification, confidence, replace=True,
+                                         classifier_version=classifier_version)
 
+                    unindexed.append(previous)
+                    reindexed.append((document.id, new_title, new_content))
+                    page_offsets[document.id] = [page.start_offset for page in document.pages]
                     processed_count += 1
                     print(f"Reprocessed document: {document.filename}, Content length: {len(new_content)}")
 
@@ -465,7 +1763,21 @@ def reprocess_documents():
             except Exception as e:
                 errors.append(f"Error processing {document.filename}: {str(e)}")
 
+        # Vectors of the new text replace the stale ones in the same transaction
+        delete_document_vectors([document_id for document_id, _, _ in reindexed])
+        store_document_vectors([document_id for document_id, _, _ in reindexed],
+                               [content_text for _, _, content_text in reindexed])
+        delete_signatures([document_id for document_id, _, _ in reindexed])
+        fts_delete(db.session, unindexed)
+        fts_add(db.session, reindexed)
         db.session.commit()
+        backfill_signatures()
+
+        index = get_search_index()
+        for document_id, title, content_text in reindexed:
+            index.add_document(document_id, title, content_text, page_offsets.get(document_id))
+        if reindexed:
+            bump_corpus_version()
 
         return jsonify({
             'message': f'Successfully reprocessed {processed_count} documents',
@@ -490,15 +1802,21 @@ def test_highlight():
             return jsonify({'error': 'Both text and terms are required'}), 400
 
         # Test highlighting
-        highlighted = processor.highlight_text(text, terms)
+        start_time = time.time()
+        matches = processor.find_matches(text, terms)
+        highlighted = processor.highlight_text(text, terms, matches)
+        highlight_time = time.time() - start_time
 
         return jsonify({
             'original_text': text,
             'search_terms': terms,
             'highlighted_text': highlighted,
+            'matches': [{'start': start, 'end': end, 'term': term} for start, end, term in matches],
+            'match_count': len(matches),
             'contains_mark_tags': '<mark>' in highlighted,
             'text_length': len(text),
-            'highlighted_length': len(highlighted)
+            'highlighted_length': len(highlighted),
+            'highlight_time': highlight_time
         }), 200
 
     except Exception as e:
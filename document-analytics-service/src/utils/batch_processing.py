@@ -0,0 +1,90 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# One DocumentProcessor per worker process, created on the first file it handles
+_worker_processor = None
+_worker_model_dir = None
+
+# One long-lived pool shared by every batch request, like the PDF extraction pool
+_pool = None
+_pool_key = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(model_dir):
+    global _worker_model_dir
+    _worker_model_dir = model_dir
+
+
+def _get_worker_processor():
+    global _worker_processor
+    if _worker_processor is None:
+        from src.utils.document_processor import DocumentProcessor
+        # Workers load the active model from the shared store (memory-mapped) instead of retraining
+        _worker_processor = DocumentProcessor(_worker_model_dir) if _worker_model_dir else DocumentProcessor()
+        # Batch workers already run in parallel, so no nested page-parallel pools
+        _worker_processor.configure_extraction(workers=1)
+    return _worker_processor
+
+
+def process_file_in_worker(file):
+    """Extract and classify one (file_path, filename) pair. Runs inside a worker process."""
+    file_path, filename = file
+    try:
+        return file_path, _get_worker_processor().process_file(file_path, filename), None
+    except Exception as e:
+        return file_path, None, str(e)
+
+
+def _get_pool(workers, model_dir):
+    """The shared worker pool, recreated when the worker count or model store changes"""
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is None or _pool_key != (workers, model_dir):
+            _shutdown_pool()
+            # Workers are forked once for the life of the pool, not on every request. Not spawned:
+            # src/main.py creates the app at import, which spawned workers would run again
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_dir,))
+            _pool_key = (workers, model_dir)
+        return _pool
+
+
+def _shutdown_pool():
+    global _pool, _pool_key
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_key = None
+
+
+def shutdown_pool():
+    with _pool_lock:
+        _shutdown_pool()
+
+
+def iter_processed_files(files, workers, processor=None):
+    """Yield (file_path, result, error) for each (file_path, filename) pair, in input order.
+
+    With more than one worker the files are extracted and classified
+    concurrently on the shared process pool; otherwise they are processed
+    in-line with the given processor.
+    """
+    if workers <= 1 or len(files) <= 1:
+        for file_path, filename in files:
+            try:
+                yield file_path, (processor or _get_worker_processor()).process_file(file_path, filename), None
+            except Exception as e:
+                yield file_path, None, str(e)
+        return
+
+    model_dir = processor.model_store.root if processor else None
+    pool = _get_pool(workers, model_dir)
+    try:
+        yield from pool.map(process_file_in_worker, files)
+    except BrokenProcessPool:
+        # A worker died; the next batch gets a fresh pool
+        with _pool_lock:
+            if _pool is pool:
+                _shutdown_pool()
+        raise
@@ -1,11 +1,45 @@
 import os
 import re
+import math
+import time
+import uuid
+import hashlib
+import threading
 import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.pipeline import Pipeline
 import nltk
 from datetime import datetime
+from src.utils.pdf_pages import extract_page_range
+from src.utils.highlighter import get_matcher
+from src.utils.snippets import build_snippets
+from src.utils.model_store import ModelStore, DEFAULT_MODEL_DIR
+from src.utils.online_classifier import (ONLINE_MODEL_SOURCE, build_online_pipeline, is_online_pipeline,
+                                         partial_fit_pipeline, training_sample_count)
+
+DEFAULT_MAX_SNIPPETS = 5
+# Share of the query-coverage score given to documents matched only through fuzzy terms
+FUZZY_COVERAGE_WEIGHT = 0.5
+NON_LETTER_PATTERN = re.compile(r'[^a-zA-Z\s]')
+# Sample training data for different categories
+DEFAULT_TRAINING_DATA = [
+    ("research methodology analysis statistical significant", "Academic"),
+    ("university college student education learning", "Academic"),
+    ("business strategy market revenue profit", "Business"),
+    ("company management financial report quarterly", "Business"),
+    ("algorithm software programming code development", "Technical"),
+    ("system architecture database network security", "Technical"),
+    ("contract agreement legal terms conditions", "Legal"),
+    ("court case law regulation compliance", "Legal"),
+    ("medical patient treatment diagnosis therapy", "Medical"),
+    ("health clinical study pharmaceutical drug", "Medical"),
+    ("general information document text content", "General"),
+    ("various topics discussion overview summary", "General")
+]
+# How often (seconds) the model store's CURRENT pointer is checked for a swap by another process
+MODEL_CHECK_INTERVAL = 2.0
 
 try:
     from docx import Document as DocxDocument
@@ -26,134 +60,283 @@ except LookupError:
     nltk.download('stopwords')
 
 class DocumentProcessor:
-    def __init__(self):
-        self.classifier = None
+    def __init__(self, model_dir=DEFAULT_MODEL_DIR):
         self.categories = ['Academic', 'Business', 'Technical', 'Legal', 'Medical', 'General']
-        self._initialize_classifier()
+        self.extraction_workers = os.cpu_count() or 1
+        self.parallel_page_threshold = 50
+        self.pages_per_chunk = 16
+        self._extraction_pool = None
+        # The classifier is loaded from the model store on first use, not trained at import time
+        self.model_store = ModelStore(model_dir)
+        self._model = None  # (version, pipeline), replaced as a whole on swap
+        self._model_marker = None
+        self._model_checked_at = 0.0
+        self._model_lock = threading.Lock()
+        # Serializes online training so concurrent feedback batches in this process are not lost
+        self.training_lock = threading.Lock()
+
+    def configure_classifier(self, model_dir=None):
+        if model_dir and model_dir != self.model_store.root:
+            with self._model_lock:
+                self.model_store = ModelStore(model_dir)
+                self._model = None
+
+    def get_model(self):
+        """Return the active (version, pipeline), loading it lazily and picking up swaps"""
+        model = self._model
+        now = time.monotonic()
+        if model is not None and now - self._model_checked_at < MODEL_CHECK_INTERVAL:
+            return model
+
+        with self._model_lock:
+            self._model_checked_at = now
+            marker = self.model_store.current_marker()
+            if self._model is not None and marker == self._model_marker:
+                return self._model
+
+            version = self.model_store.active_version()
+            if version is None:
+                version = self._initialize_classifier()
+                marker = self.model_store.current_marker()
+            if self._model is None or self._model[0] != version:
+                # Load the new model completely before replacing the old one
+                self._model = (version, self.model_store.load(version))
+                print(f"Loaded classifier model {version}")
+            self._model_marker = marker
+            return self._model
+
+    def activate_model(self, version):
+        """Make a stored model the active one for every process using the store"""
+        pipeline = self.model_store.load(version)
+        self.model_store.activate(version)
+        with self._model_lock:
+            self._model = (version, pipeline)
+            self._model_marker = self.model_store.current_marker()
+            self._model_checked_at = time.monotonic()
+
+    def new_online_model(self, n_features):
+        """Hashing model seeded with the default sample data, so every category has a prior"""
+        pipeline = build_online_pipeline(n_features)
+        self.train_online_model(pipeline, [text for text, _ in DEFAULT_TRAINING_DATA],
+                                [label for _, label in DEFAULT_TRAINING_DATA])
+        return pipeline
+
+    def online_model_for_update(self, n_features):
+        """Writable copy of the active model if it is trainable online, else a new seeded hashing model.
+
+        Returns (pipeline, base_version); the serving model is never modified in place.
+        """
+        version, pipeline = self.get_model()
+        if is_online_pipeline(pipeline):
+            return self.model_store.load(version, mmap=False), version
+        return self.new_online_model(n_features), None
+
+    def train_online_model(self, pipeline, texts, labels):
+        """Apply one partial_fit batch of (text, label) pairs to an online pipeline"""
+        partial_fit_pipeline(pipeline, [self.clean_text(text) for text in texts], labels, self.categories)
+
+    def publish_model(self, pipeline, metadata, keep=5):
+        """Save a trained online model as a new version, activate it and prune old online versions"""
+        version = f"{ONLINE_MODEL_SOURCE}-{datetime.utcnow():%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:6]}"
+        metadata = dict(metadata, source=ONLINE_MODEL_SOURCE, training_samples=training_sample_count(pipeline))
+        self.model_store.save(pipeline, version, metadata)
+        self.activate_model(version)
+
+        online_versions = [name for name in self.model_store.list_versions()
+                           if name.startswith(ONLINE_MODEL_SOURCE + '-') and name != version]
+        for old_version in online_versions[:max(0, len(online_versions) - (keep - 1))]:
+            self.model_store.delete(old_version)
+        return version
+
+    @property
+    def classifier(self):
+        return self.get_model()[1]
+
+    @property
+    def classifier_version(self):
+        return self.get_model()[0]
+
+    def configure_extraction(self, workers=None, parallel_page_threshold=None, pages_per_chunk=None):
+        """Configure page-parallel PDF extraction (workers <= 1 disables it)"""
+        if workers is not None and workers != self.extraction_workers:
+            self.extraction_workers = workers
+            self.shutdown_extraction_pool()
+        if parallel_page_threshold is not None:
+            self.parallel_page_threshold = parallel_page_threshold
+        if pages_per_chunk is not None:
+            self.pages_per_chunk = max(1, pages_per_chunk)
+
+    def _get_extraction_pool(self):
+        if self._extraction_pool is None:
+            self._extraction_pool = ProcessPoolExecutor(max_workers=self.extraction_workers)
+        return self._extraction_pool
+
+    def shutdown_extraction_pool(self):
+        if self._extraction_pool is not None:
+            self._extraction_pool.shutdown(wait=False, cancel_futures=True)
+            self._extraction_pool = None
     
-    def extract_text_from_pdf(self, file_path):
-        """Extract text content from PDF file - Enhanced version"""
+    def extract_document(self, file_path, filename=None):
+        """Extract title, text, per-page text and metadata from a PDF or DOCX file.
+
+        filename is the name the file was uploaded as (stored files are named
+        by their hash); it provides the fallback title.
+        """
+        if file_path.lower().endswith('.pdf'):
+            return self.extract_pdf(file_path, filename)
+        return self.extract_docx(file_path, filename)
+
+    def extract_pdf(self, file_path, filename=None):
+        """Parse a PDF once and return its title, full text, per-page text and metadata"""
+        fallback_title = os.path.splitext(filename or os.path.basename(file_path))[0]
+        pages = []
+        title = fallback_title
+        metadata = {}
+
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                total_pages = len(pdf_reader.pages)
-
-                print(f"Extracting text from PDF: {file_path}, Total pages: {total_pages}")
-
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                        print(f"Page {page_num + 1}: extracted {len(page_text)} characters")
-                    else:
-                        print(f"Page {page_num + 1}: no text extracted")
-
-                final_text = text.strip()
-                print(f"Total text extracted: {len(final_text)} characters")
-                return final_text
+                page_count = len(pdf_reader.pages)
+                if self.extraction_workers > 1 and page_count >= self.parallel_page_threshold:
+                    pages = self._extract_pages_parallel(file_path, page_count)
+                else:
+                    pages = [page.extract_text() or '' for page in pdf_reader.pages]
+                metadata = self._read_pdf_metadata(pdf_reader)
+                title = self._read_pdf_title(pdf_reader, pages) or fallback_title
         except Exception as e:
-            print(f"Error extracting text from PDF: {e}")
-            return ""
-    
-    def extract_text_from_docx(self, file_path):
-        """Extract text content from DOCX file - Enhanced version"""
+            print(f"Error extracting PDF: {e}")
+
+        text = "\n".join(page_text for page_text in pages if page_text).strip()
+        print(f"Extracted PDF: {file_path}, {len(pages)} pages, {len(text)} characters")
+
+        return {
+            'title': title,
+            'text': text,
+            'pages': pages,
+            'metadata': metadata
+        }
+
+    def _extract_pages_parallel(self, file_path, page_count):
+        """Extract page chunks on the process pool and merge them back in page order"""
+        chunks = [(start, min(start + self.pages_per_chunk, page_count))
+                  for start in range(0, page_count, self.pages_per_chunk)]
+        pool = self._get_extraction_pool()
+        try:
+            futures = [pool.submit(extract_page_range, file_path, start, end) for start, end in chunks]
+            pages = [None] * page_count
+            for future in futures:
+                start, chunk_pages = future.result()
+                pages[start:start + len(chunk_pages)] = chunk_pages
+            print(f"Extracted {page_count} pages in {len(chunks)} parallel chunks")
+            return pages
+        except Exception as e:
+            # A broken pool is discarded so the next document gets a fresh one
+            print(f"Parallel PDF extraction failed, falling back to sequential: {e}")
+            self.shutdown_extraction_pool()
+            return extract_page_range(file_path, 0, page_count)[1]
+
+    def _read_pdf_title(self, pdf_reader, pages):
+        """Title from PDF metadata, else the first reasonable line of the first page"""
+        try:
+            if pdf_reader.metadata and pdf_reader.metadata.title:
+                return pdf_reader.metadata.title.strip()
+        except Exception as e:
+            print(f"Error extracting title from PDF: {e}")
+
+        if pages:
+            for line in pages[0].split('\n')[:10]:  # Check first 10 lines
+                line = line.strip()
+                if len(line) > 10 and len(line) < 200:  # Reasonable title length
+                    return line
+        return None
+
+    def _read_pdf_metadata(self, pdf_reader):
+        try:
+            metadata = {}
+            if pdf_reader.metadata:
+                metadata['author'] = pdf_reader.metadata.author if pdf_reader.metadata.author else None
+                metadata['creation_date'] = pdf_reader.metadata.creation_date if pdf_reader.metadata.creation_date else None
+                metadata['last_modified'] = pdf_reader.metadata.modification_date if pdf_reader.metadata.modification_date else None
+            return metadata
+        except Exception as e:
+            print(f"Error extracting metadata from PDF: {e}")
+            return {}
+
+    def extract_docx(self, file_path, filename=None):
+        """Open a DOCX once and return its title, full text and metadata"""
+        filename = filename or os.path.basename(file_path)
+        fallback_title = os.path.splitext(filename)[0]
+        title = fallback_title
+        text = f"DOCX file: {filename}"
+
         try:
             if DOCX_AVAILABLE:
                 doc = DocxDocument(file_path)
-                text = ""
-                paragraph_count = 0
-
-                print(f"Extracting text from DOCX: {file_path}")
-
-                for paragraph in doc.paragraphs:
-                    if paragraph.text.strip():  # Only add non-empty paragraphs
-                        text += paragraph.text + "\n"
-                        paragraph_count += 1
-
-                # Also extract text from tables if any
-                for table in doc.tables:
-                    for row in table.rows:
-                        for cell in row.cells:
-                            if cell.text.strip():
-                                text += cell.text + " "
-                    text += "\n"
-
-                final_text = text.strip()
-                print(f"DOCX extraction complete: {paragraph_count} paragraphs, {len(final_text)} characters")
-                return final_text
+                title = self._read_docx_title(doc) or fallback_title
+                text = self._read_docx_text(doc)
             else:
                 # Fallback when python-docx is not available
                 print(f"python-docx not available for file: {file_path}")
-                return f"DOCX file: {os.path.basename(file_path)}"
         except Exception as e:
-            print(f"Error extracting text from DOCX: {e}")
-            return f"DOCX file: {os.path.basename(file_path)}"
-    
+            print(f"Error extracting DOCX: {e}")
+
+        print(f"Extracted DOCX: {file_path}, {len(text)} characters")
+
+        return {
+            'title': title,
+            'text': text,
+            'pages': [text] if text else [],
+            'metadata': self.extract_metadata_from_docx(file_path)
+        }
+
+    def _read_docx_text(self, doc):
+        parts = []
+
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():  # Only add non-empty paragraphs
+                parts.append(paragraph.text + "\n")
+
+        # Also extract text from tables if any
+        for table in doc.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    if cell.text.strip():
+                        parts.append(cell.text + " ")
+            parts.append("\n")
+
+        return "".join(parts).strip()
+
+    def _read_docx_title(self, doc):
+        # Try to get title from document properties
+        if hasattr(doc.core_properties, 'title') and doc.core_properties.title:
+            return doc.core_properties.title.strip()
+
+        # Try to extract title from first paragraph
+        for paragraph in doc.paragraphs[:5]:  # Check first 5 paragraphs
+            text = paragraph.text.strip()
+            if len(text) > 10 and len(text) < 200:  # Reasonable title length
+                return text
+        return None
+
+    def extract_text_from_pdf(self, file_path):
+        """Extract text content from PDF file"""
+        return self.extract_pdf(file_path)['text']
+
+    def extract_text_from_docx(self, file_path):
+        """Extract text content from DOCX file"""
+        return self.extract_docx(file_path)['text']
+
     def extract_title_from_pdf(self, file_path):
         """Extract title from PDF metadata or content"""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Try to get title from metadata
-                if pdf_reader.metadata and pdf_reader.metadata.title:
-                    return pdf_reader.metadata.title.strip()
-                
-                # Try to extract title from first page content
-                if len(pdf_reader.pages) > 0:
-                    first_page_text = pdf_reader.pages[0].extract_text()
-                    lines = first_page_text.split('\n')
-                    for line in lines[:10]:  # Check first 10 lines
-                        line = line.strip()
-                        if len(line) > 10 and len(line) < 200:  # Reasonable title length
-                            return line
-                
-                # Fallback to filename
-                return os.path.splitext(os.path.basename(file_path))[0]
-        except Exception as e:
-            print(f"Error extracting title from PDF: {e}")
-            return os.path.splitext(os.path.basename(file_path))[0]
-    
+        return self.extract_pdf(file_path)['title']
+
     def extract_title_from_docx(self, file_path):
         """Extract title from DOCX file"""
-        try:
-            if DOCX_AVAILABLE:
-                doc = DocxDocument(file_path)
-
-                # Try to get title from document properties
-                if hasattr(doc.core_properties, 'title') and doc.core_properties.title:
-                    return doc.core_properties.title.strip()
+        return self.extract_docx(file_path)['title']
 
-                # Try to extract title from first paragraph
-                if doc.paragraphs:
-                    for paragraph in doc.paragraphs[:5]:  # Check first 5 paragraphs
-                        text = paragraph.text.strip()
-                        if len(text) > 10 and len(text) < 200:  # Reasonable title length
-                            return text
-
-            # Fallback to filename
-            return os.path.splitext(os.path.basename(file_path))[0]
-        except Exception as e:
-            print(f"Error extracting title from DOCX: {e}")
-            return os.path.splitext(os.path.basename(file_path))[0]
-    
     def extract_metadata_from_pdf(self, file_path):
         """Extract metadata from PDF file"""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                metadata = {}
-                
-                if pdf_reader.metadata:
-                    metadata['author'] = pdf_reader.metadata.author if pdf_reader.metadata.author else None
-                    metadata['creation_date'] = pdf_reader.metadata.creation_date if pdf_reader.metadata.creation_date else None
-                    metadata['last_modified'] = pdf_reader.metadata.modification_date if pdf_reader.metadata.modification_date else None
-                
-                return metadata
-        except Exception as e:
-            print(f"Error extracting metadata from PDF: {e}")
-            return {}
+        return self.extract_pdf(file_path)['metadata']
     
     def extract_metadata_from_docx(self, file_path):
         """Extract metadata from DOCX file - simplified version"""
@@ -171,126 +354,107 @@ class DocumentProcessor:
             return {}
     
     def _initialize_classifier(self):
-        """Initialize the document classifier with sample training data"""
-        # Sample training data for different categories
-        training_data = [
-            ("research methodology analysis statistical significant", "Academic"),
-            ("university college student education learning", "Academic"),
-            ("business strategy market revenue profit", "Business"),
-            ("company management financial report quarterly", "Business"),
-            ("algorithm software programming code development", "Technical"),
-            ("system architecture database network security", "Technical"),
-            ("contract agreement legal terms conditions", "Legal"),
-            ("court case law regulation compliance", "Legal"),
-            ("medical patient treatment diagnosis therapy", "Medical"),
-            ("health clinical study pharmaceutical drug", "Medical"),
-            ("general information document text content", "General"),
-            ("various topics discussion overview summary", "General")
-        ]
-        
+        """Train the default classifier on sample data, save it to the model store and activate it"""
+        training_data = DEFAULT_TRAINING_DATA
         texts = [item[0] for item in training_data]
         labels = [item[1] for item in training_data]
         
         # Create and train the classifier
-        self.classifier = Pipeline([
+        classifier = Pipeline([
             ('tfidf', TfidfVectorizer(stop_words='english', max_features=1000)),
             ('classifier', MultinomialNB())
         ])
         
-        self.classifier.fit(texts, labels)
+        classifier.fit(texts, labels)
+        # Identifies the model that produced a stored classification, so stale rows can be found
+        version = 'tfidf-nb-' + hashlib.sha1(repr(training_data).encode('utf-8')).hexdigest()[:12]
+        self.model_store.save(classifier, version, {'source': 'default', 'training_samples': len(texts)})
+        if self.model_store.active_version() is None:
+            self.model_store.activate(version)
+        return self.model_store.active_version()
     
+    def process_file(self, file_path, filename=None):
+        """Extract and classify a file, returning the extraction result plus classification"""
+        result = self.extract_document(file_path, filename)
+        model = self.get_model()
+        result['classification'], result['classification_confidence'] = self.classify_documents([result['text']],
+                                                                                                model)[0]
+        result['classifier_version'] = model[0]
+        result['file_size'] = os.path.getsize(file_path)
+        return result
+
+    def clean_text(self, text):
+        return NON_LETTER_PATTERN.sub('', text.lower())
+
     def classify_document(self, text):
         """Classify document based on its content"""
-        if not text or not self.classifier:
-            return "General", 0.5
-        
+        return self.classify_documents([text])[0]
+
+    def classify_documents(self, texts, model=None):
+        """Classify many texts at once, returning a (classification, confidence) pair per text.
+
+        All texts are vectorized into one sparse matrix and a single
+        predict_proba call yields both the label (the most probable class)
+        and its confidence. Pass model (a get_model() result) to pin the
+        version across several calls.
+        """
+        results = [("General", 0.5)] * len(texts)
+        positions = [position for position, text in enumerate(texts) if text]
+        if not positions:
+            return results
+
         try:
             # Clean and preprocess text
-            cleaned_text = re.sub(r'[^a-zA-Z\s]', '', text.lower())
-            
+            cleaned_texts = [self.clean_text(texts[position]) for position in positions]
+
             # Predict category and confidence
-            prediction = self.classifier.predict([cleaned_text])[0]
-            probabilities = self.classifier.predict_proba([cleaned_text])[0]
-            confidence = max(probabilities)
-            
-            return prediction, confidence
+            classifier = (model or self.get_model())[1]
+            probabilities = classifier.predict_proba(cleaned_texts)
+            best = probabilities.argmax(axis=1)
+            classes = classifier.classes_
+            for position, row, column in zip(positions, probabilities, best):
+                results[position] = (str(classes[column]), float(row[column]))
         except Exception as e:
-            print(f"Error classifying document: {e}")
-            return "General", 0.5
+            print(f"Error classifying documents: {e}")
+        return results
     
-    def highlight_text(self, text, search_terms):
-        """Highlight search terms (words, phrases, or sentences) in text"""
+    def find_matches(self, text, search_terms):
+        """Find all search term matches in one scan; returns non-overlapping (start, end, term) spans"""
         if not search_terms or not text:
-            return text
-
-        highlighted_text = text
-        print(f"Highlighting text with terms: {search_terms}")  # Debug
-
-        # Sort search terms by length (longest first) to avoid partial highlighting
-        sorted_terms = sorted(search_terms, key=len, reverse=True)
-
-        for term in sorted_terms:
-            if not term.strip():
-                continue
-
-            # Escape special regex characters
-            escaped_term = re.escape(term.strip())
-            print(f"Highlighting term: '{term}' (escaped: '{escaped_term}')")  # Debug
-
-            def replace_func(match):
-                highlighted = f"<mark>{match.group()}</mark>"
-                print(f"Replacing '{match.group()}' with '{highlighted}'")  # Debug
-                return highlighted
-
-            # Apply highlighting with case-insensitive matching
-            before_highlight = highlighted_text
-            highlighted_text = re.sub(escaped_term, replace_func, highlighted_text, flags=re.IGNORECASE)
-
-            # Check if highlighting actually happened
-            if before_highlight != highlighted_text:
-                print(f"Successfully highlighted '{term}' in text")
-            else:
-                print(f"No matches found for '{term}' in text")
+            return []
+        return get_matcher(search_terms).find_spans(text)
 
-        print(f"Final highlighted text length: {len(highlighted_text)}")  # Debug
-        return highlighted_text
+    def highlight_text(self, text, search_terms, spans=None):
+        """Highlight search terms (words, phrases, or sentences) in text in a single pass"""
+        if not search_terms or not text:
+            return text
+        return get_matcher(search_terms).render(text, spans)
     
-    def extract_match_contexts(self, text, search_terms, lines_before=1, lines_after=1):
-        """Extract context around matches (3 lines total: 1 before, match line, 1 after)"""
+    def extract_match_contexts(self, text, search_terms, lines_before=1, lines_after=1,
+                               max_snippets=DEFAULT_MAX_SNIPPETS, matches=None):
+        """Extract the best-ranked contexts around matches (lines before, match line, lines after)"""
         if not text or not search_terms:
             return []
+        if matches is None:
+            matches = self.find_matches(text, search_terms)
+        contexts, _ = build_snippets(text, matches, max_snippets=max_snippets,
+                                     context_lines=max(lines_before, lines_after))
+        return contexts
 
-        # Split text into lines
-        lines = text.split('\n')
-        contexts = []
-
-        for term in search_terms:
-            term_lower = term.lower()
-
-            # Find all lines containing the term
-            for i, line in enumerate(lines):
-                if term_lower in line.lower():
-                    # Calculate context range
-                    start_idx = max(0, i - lines_before)
-                    end_idx = min(len(lines), i + lines_after + 1)
-
-                    # Extract context lines
-                    context_lines = lines[start_idx:end_idx]
-                    context_text = '\n'.join(context_lines)
+    def match_query(self, content_text, title, keywords):
+        """Return (found_matches, match_type) for one document, or ([], None) if it does not match"""
+        search_query = keywords.strip()
 
-                    # Highlight the term in context
-                    highlighted_context = self.highlight_text(context_text, [term])
+        # Search in both content and title (case-insensitive)
+        full_content = (content_text + ' ' + title).lower()
 
-                    contexts.append({
-                        'term': term,
-                        'line_number': i + 1,
-                        'context': highlighted_context,
-                        'context_start_line': start_idx + 1,
-                        'context_end_line': end_idx,
-                        'match_line_in_context': i - start_idx
-                    })
+        # First: Try to find the exact phrase/sentence (case-insensitive)
+        if search_query.lower() in full_content:
+            return [search_query], 'exact_phrase'  # Keep original case for highlighting
 
-        return contexts
+        # Second: If no exact phrase match, search for individual words
+        found_matches = [word for word in search_query.split() if word.lower() in full_content]
+        return found_matches, 'individual_words' if found_matches else None
 
     def search_documents(self, documents, keywords):
         """Search documents for keywords, phrases, and sentences - Enhanced version with contexts"""
@@ -299,63 +463,97 @@ class DocumentProcessor:
 
         matching_docs = []
         search_query = keywords.strip()
-        search_query_lower = search_query.lower()
-
-        # Split into individual words for fallback search
-        individual_words = [word.strip() for word in keywords.split() if word.strip()]
 
         print(f"Searching for: '{search_query}' in {len(documents)} documents")  # Debug
 
         for doc in documents:
-            content_text = doc.get('content_text', '')
-            title = doc.get('title', '')
-
-            # Debug: Print content length
-            print(f"Document '{title}' content length: {len(content_text)} characters")
-
-            # Search in both content and title (case-insensitive)
-            full_content = (content_text + ' ' + title).lower()
-
-            found_matches = []
-            match_type = None
-
-            # First: Try to find the exact phrase/sentence (case-insensitive)
-            if search_query_lower in full_content:
-                found_matches.append(search_query)  # Keep original case for highlighting
-                match_type = 'exact_phrase'
-                print(f"Found exact phrase '{search_query}' in document '{title}'")
-            else:
-                # Second: If no exact phrase match, search for individual words
-                for word in individual_words:
-                    word_lower = word.lower()
-                    if word_lower in full_content:
-                        found_matches.append(word)  # Keep original case for highlighting
-                        print(f"Found word '{word}' in document '{title}'")
-                if found_matches:
-                    match_type = 'individual_words'
+            found_matches, match_type = self.match_query(doc.get('content_text') or '', doc.get('title') or '',
+                                                         search_query)
 
             # If any matches found, add to results
             if found_matches:
-                # For highlighting, use the original search query if it's an exact match
-                highlight_terms = [search_query] if match_type == 'exact_phrase' else found_matches
-
-                # Extract contexts around matches
-                match_contexts = self.extract_match_contexts(content_text, highlight_terms)
-
-                highlighted_content = self.highlight_text(content_text, highlight_terms)
-                highlighted_title = self.highlight_text(title, highlight_terms)
-
-                doc_copy = doc.copy()
-                doc_copy['highlighted_content'] = highlighted_content
-                doc_copy['highlighted_title'] = highlighted_title
-                doc_copy['matched_terms'] = found_matches
-                doc_copy['match_type'] = match_type
-                doc_copy['search_query'] = search_query
-                doc_copy['match_contexts'] = match_contexts  # Add contexts
-                doc_copy['total_matches'] = len(match_contexts)  # Add total count
-                doc_copy['content_preview'] = content_text[:500] + '...' if len(content_text) > 500 else content_text
-                matching_docs.append(doc_copy)
+                matching_docs.append(self.build_search_result(doc, search_query, found_matches, match_type))
 
         print(f"Search completed. Found {len(matching_docs)} matching documents")  # Debug
         return matching_docs
 
+    def score_match(self, search_query, found_matches, match_type, total_matches, content_length):
+        """Relevance score: exact phrases first, then query coverage, then match density"""
+        query_words = max(1, len(search_query.split()))
+        # Fuzzy expansions can add more matched terms than the query has words
+        coverage = 1.0 if match_type == 'exact_phrase' else min(1.0, len(found_matches) / query_words)
+        if match_type == 'fuzzy':
+            # Only approximate terms matched; rank below documents containing the words themselves
+            coverage *= FUZZY_COVERAGE_WEIGHT
+        density = total_matches / math.log(content_length + math.e) if total_matches else 0.0
+        return round((2.0 if match_type == 'exact_phrase' else 0.0) + coverage + math.log1p(density), 4)
+
+    def build_compact_result(self, doc_id, title, content_text, search_query, found_matches, match_type,
+                             max_snippets=DEFAULT_MAX_SNIPPETS, context_lines=1, max_offsets=100):
+        """Search hit without document bodies: id, title, score, snippets and match offsets"""
+        content_text = content_text or ''
+        title = title or ''
+        highlight_terms = [search_query] if match_type == 'exact_phrase' else found_matches
+
+        content_matches = self.find_matches(content_text, highlight_terms)
+        snippets, total_matches = build_snippets(content_text, content_matches,
+                                                 max_snippets=max_snippets, context_lines=context_lines)
+        for snippet in snippets:
+            snippet.pop('matches', None)
+
+        return {
+            'id': doc_id,
+            'title': title,
+            'highlighted_title': self.highlight_text(title, highlight_terms),
+            'score': self.score_match(search_query, found_matches, match_type, total_matches, len(content_text)),
+            'match_type': match_type,
+            'matched_terms': found_matches,
+            'snippets': snippets,
+            'total_matches': total_matches,
+            'match_offsets': [[start, end] for start, end, _ in content_matches[:max_offsets]],
+            'match_offsets_truncated': len(content_matches) > max_offsets
+        }
+
+    def build_page_hit(self, page_number, start_offset, page_text, highlight_terms,
+                       max_snippets=DEFAULT_MAX_SNIPPETS, context_lines=1):
+        """Snippets of one matching page; offsets are relative to the page text"""
+        page_text = page_text or ''
+        page_matches = self.find_matches(page_text, highlight_terms)
+        snippets, total_matches = build_snippets(page_text, page_matches,
+                                                 max_snippets=max_snippets, context_lines=context_lines)
+        for snippet in snippets:
+            snippet.pop('matches', None)
+        return {
+            'page': page_number,
+            'start_offset': start_offset,
+            'snippets': snippets,
+            'total_matches': total_matches
+        }
+
+    def build_search_result(self, doc, search_query, found_matches, match_type,
+                            max_snippets=DEFAULT_MAX_SNIPPETS, context_lines=1):
+        """Attach highlights and the top-ranked match contexts to a matching document dictionary"""
+        content_text = doc.get('content_text') or ''
+        title = doc.get('title') or ''
+
+        # For highlighting, use the original search query if it's an exact match
+        highlight_terms = [search_query] if match_type == 'exact_phrase' else found_matches
+
+        # One scan finds every match; snippets and highlighting both reuse the spans
+        content_matches = self.find_matches(content_text, highlight_terms)
+        match_contexts, total_matches = build_snippets(content_text, content_matches,
+                                                       max_snippets=max_snippets, context_lines=context_lines)
+
+        highlighted_content = self.highlight_text(content_text, highlight_terms, content_matches)
+        highlighted_title = self.highlight_text(title, highlight_terms)
+
+        doc_copy = doc.copy()
+        doc_copy['highlighted_content'] = highlighted_content
+        doc_copy['highlighted_title'] = highlighted_title
+        doc_copy['matched_terms'] = found_matches
+        doc_copy['match_type'] = match_type
+        doc_copy['search_query'] = search_query
+        doc_copy['match_contexts'] = match_contexts  # Best-ranked contexts only
+        doc_copy['total_matches'] = total_matches  # True number of matches in the content
+        doc_copy['content_preview'] = content_text[:500] + '...' if len(content_text) > 500 else content_text
+        return doc_copy
@@ -0,0 +1,50 @@
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.document import ExtractionCache
+
+
+def lookup_extraction(content_hash, classifier_version=None):
+    """Return (extracted, classification, confidence) cached for this content, or None.
+
+    When classifier_version is given and the cached classification came from
+    another model, classification and confidence are returned as None so the
+    caller reclassifies the cached text.
+    """
+    if not content_hash:
+        return None
+    entry = db.session.get(ExtractionCache, content_hash)
+    if entry is None:
+        return None
+    entry.hit_count = ExtractionCache.hit_count + 1
+    if classifier_version is not None and entry.classifier_version != classifier_version:
+        return entry.get_extraction(), None, None
+    return entry.get_extraction(), entry.classification, entry.classification_confidence
+
+
+def store_extraction(content_hash, extracted, classification, confidence, replace=False, classifier_version=None):
+    """Add (or with replace=True, overwrite) the cache entry for this content.
+
+    The statement joins the caller's transaction; the caller commits.
+    """
+    if not content_hash:
+        return
+    entry = ExtractionCache(content_hash=content_hash)
+    entry.set_extraction(extracted)
+    values = {
+        'content_hash': content_hash,
+        'payload': entry.payload,
+        'classification': classification,
+        'classification_confidence': confidence,
+        'classifier_version': classifier_version,
+        'hit_count': 0
+    }
+    statement = sqlite_insert(ExtractionCache).values(**values)
+    if replace:
+        statement = statement.on_conflict_do_update(
+            index_elements=[ExtractionCache.content_hash],
+            set_={key: value for key, value in values.items() if key not in ('content_hash', 'hit_count')}
+        )
+    else:
+        # Concurrent uploads of the same content keep whichever entry was stored first
+        statement = statement.on_conflict_do_nothing(index_elements=[ExtractionCache.content_hash])
+    db.session.execute(statement)
@@ -0,0 +1,140 @@
+from sqlalchemy import text
+from src.utils.search_index import tokenize
+
+FTS_TABLE = 'documents_fts'
+
+# Relative BM25 weights of the indexed columns (title, content_text)
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+SNIPPET_TOKENS = 32
+
+_fts_available = None
+
+# FTS5 keeps only the index; the text it highlights and snips comes from this view, which
+# decompresses document_contents through the document_text() SQL function (see storage.py)
+FTS_CONTENT_VIEW = 'documents_fts_content'
+
+FTS_SCHEMA = [
+    f"""CREATE VIEW IF NOT EXISTS {FTS_CONTENT_VIEW} AS
+        SELECT documents.id AS id, documents.title AS title,
+               document_text(document_contents.body, document_contents.codec) AS content_text
+        FROM documents LEFT JOIN document_contents ON document_contents.document_id = documents.id""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, content_text, content='{FTS_CONTENT_VIEW}', content_rowid='id', tokenize='unicode61'
+    )""",
+]
+
+
+def ensure_fts_index(engine):
+    """Create the FTS5 index over documents' titles and decompressed text.
+
+    The index is maintained by the application (fts_add/fts_delete) in the
+    same transaction as the document rows. An index left by older versions,
+    which mirrored documents.content_text through triggers, is rebuilt.
+    """
+    global _fts_available
+    if engine.dialect.name != 'sqlite':
+        _fts_available = False
+        return False
+
+    try:
+        with engine.begin() as connection:
+            existing = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).scalar()
+            if existing is not None and FTS_CONTENT_VIEW not in existing:
+                connection.execute(text(f"DROP TABLE {FTS_TABLE}"))
+                existing = None
+            for statement in FTS_SCHEMA:
+                connection.execute(text(statement))
+            if existing is None:
+                # Index documents that were stored before this FTS table existed
+                connection.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        _fts_available = True
+    except Exception as e:
+        print(f"FTS5 full-text search not available: {e}")
+        _fts_available = False
+    return _fts_available
+
+
+def fts_add(session, documents):
+    """Index (id, title, text) tuples in the caller's transaction"""
+    if fts_available() and documents:
+        session.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, title, content_text) VALUES (:id, :title, :text)"),
+                        [{'id': document_id, 'title': title, 'text': content or ''}
+                         for document_id, title, content in documents])
+
+
+def fts_delete(session, documents):
+    """Remove (id, title, text) tuples, given exactly as they were indexed, in the caller's transaction"""
+    if fts_available() and documents:
+        session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, content_text) "
+                             f"VALUES ('delete', :id, :title, :text)"),
+                        [{'id': document_id, 'title': title, 'text': content or ''}
+                         for document_id, title, content in documents])
+
+
+def fts_clear(session):
+    """Empty the index in the caller's transaction"""
+    if fts_available():
+        session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')"))
+
+
+def fts_available():
+    return bool(_fts_available)
+
+
+def _quote(phrase):
+    return '"' + phrase.replace('"', '""') + '"'
+
+
+def build_match_query(keywords, extra_terms=()):
+    """Build an FTS5 MATCH expression: the exact phrase OR any of the individual words (or extra_terms)"""
+    search_query = keywords.strip()
+    clauses = []
+    if tokenize(search_query):
+        clauses.append(_quote(search_query))
+    for word in search_query.split():
+        if tokenize(word) and _quote(word) not in clauses:
+            clauses.append(_quote(word))
+    for term in extra_terms:
+        if _quote(term) not in clauses:
+            clauses.append(_quote(term))
+    return ' OR '.join(clauses)
+
+
+def fts_search(session, keywords, limit=20, offset=0, include_content=True, extra_terms=()):
+    """Run a BM25-ranked FTS5 query.
+
+    Returns (rows, total) where each row has id, score (higher is better),
+    highlighted_title, highlighted_content and snippet, all computed by SQLite.
+    With include_content=False the full-body highlight is skipped and
+    highlighted_content is NULL. extra_terms (fuzzy expansions of the query
+    words) are matched like the words themselves.
+    """
+    match_query = build_match_query(keywords, extra_terms)
+    if not match_query:
+        return [], 0
+
+    params = {'match': match_query, 'limit': limit, 'offset': offset}
+    total = session.execute(
+        text(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"),
+        params
+    ).scalar()
+
+    content_highlight = f"highlight({FTS_TABLE}, 1, '<mark>', '</mark>')" if include_content else 'NULL'
+    rows = session.execute(text(f"""
+        SELECT rowid AS id,
+               -bm25({FTS_TABLE}, {TITLE_WEIGHT}, {CONTENT_WEIGHT}) AS score,
+               highlight({FTS_TABLE}, 0, '<mark>', '</mark>') AS highlighted_title,
+               {content_highlight} AS highlighted_content,
+               snippet({FTS_TABLE}, 1, '<mark>', '</mark>', '...', {SNIPPET_TOKENS}) AS snippet
+        FROM {FTS_TABLE}
+        WHERE {FTS_TABLE} MATCH :match
+        ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, {CONTENT_WEIGHT})
+        LIMIT :limit OFFSET :offset
+    """), params).mappings().all()
+
+    return rows, total
@@ -0,0 +1,59 @@
+import re
+from functools import lru_cache
+
+MARK_OPEN = '<mark>'
+MARK_CLOSE = '</mark>'
+
+
+class TermMatcher:
+    """All search terms compiled into one case-insensitive alternation.
+
+    Terms are tried longest first, so at any position the longest term wins,
+    and finditer never returns overlapping matches. One scan of the text
+    finds every match of every term.
+    """
+
+    def __init__(self, terms):
+        unique_terms = {}
+        for term in terms:
+            term = term.strip()
+            if term and term.lower() not in unique_terms:
+                unique_terms[term.lower()] = term
+        self.terms = sorted(unique_terms.values(), key=len, reverse=True)
+        self.pattern = None
+        if self.terms:
+            self.pattern = re.compile('|'.join(f'({re.escape(term)})' for term in self.terms), re.IGNORECASE)
+
+    def find_spans(self, text):
+        """Return non-overlapping (start, end, term) matches in text order"""
+        if not text or self.pattern is None:
+            return []
+        return [(match.start(), match.end(), self.terms[match.lastindex - 1])
+                for match in self.pattern.finditer(text)]
+
+    def render(self, text, spans=None):
+        """Wrap every match in <mark> tags"""
+        if spans is None:
+            spans = self.find_spans(text)
+        if not spans:
+            return text
+        parts = []
+        position = 0
+        for start, end, _ in spans:
+            parts.append(text[position:start])
+            parts.append(MARK_OPEN)
+            parts.append(text[start:end])
+            parts.append(MARK_CLOSE)
+            position = end
+        parts.append(text[position:])
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=256)
+def _cached_matcher(terms):
+    return TermMatcher(terms)
+
+
+def get_matcher(terms):
+    """Return a compiled matcher for the terms, reusing recently compiled ones"""
+    return _cached_matcher(tuple(terms))
@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, insert, literal, select
+from src.models.user import db
+from src.models.ingestion_job import IngestionJob
+
+
+class QueueFullError(Exception):
+    """Raised when the ingestion queue has reached its pending job limit"""
+
+
+class DuplicateContentError(Exception):
+    """Raised when an upload's content is already stored and duplicates=existing; .document is the stored one"""
+
+    def __init__(self, document):
+        super().__init__(f'Document {document.id} has identical content')
+        self.document = document
+
+
+class IngestionQueue:
+    """Background ingestion backed by the ingestion_jobs table.
+
+    Jobs are persisted before they are handed to a bounded thread pool. A
+    worker that claims a job holds a lease on it: a heartbeat thread renews
+    heartbeat_at every lease_seconds / 3 while the job runs. Jobs still
+    queued, and running jobs whose lease has expired because their worker
+    stopped, are picked up again by resume_pending() on start and by the
+    heartbeat thread; jobs another live worker is processing are left alone.
+    """
+
+    def __init__(self, process_func, max_workers=2, max_pending=100, lease_seconds=60):
+        # process_func(file_path, filename, timings, content_hash=..., duplicate_mode=...) -> Document;
+        # runs inside an app context
+        self.process_func = process_func
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        self._token = uuid.uuid4().hex[:8]
+        self.app = None
+        self._executor = None
+        self._heartbeat_thread = None
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('INGESTION_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('INGESTION_MAX_PENDING', self.max_pending)
+        self.lease_seconds = app.config.get('INGESTION_LEASE_SECONDS', self.lease_seconds)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='ingestion')
+            # Started lazily so forking servers start it in each worker, not in the parent
+            if self._heartbeat_thread is None or not self._heartbeat_thread.is_alive():
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='ingestion-heartbeat',
+                                                          daemon=True)
+                self._heartbeat_thread.start()
+            return self._executor
+
+    @property
+    def worker_id(self):
+        # Includes the pid so workers forked from one parent hold distinct leases
+        return f'{socket.gethostname()}:{os.getpid()}:{self._token}'
+
+    def pending_count(self):
+        return IngestionJob.query.filter(IngestionJob.status.in_(IngestionJob.PENDING_STATUSES)).count()
+
+    def submit(self, file_path, filename, timings=None, content_hash=None, duplicate_mode=None):
+        """Persist a new job and schedule it. Raises QueueFullError when the queue is full.
+
+        The pending count and the insert are one INSERT ... SELECT statement,
+        so concurrent submissions cannot overshoot max_pending.
+        """
+        values = {'id': uuid.uuid4().hex, 'status': IngestionJob.STATUS_QUEUED, 'filename': filename,
+                  'file_path': file_path, 'content_hash': content_hash, 'stage_timings': json.dumps(timings or {}),
+                  'duplicate_mode': duplicate_mode, 'attempts': 0, 'created_at': datetime.utcnow()}
+        pending = (select(func.count()).select_from(IngestionJob)
+                   .where(IngestionJob.status.in_(IngestionJob.PENDING_STATUSES)).scalar_subquery())
+        statement = insert(IngestionJob).from_select(
+            list(values), select(*(literal(value, IngestionJob.__table__.c[column].type)
+                                   for column, value in values.items())).where(pending < self.max_pending))
+        inserted = db.session.execute(statement).rowcount
+        db.session.commit()
+        if inserted != 1:
+            raise QueueFullError(f'Ingestion queue is full ({self.max_pending} pending jobs)')
+
+        self._get_executor().submit(self._run, values['id'])
+        return db.session.get(IngestionJob, values['id'])
+
+    def _requeue_expired(self):
+        """Move running jobs whose lease has expired back to queued; returns their ids"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        expired = func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at, IngestionJob.created_at) < cutoff
+        job_ids = [job_id for job_id, in db.session.query(IngestionJob.id)
+                   .filter(IngestionJob.status == IngestionJob.STATUS_RUNNING, expired).all()]
+        if not job_ids:
+            return []
+        # The lease is checked again in the update in case the owner renewed it meanwhile
+        IngestionJob.query.filter(IngestionJob.id.in_(job_ids), IngestionJob.status == IngestionJob.STATUS_RUNNING,
+                                  expired).update({'status': IngestionJob.STATUS_QUEUED, 'worker_id': None},
+                                                  synchronize_session=False)
+        db.session.commit()
+        return [job_id for job_id, in db.session.query(IngestionJob.id)
+                .filter(IngestionJob.id.in_(job_ids), IngestionJob.status == IngestionJob.STATUS_QUEUED).all()]
+
+    def resume_pending(self):
+        """Reschedule queued jobs and running jobs whose worker's lease has expired"""
+        requeued = self._requeue_expired()
+        job_ids = [job.id for job in IngestionJob.query.filter_by(status=IngestionJob.STATUS_QUEUED)
+                   .order_by(IngestionJob.created_at).all()]
+        for job_id in job_ids:
+            self._get_executor().submit(self._run, job_id)
+        if job_ids:
+            print(f"Resumed {len(job_ids)} pending ingestion jobs ({len(requeued)} with expired leases)")
+        return len(job_ids)
+
+    def _renew_leases(self):
+        with self._lock:
+            job_ids = list(self._active)
+        if job_ids:
+            IngestionJob.query.filter(IngestionJob.id.in_(job_ids), IngestionJob.worker_id == self.worker_id,
+                                      IngestionJob.status == IngestionJob.STATUS_RUNNING) \
+                .update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(max(self.lease_seconds / 3, 0.1))
+            with self.app.app_context():
+                try:
+                    self._renew_leases()
+                    for job_id in self._requeue_expired():
+                        print(f"Ingestion job {job_id} lease expired, requeued")
+                        self._get_executor().submit(self._run, job_id)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error renewing ingestion leases: {e}")
+                finally:
+                    db.session.remove()
+
+    def _claim(self, job_id):
+        """Atomically move a job from queued to running so only one worker processes it"""
+        now = datetime.utcnow()
+        claimed = IngestionJob.query.filter_by(id=job_id, status=IngestionJob.STATUS_QUEUED).update({
+            'status': IngestionJob.STATUS_RUNNING,
+            'started_at': now,
+            'heartbeat_at': now,
+            'worker_id': self.worker_id,
+            'attempts': IngestionJob.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed == 1:
+            with self._lock:
+                self._active.add(job_id)
+        return claimed == 1
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+
+                job = db.session.get(IngestionJob, job_id)
+                timings = job.get_stage_timings()
+                wait_time = (job.started_at - job.created_at).total_seconds() if job.created_at else 0
+                timings['queue_wait'] = wait_time
+                start_time = time.time()
+                try:
+                    document = self.process_func(job.file_path, job.filename, timings, content_hash=job.content_hash,
+                                                 duplicate_mode=job.duplicate_mode)
+                    timings['total_processing'] = time.time() - start_time
+                    job = db.session.get(IngestionJob, job_id)
+                    job.status = IngestionJob.STATUS_COMPLETED
+                    job.document_id = document.id
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Ingestion job {job_id} failed: {e}")
+                    timings['total_processing'] = time.time() - start_time
+                    job = db.session.get(IngestionJob, job_id)
+                    job.status = IngestionJob.STATUS_FAILED
+                    job.error = str(e)
+
+                job.set_stage_timings(timings)
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error running ingestion job {job_id}: {e}")
+            finally:
+                with self._lock:
+                    self._active.discard(job_id)
+                db.session.remove()
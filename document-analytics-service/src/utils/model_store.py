@@ -0,0 +1,110 @@
+import os
+import json
+import uuid
+import shutil
+from datetime import datetime
+import joblib
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'models')
+MODEL_FILE = 'model.joblib'
+META_FILE = 'meta.json'
+CURRENT_FILE = 'CURRENT'
+
+
+class ModelNotFoundError(KeyError):
+    """Raised when a model version does not exist in the store"""
+
+
+class ModelStore:
+    """Trained classifier pipelines saved on disk, one directory per version.
+
+    Models are written uncompressed with joblib so their numpy arrays can be
+    memory-mapped on load and shared between processes through the page
+    cache. The CURRENT file names the active version; it is replaced
+    atomically, so readers always see either the old or the new model.
+    """
+
+    def __init__(self, root=DEFAULT_MODEL_DIR):
+        self.root = root
+
+    def _version_dir(self, version):
+        if not version or os.sep in version or version.startswith('.'):
+            raise ModelNotFoundError(version)
+        return os.path.join(self.root, version)
+
+    def exists(self, version):
+        try:
+            return os.path.exists(os.path.join(self._version_dir(version), MODEL_FILE))
+        except ModelNotFoundError:
+            return False
+
+    def save(self, pipeline, version, metadata=None):
+        """Write a model under the given version; an existing version is left untouched"""
+        if self.exists(version):
+            return version
+        os.makedirs(self.root, exist_ok=True)
+
+        # Write into a temporary directory and rename it into place in one step
+        temp_dir = os.path.join(self.root, f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(temp_dir)
+        try:
+            joblib.dump(pipeline, os.path.join(temp_dir, MODEL_FILE))
+            meta = dict(metadata or {}, version=version, created_at=datetime.utcnow().isoformat())
+            with open(os.path.join(temp_dir, META_FILE), 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(temp_dir, self._version_dir(version))
+        except OSError:
+            # Another process saved the same version first
+            if not self.exists(version):
+                raise
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return version
+
+    def load(self, version, mmap=True):
+        """Load a saved pipeline, memory-mapping its arrays unless mmap=False"""
+        path = os.path.join(self._version_dir(version), MODEL_FILE)
+        if not os.path.exists(path):
+            raise ModelNotFoundError(version)
+        return joblib.load(path, mmap_mode='r' if mmap else None)
+
+    def metadata(self, version):
+        path = os.path.join(self._version_dir(version), META_FILE)
+        if not os.path.exists(path):
+            return {'version': version}
+        with open(path) as meta_file:
+            return json.load(meta_file)
+
+    def list_versions(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if not name.startswith('.') and self.exists(name))
+
+    def active_version(self):
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as current_file:
+                return current_file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def current_marker(self):
+        """Cheap change marker for the CURRENT pointer (its mtime), used to notice swaps by other processes"""
+        try:
+            return os.stat(os.path.join(self.root, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def delete(self, version):
+        """Remove a saved version; the active version is never deleted"""
+        if version == self.active_version():
+            raise ValueError(f'Cannot delete the active model {version}')
+        shutil.rmtree(self._version_dir(version), ignore_errors=True)
+
+    def activate(self, version):
+        """Point CURRENT at a saved version"""
+        if not self.exists(version):
+            raise ModelNotFoundError(version)
+        temp_path = os.path.join(self.root, f'.{CURRENT_FILE}-{uuid.uuid4().hex}')
+        with open(temp_path, 'w') as current_file:
+            current_file.write(version)
+        os.replace(temp_path, os.path.join(self.root, CURRENT_FILE))
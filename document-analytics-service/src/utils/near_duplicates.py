@@ -0,0 +1,189 @@
+import zlib
+import hashlib
+import numpy as np
+from sqlalchemy import func, tuple_
+from src.models.user import db
+from src.models.document import Document, DocumentSignature, LshBucket
+from src.utils.search_index import tokenize
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+# 32 bands of 4 rows: pairs above ~0.6 Jaccard almost always share a band, pairs below ~0.25 rarely do
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+DEFAULT_THRESHOLD = 0.5
+BACKFILL_BATCH_SIZE = 200
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(1)
+_PERMUTATION_A = _random.randint(1, _MERSENNE_PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+_PERMUTATION_B = _random.randint(0, _MERSENNE_PRIME, size=NUM_PERMUTATIONS).astype(np.uint64)
+
+
+def shingle_hashes(text):
+    """CRC32 hashes of the distinct word k-shingles of a text (stable across processes)"""
+    words = tokenize(text or '')
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    if len(words) < SHINGLE_SIZE:
+        shingles = {' '.join(words)}
+    else:
+        shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+
+def minhash_signature(text):
+    """MinHash signature (NUM_PERMUTATIONS uint32 values), or None for texts without words"""
+    hashes = shingle_hashes(text) % _MERSENNE_PRIME
+    if not len(hashes):
+        return None
+    # All permutations at once: (a * h + b) mod p for every permutation and shingle
+    permuted = (np.outer(_PERMUTATION_A, hashes) + _PERMUTATION_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature):
+    """(band, bucket) LSH keys of a signature, one per band"""
+    keys = []
+    for band in range(LSH_BANDS):
+        chunk = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes()
+        bucket = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'big', signed=True)
+        keys.append((band, bucket))
+    return keys
+
+
+def estimate_jaccard(signature, other):
+    return float(np.count_nonzero(signature == other)) / NUM_PERMUTATIONS
+
+
+def _decode(blob):
+    return np.frombuffer(blob, dtype=np.uint32)
+
+
+def store_signature(document_id, text):
+    """Add the document's signature and LSH bucket rows to the session; the caller commits"""
+    signature = minhash_signature(text)
+    if signature is None:
+        return None
+    db.session.add(DocumentSignature(document_id=document_id, signature=signature.tobytes()))
+    db.session.add_all([LshBucket(band=band, bucket=bucket, document_id=document_id)
+                        for band, bucket in band_keys(signature)])
+    return signature
+
+
+def delete_signatures(document_ids=None):
+    """Remove signatures and bucket rows (all of them when document_ids is None); the caller commits"""
+    signatures = DocumentSignature.query
+    buckets = LshBucket.query
+    if document_ids is not None:
+        signatures = signatures.filter(DocumentSignature.document_id.in_(document_ids))
+        buckets = buckets.filter(LshBucket.document_id.in_(document_ids))
+    signatures.delete(synchronize_session=False)
+    buckets.delete(synchronize_session=False)
+
+
+def backfill_signatures():
+    """Compute signatures for documents stored without one (older rows, sample data)"""
+    created = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Document.id, Document.content_text_column()) \
+            .outerjoin(DocumentSignature, DocumentSignature.document_id == Document.id) \
+            .filter(DocumentSignature.document_id.is_(None), Document.id > last_id) \
+            .order_by(Document.id).limit(BACKFILL_BATCH_SIZE).all()
+        if not rows:
+            break
+        for row in rows:
+            if store_signature(row.id, row.content_text) is not None:
+                created += 1
+        db.session.commit()
+        last_id = rows[-1].id
+    if created:
+        print(f"Computed MinHash signatures for {created} documents")
+    return created
+
+
+def find_near_duplicates(document_id, signature=None, threshold=DEFAULT_THRESHOLD, limit=20):
+    """Documents sharing an LSH band with this one whose estimated Jaccard similarity reaches threshold.
+
+    Candidates come from indexed (band, bucket) lookups, so the cost depends on
+    the number of colliding documents, not on the size of the corpus.
+    Returns [(document_id, similarity)], most similar first.
+    """
+    if signature is None:
+        stored = db.session.get(DocumentSignature, document_id)
+        if stored is None:
+            return []
+        signature = _decode(stored.signature)
+
+    candidate_ids = [row.document_id for row in db.session.query(LshBucket.document_id).distinct()
+                     .filter(tuple_(LshBucket.band, LshBucket.bucket).in_(band_keys(signature)),
+                             LshBucket.document_id != document_id)]
+    if not candidate_ids:
+        return []
+
+    matches = []
+    for row in db.session.query(DocumentSignature).filter(DocumentSignature.document_id.in_(candidate_ids)):
+        similarity = estimate_jaccard(signature, _decode(row.signature))
+        if similarity >= threshold:
+            matches.append((row.document_id, similarity))
+    matches.sort(key=lambda match: (-match[1], match[0]))
+    return matches[:limit]
+
+
+def find_duplicate_clusters(threshold=DEFAULT_THRESHOLD):
+    """Group near-duplicate documents corpus-wide.
+
+    Only documents that share an LSH bucket are compared, then pairs at or
+    above threshold are joined with union-find. Returns a list of clusters,
+    each a dict with member document ids and the verified pairs.
+    """
+    colliding = db.session.query(LshBucket.band, LshBucket.bucket) \
+        .group_by(LshBucket.band, LshBucket.bucket).having(func.count(LshBucket.document_id) > 1).subquery()
+    members_by_bucket = {}
+    for row in db.session.query(LshBucket.band, LshBucket.bucket, LshBucket.document_id) \
+            .join(colliding, (LshBucket.band == colliding.c.band) & (LshBucket.bucket == colliding.c.bucket)):
+        members_by_bucket.setdefault((row.band, row.bucket), []).append(row.document_id)
+
+    candidate_pairs = set()
+    for members in members_by_bucket.values():
+        members = sorted(set(members))
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                candidate_pairs.add((first, second))
+    if not candidate_pairs:
+        return []
+
+    document_ids = {document_id for pair in candidate_pairs for document_id in pair}
+    signatures = {row.document_id: _decode(row.signature) for row in
+                  db.session.query(DocumentSignature).filter(DocumentSignature.document_id.in_(document_ids))}
+
+    parent = {}
+
+    def find(document_id):
+        parent.setdefault(document_id, document_id)
+        while parent[document_id] != document_id:
+            parent[document_id] = parent[parent[document_id]]
+            document_id = parent[document_id]
+        return document_id
+
+    pairs = []
+    for first, second in sorted(candidate_pairs):
+        if first not in signatures or second not in signatures:
+            continue
+        similarity = estimate_jaccard(signatures[first], signatures[second])
+        if similarity >= threshold:
+            pairs.append((first, second, similarity))
+            parent[find(first)] = find(second)
+
+    clusters = {}
+    for first, second, similarity in pairs:
+        cluster = clusters.setdefault(find(first), {'document_ids': set(), 'pairs': []})
+        cluster['document_ids'].update((first, second))
+        cluster['pairs'].append({'document_ids': [first, second], 'similarity': round(similarity, 4)})
+
+    result = [{'document_ids': sorted(cluster['document_ids']), 'pairs': cluster['pairs']}
+              for cluster in clusters.values()]
+    result.sort(key=lambda cluster: (-len(cluster['document_ids']), cluster['document_ids'][0]))
+    return result
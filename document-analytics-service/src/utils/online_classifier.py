@@ -0,0 +1,36 @@
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.naive_bayes import MultinomialNB
+from sklearn.pipeline import Pipeline
+
+DEFAULT_HASH_FEATURES = 2 ** 17
+ONLINE_MODEL_SOURCE = 'online'
+
+
+def build_online_pipeline(n_features=DEFAULT_HASH_FEATURES):
+    """Untrained hashing + Naive Bayes pipeline.
+
+    The hashing vectorizer has no vocabulary to fit, so the model can be
+    updated incrementally with partial_fit and its size is fixed by
+    n_features (one count and one log-probability per feature and class),
+    however many distinct words the corpus contains.
+    """
+    return Pipeline([
+        ('hashing', HashingVectorizer(n_features=n_features, alternate_sign=False, stop_words='english')),
+        ('classifier', MultinomialNB(alpha=0.1))
+    ])
+
+
+def is_online_pipeline(pipeline):
+    return isinstance(pipeline.steps[0][1], HashingVectorizer) and hasattr(pipeline.steps[-1][1], 'partial_fit')
+
+
+def partial_fit_pipeline(pipeline, cleaned_texts, labels, classes):
+    """Update the pipeline in place with one batch; cost grows with the batch, not the corpus"""
+    features = pipeline.named_steps['hashing'].transform(cleaned_texts)
+    pipeline.named_steps['classifier'].partial_fit(features, labels, classes=classes)
+    return pipeline
+
+
+def training_sample_count(pipeline):
+    classifier = pipeline.named_steps['classifier']
+    return int(classifier.class_count_.sum()) if hasattr(classifier, 'class_count_') else 0
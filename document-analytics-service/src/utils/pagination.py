@@ -0,0 +1,66 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from sqlalchemy import and_, tuple_
+
+
+class InvalidCursorError(ValueError):
+    """Raised when an 'after' token cannot be decoded or belongs to another sort order"""
+
+
+def encode_cursor(sort_by, sort_order, sort_value, row_id):
+    """Opaque token pointing just after the given row in the given ordering"""
+    if isinstance(sort_value, datetime):
+        sort_value = {'dt': sort_value.isoformat()}
+    payload = json.dumps([sort_by, sort_order, sort_value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by, sort_order):
+    """Return (sort_value, row_id) from a token produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort_by, cursor_sort_order, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursorError('Invalid cursor')
+    if cursor_sort_by != sort_by or cursor_sort_order != sort_order or not isinstance(row_id, int):
+        raise InvalidCursorError('Cursor does not match the requested sort order')
+    if isinstance(sort_value, dict) and 'dt' in sort_value:
+        sort_value = datetime.fromisoformat(sort_value['dt'])
+    return sort_value, row_id
+
+
+def keyset_order(column, id_column, sort_order):
+    """ORDER BY clauses for a (column, id) keyset in one direction"""
+    if sort_order == 'asc':
+        return [column.asc(), id_column.asc()]
+    return [column.desc(), id_column.desc()]
+
+
+def keyset_condition(column, id_column, sort_order, sort_value, row_id):
+    """WHERE clause selecting the rows after (sort_value, row_id) within the cursor's range.
+
+    Non-null and NULL sort values are paged as two separate ranges: a row-value
+    comparison on (column, id) lets SQLite seek the index straight to the
+    cursor, and it never matches NULLs. Once the cursor's range runs out, the
+    rows of following_range() come next.
+    """
+    if sort_value is None:
+        if sort_order == 'asc':
+            return and_(column.is_(None), id_column > row_id)
+        return and_(column.is_(None), id_column < row_id)
+    if sort_order == 'asc':
+        return tuple_(column, id_column) > tuple_(sort_value, row_id)
+    return tuple_(column, id_column) < tuple_(sort_value, row_id)
+
+
+def following_range(column, sort_order, sort_value):
+    """WHERE clause for the range after the cursor's one, or None if it is the last.
+
+    SQLite sorts NULLs first ascending and last descending, so descending
+    listings continue into the NULL rows and ascending ones out of them.
+    """
+    if sort_order == 'asc':
+        return column.isnot(None) if sort_value is None else None
+    return column.is_(None) if sort_value is not None else None
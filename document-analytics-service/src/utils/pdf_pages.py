@@ -0,0 +1,10 @@
+import PyPDF2
+
+# Kept free of heavy imports so process-pool workers start quickly under the spawn start method
+
+
+def extract_page_range(file_path, start, end):
+    """Extract the text of pages [start, end) of a PDF. Runs inside a worker process."""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return start, [pdf_reader.pages[page_num].extract_text() or '' for page_num in range(start, end)]
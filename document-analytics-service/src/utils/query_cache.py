@@ -0,0 +1,90 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class QueryCache:
+    """In-process LRU cache of search responses with a size limit and a TTL.
+
+    Keys include the corpus version, so entries computed before an upload,
+    delete, reclassification or reprocess are never served afterwards; they
+    simply age out of the LRU.
+    """
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def configure(self, max_entries=None, ttl=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if ttl is not None:
+                self.ttl = ttl
+            self._trim()
+
+    @staticmethod
+    def make_key(keywords, corpus_version, **options):
+        """Normalized query (case and whitespace insensitive) plus the options that change the response"""
+        normalized = ' '.join(keywords.split()).casefold()
+        return corpus_version, normalized, tuple(sorted((name, str(value)) for name, value in options.items()))
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > max(self.max_entries, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'miss_ratio': self.misses / lookups if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,580 @@
+import os
+import re
+import pickle
+import bisect
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No cross-process locking (Windows); a single worker process is then required
+    fcntl = None
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Number of journal entries replayed on load before the index is compacted into a new snapshot
+COMPACT_AFTER_OPERATIONS = 500
+# Vocabulary terms a fuzzy or infix query word may expand to
+DEFAULT_MAX_EXPANSIONS = 50
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def trigrams(term, padded=True):
+    """Distinct 3-character substrings; padding marks the word boundaries so short words have trigrams too"""
+    text = f'  {term} ' if padded else term
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def auto_distance(token):
+    """Edits allowed for a query word by its length: none up to 2 characters, 1 up to 7, then 2.
+
+    Two edits start at 8 characters, where a candidate must still share at
+    least 3 trigrams with the word, so the trigram filter stays selective.
+    """
+    if len(token) < 3:
+        return 0
+    return 1 if len(token) <= 7 else 2
+
+
+def bounded_levenshtein(a, b, max_distance):
+    """Levenshtein distance between a and b, or None as soon as it is known to exceed max_distance.
+
+    Only cells within max_distance of the diagonal are computed; cells outside
+    the band cannot lead to a distance within the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    over = max_distance + 1
+    width = len(b) + 1
+    previous = [j if j <= max_distance else over for j in range(width)]
+    for i in range(1, len(a) + 1):
+        current = [over] * width
+        current[0] = i if i <= max_distance else over
+        row_min = current[0]
+        char_a = a[i - 1]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] if char_a == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if value > over:
+                value = over
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+class InvertedIndex:
+    """Positional inverted index (term -> {document id: [positions]}) persisted to disk.
+
+    The index is stored as a pickled snapshot plus an append-only journal of
+    add/remove operations, so an upload or delete only appends one record
+    instead of rewriting the whole index. Worker processes share the files:
+    every append, snapshot and reload happens under an exclusive file lock,
+    after catching up with records the other workers appended, and a
+    generation number tells a worker when another one wrote a new snapshot.
+
+    Documents indexed with their page offsets also keep the token position
+    where each page starts, so the pages a query matches are known without
+    loading any text.
+
+    Substring, fuzzy and infix queries go through a trigram index over the
+    vocabulary (trigram -> terms), built when the index is loaded or rebuilt
+    (unpickling it would cost as much) and kept up to date by every add and
+    remove: terms sharing enough trigrams with a query
+    word are the only ones checked, then matched through the postings.
+    """
+
+    SNAPSHOT_FILE = 'snapshot.pkl'
+    JOURNAL_FILE = 'journal.pkl'
+    GENERATION_FILE = 'generation'
+    LOCK_FILE = 'index.lock'
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.snapshot_path = os.path.join(index_dir, self.SNAPSHOT_FILE)
+        self.journal_path = os.path.join(index_dir, self.JOURNAL_FILE)
+        self.generation_path = os.path.join(index_dir, self.GENERATION_FILE)
+        self.lock_path = os.path.join(index_dir, self.LOCK_FILE)
+        self.loaded = False
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_pages = {}
+        self._trigrams = None
+        self._journal_offset = 0
+        self._journal_operations = 0
+        self._generation = None
+        self._lock_depth = 0
+
+    @property
+    def document_count(self):
+        return len(self._doc_terms)
+
+    def _build_postings(self, title, content_text, page_offsets=None):
+        """Build {term: [positions]} for a document's content followed by its title.
+
+        With page_offsets (start of each page in content_text) also returns the
+        position of the first token of each page followed by the number of
+        content tokens; otherwise None.
+        """
+        postings = {}
+        content_text = content_text or ''
+        # Pages start after a newline, so no token spans two pages and the positions
+        # are the same as for the text tokenized in one piece
+        bounds = list(page_offsets or [0])[1:] + [len(content_text)]
+        segments = [content_text[start:end] for start, end in zip(page_offsets or [0], bounds)]
+        page_starts = []
+        position = 0
+        for segment in segments:
+            page_starts.append(position)
+            for token in tokenize(segment):
+                postings.setdefault(token, []).append(position)
+                position += 1
+        page_starts.append(position)
+        # Leave a gap so phrases cannot match across the content/title boundary
+        position += 1
+        for token in tokenize(title):
+            postings.setdefault(token, []).append(position)
+            position += 1
+        return postings, page_starts if page_offsets else None
+
+    def _apply_add(self, doc_id, doc_postings, page_starts=None):
+        self._apply_remove(doc_id)
+        for term, positions in doc_postings.items():
+            if self._trigrams is not None and term not in self._postings:
+                self._add_trigrams(term)
+            self._postings.setdefault(term, {})[doc_id] = positions
+        self._doc_terms[doc_id] = list(doc_postings)
+        if page_starts:
+            self._doc_pages[doc_id] = page_starts
+
+    def _apply_remove(self, doc_id):
+        self._doc_pages.pop(doc_id, None)
+        terms = self._doc_terms.pop(doc_id, None)
+        if not terms:
+            return
+        for term in terms:
+            term_postings = self._postings.get(term)
+            if term_postings is None:
+                continue
+            term_postings.pop(doc_id, None)
+            if not term_postings:
+                del self._postings[term]
+                if self._trigrams is not None:
+                    self._remove_trigrams(term)
+
+    def _add_trigrams(self, term):
+        for trigram in trigrams(term):
+            self._trigrams.setdefault(trigram, set()).add(term)
+
+    def _remove_trigrams(self, term):
+        for trigram in trigrams(term):
+            terms = self._trigrams.get(trigram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._trigrams[trigram]
+
+    def _trigram_index(self):
+        if self._trigrams is None:
+            self._trigrams = {}
+            for term in self._postings:
+                self._add_trigrams(term)
+        return self._trigrams
+
+    # Persistence
+
+    @contextmanager
+    def _disk_lock(self):
+        """Exclusive lock on the on-disk index shared by every worker process; re-entrant within this instance"""
+        with self._lock:
+            if self._lock_depth or fcntl is None:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _disk_generation(self):
+        """Number of the snapshot on disk, incremented by every snapshot write"""
+        try:
+            with open(self.generation_path) as generation_file:
+                return int(generation_file.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def load(self):
+        """Load the snapshot and replay the journal. Returns False if nothing usable is on disk."""
+        with self._disk_lock():
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_pages = {}
+            self._trigrams = None
+            self._journal_offset = 0
+            self._journal_operations = 0
+            self._generation = self._disk_generation()
+            try:
+                if not os.path.exists(self.snapshot_path):
+                    return False
+                with open(self.snapshot_path, 'rb') as snapshot_file:
+                    snapshot = pickle.load(snapshot_file)
+                if 'doc_pages' not in snapshot:
+                    # Written before page positions were indexed; rebuilt by the caller
+                    return False
+                self._postings = snapshot['postings']
+                self._doc_terms = snapshot['doc_terms']
+                self._doc_pages = snapshot['doc_pages']
+                self._trigram_index()
+                self._replay_journal()
+            except Exception as e:
+                print(f"Error loading search index: {e}")
+                self._postings = {}
+                self._doc_terms = {}
+                self._doc_pages = {}
+                self._trigrams = None
+                return False
+
+            self.loaded = True
+            if self._journal_operations >= COMPACT_AFTER_OPERATIONS:
+                self.save()
+            return True
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'rb') as journal_file:
+            journal_file.seek(self._journal_offset)
+            while True:
+                try:
+                    operation, doc_id, doc_postings, page_starts = pickle.load(journal_file)
+                except EOFError:
+                    break
+                except Exception:
+                    # A partially written trailing record left by a crash; cut off before the next append
+                    break
+                self._apply_operation(operation, doc_id, doc_postings, page_starts)
+                self._journal_operations += 1
+                self._journal_offset = journal_file.tell()
+
+    def _apply_operation(self, operation, doc_id, doc_postings=None, page_starts=None):
+        if operation == 'add':
+            self._apply_add(doc_id, doc_postings, page_starts)
+        else:
+            self._apply_remove(doc_id)
+
+    def _sync(self):
+        """Catch up with the disk: reload after another worker's snapshot, else replay new journal records.
+
+        Must be called with the disk lock held.
+        """
+        if self._disk_generation() != self._generation:
+            self.load()
+        else:
+            self._replay_journal()
+
+    def refresh(self):
+        """Pick up changes written to disk by other worker processes"""
+        with self._disk_lock():
+            self._sync()
+
+    def save(self):
+        """Compact the journal into a new snapshot.
+
+        If another worker wrote a snapshot since this one last synced, that
+        snapshot already holds everything journaled before it, so it is
+        loaded instead of being overwritten.
+        """
+        with self._disk_lock():
+            if self._disk_generation() != self._generation:
+                self.load()
+                return
+            self._replay_journal()
+            self._write_snapshot()
+
+    def _write_snapshot(self):
+        """Write the in-memory index as the next snapshot and truncate the journal; disk lock held"""
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'wb') as snapshot_file:
+            pickle.dump({'postings': self._postings, 'doc_terms': self._doc_terms, 'doc_pages': self._doc_pages},
+                        snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.snapshot_path)
+        open(self.journal_path, 'wb').close()
+        generation = self._disk_generation() + 1
+        with open(self.generation_path + '.tmp', 'w') as generation_file:
+            generation_file.write(str(generation))
+        os.replace(self.generation_path + '.tmp', self.generation_path)
+        self._generation = generation
+        self._journal_offset = 0
+        self._journal_operations = 0
+        self.loaded = True
+
+    def _append_journal(self, operation, doc_id, doc_postings=None, page_starts=None):
+        """Append one operation after every record already on disk, then apply it; disk lock held and synced"""
+        with open(self.journal_path, 'ab') as journal_file:
+            if journal_file.tell() != self._journal_offset:
+                # Trailing bytes that did not replay are a torn record; records after it would be unreadable
+                journal_file.truncate(self._journal_offset)
+            journal_file.write(pickle.dumps((operation, doc_id, doc_postings, page_starts),
+                                            protocol=pickle.HIGHEST_PROTOCOL))
+            self._journal_offset = journal_file.tell()
+        self._apply_operation(operation, doc_id, doc_postings, page_starts)
+        self._journal_operations += 1
+        if self._journal_operations >= COMPACT_AFTER_OPERATIONS:
+            self.save()
+
+    # Updates
+
+    def rebuild(self, documents):
+        """Rebuild the whole index from an iterable of (id, title, content_text, page_offsets) tuples.
+
+        Other workers' appends wait until the new snapshot is written, so none
+        are lost between reading the documents and replacing the index.
+        """
+        with self._disk_lock():
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_pages = {}
+            self._trigrams = {}
+            for doc_id, title, content_text, page_offsets in documents:
+                self._apply_add(doc_id, *self._build_postings(title, content_text, page_offsets))
+            self._write_snapshot()
+            print(f"Search index rebuilt with {len(self._doc_terms)} documents")
+
+    def add_document(self, doc_id, title, content_text, page_offsets=None):
+        """Index (or re-index) a single document"""
+        doc_postings, page_starts = self._build_postings(title, content_text, page_offsets)
+        with self._disk_lock():
+            self._sync()
+            self._append_journal('add', doc_id, doc_postings, page_starts)
+
+    def remove_document(self, doc_id):
+        """Drop a document from the index"""
+        with self._disk_lock():
+            self._sync()
+            if doc_id not in self._doc_terms:
+                return
+            self._append_journal('remove', doc_id)
+
+    # Queries
+
+    def _containing_terms(self, token):
+        """Indexed terms containing token; for 3+ characters the trigram index narrows the candidates"""
+        if len(token) < 3:
+            return [term for term in self._postings if token in term]
+        index = self._trigram_index()
+        term_sets = sorted((index.get(trigram, set()) for trigram in trigrams(token, padded=False)), key=len)
+        return [term for term in term_sets[0].intersection(*term_sets[1:]) if token in term]
+
+    def _query_terms(self, text):
+        """Indexed terms each token of text can match under substring semantics, one set per token.
+
+        Like `text in content`, the match may start or end inside a word: the
+        first token may end a longer term and the last may begin one (a single
+        token may sit anywhere in a term), unless text starts or ends with a
+        non-word character. Tokens in between must be whole terms.
+        """
+        tokens = tokenize(text)
+        open_start = TOKEN_PATTERN.match(text[:1]) is not None
+        open_end = TOKEN_PATTERN.match(text[-1:]) is not None
+        term_sets = []
+        for i, token in enumerate(tokens):
+            before = open_start and i == 0
+            after = open_end and i == len(tokens) - 1
+            if before or after:
+                term_sets.append({term for term in self._containing_terms(token)
+                                  if (before or term.startswith(token)) and (after or term.endswith(token))})
+            else:
+                term_sets.append({token} if token in self._postings else set())
+        return term_sets
+
+    def _query_postings(self, text):
+        """Postings ({document id: positions}) of each token of text, merged over the terms it can match"""
+        token_postings = []
+        for terms in self._query_terms(text):
+            if len(terms) == 1:
+                token_postings.append(self._postings[next(iter(terms))])
+                continue
+            merged = {}
+            for term in terms:
+                for doc_id, positions in self._postings[term].items():
+                    merged.setdefault(doc_id, []).extend(positions)
+            token_postings.append(merged)
+        return token_postings
+
+    def _phrase_positions(self, doc_id, token_postings):
+        """Positions in one document where the tokens occur at consecutive positions"""
+        term_positions = []
+        for postings in token_postings:
+            positions = postings.get(doc_id)
+            if not positions:
+                return []
+            term_positions.append(positions)
+        if not term_positions:
+            return []
+        following = [set(positions) for positions in term_positions[1:]]
+        return [start for start in term_positions[0]
+                if all(start + offset + 1 in positions for offset, positions in enumerate(following))]
+
+    def _phrase_documents(self, token_postings):
+        """Return ids of documents containing the tokens at consecutive positions"""
+        if not token_postings or not all(token_postings):
+            return set()
+        if len(token_postings) == 1:
+            return set(token_postings[0])
+
+        # Intersect starting from the rarest token
+        candidates = set(min(token_postings, key=len))
+        for postings in token_postings:
+            candidates.intersection_update(postings)
+            if not candidates:
+                return set()
+        return {doc_id for doc_id in candidates if self._phrase_positions(doc_id, token_postings)}
+
+    def expand_term(self, token, max_distance=0, infix=False, limit=DEFAULT_MAX_EXPANSIONS):
+        """Vocabulary terms within max_distance edits of a token, or containing it when infix is set.
+
+        Candidates come from the trigram index: a term within k edits shares
+        all but at most 3k of the token's trigrams, and an infix match contains
+        every unpadded trigram of the token. Only candidates are verified with
+        the edit distance.
+        Returns at most limit terms, closest and most frequent first; the
+        token itself is included if it is indexed.
+        """
+        with self._lock:
+            index = self._trigram_index()
+            found = {}
+            if max_distance > 0:
+                token_trigrams = trigrams(token)
+                required = max(1, len(token_trigrams) - 3 * max_distance)
+                # A term sharing `required` trigrams contains one of the len - required + 1 rarest,
+                # so only their term lists are read (common ones such as the padded first letter are skipped)
+                rarest = sorted(token_trigrams, key=lambda trigram: len(index.get(trigram, ())))
+                candidates = set().union(*(index.get(trigram, ()) for trigram in rarest[:len(rarest) - required + 1]))
+                for term in candidates:
+                    if abs(len(term) - len(token)) > max_distance or len(trigrams(term) & token_trigrams) < required:
+                        continue
+                    distance = bounded_levenshtein(token, term, max_distance)
+                    if distance is not None:
+                        found[term] = distance
+            if infix and len(token) >= 3:
+                for term in self._containing_terms(token):
+                    if term not in found:
+                        found[term] = max_distance + 1
+            if token in self._postings:
+                found[token] = 0
+            ranked = sorted(found, key=lambda term: (found[term], -len(self._postings.get(term, ())), term))
+            return ranked[:limit]
+
+    def fuzzy_terms(self, keywords, max_distance=0, infix=False, max_expansions=DEFAULT_MAX_EXPANSIONS):
+        """Indexed terms, other than the query words themselves, that fuzzy/infix matching adds.
+
+        max_distance is a number of edits or 'auto' (see auto_distance).
+        Words that tokenize to several tokens are only matched exactly.
+        """
+        expansions = []
+        query_tokens = set(tokenize(keywords))
+        for word in keywords.split():
+            tokens = tokenize(word)
+            if len(tokens) != 1:
+                continue
+            distance = auto_distance(tokens[0]) if max_distance == 'auto' else max_distance
+            for term in self.expand_term(tokens[0], distance, infix, max_expansions):
+                if term not in query_tokens and term not in expansions:
+                    expansions.append(term)
+        return expansions
+
+    def search(self, keywords, max_distance=0, infix=False, max_expansions=DEFAULT_MAX_EXPANSIONS, expansions=None):
+        """Find documents matching the query.
+
+        Mirrors DocumentProcessor.search_documents, including its substring
+        matching (see _query_terms): documents containing the whole query as a
+        phrase are 'exact_phrase' matches, otherwise documents containing any
+        of the individual words are 'individual_words' matches. With
+        max_distance, documents containing only terms from fuzzy_terms are
+        'fuzzy' matches, and those terms are added to the matched terms of
+        word matches. infix adds nothing here since words already match inside
+        longer terms; it matters for callers of fuzzy_terms.
+        When an expansions dict is given, the postings each matched term was
+        expanded to are stored in it for matched_pages.
+        Returns {document id: (match_type, matched_terms)}.
+        """
+        search_query = keywords.strip()
+        if not search_query:
+            return {}
+
+        expansions = expansions if expansions is not None else {}
+        with self._lock:
+            results = {}
+            expansions[search_query] = self._query_postings(search_query)
+            for doc_id in self._phrase_documents(expansions[search_query]):
+                results[doc_id] = ('exact_phrase', [search_query])
+
+            for word in search_query.split():
+                if word not in expansions:
+                    expansions[word] = self._query_postings(word)
+                for doc_id in self._phrase_documents(expansions[word]):
+                    if doc_id in results and results[doc_id][0] == 'exact_phrase':
+                        continue
+                    results.setdefault(doc_id, ('individual_words', []))[1].append(word)
+
+            if max_distance:
+                for term in self.fuzzy_terms(search_query, max_distance, False, max_expansions):
+                    expansions.setdefault(term, [self._postings[term]])
+                    for doc_id in self._postings[term]:
+                        if doc_id in results and results[doc_id][0] == 'exact_phrase':
+                            continue
+                        results.setdefault(doc_id, ('fuzzy', []))[1].append(term)
+
+            return results
+
+    def matched_pages(self, doc_id, terms, expansions=None):
+        """Pages of a document containing any of the terms (words or phrases, matched as substrings),
+        from the positions alone.
+
+        expansions is the dict filled by search(): terms found there are only
+        looked up, others are expanded once and added to it, so calling this
+        for every hit of a query does not repeat the vocabulary work.
+        Returns [(page number, matches)] in page order, or None when the
+        document was indexed without page offsets. Title matches are not
+        counted.
+        """
+        with self._lock:
+            page_starts = self._doc_pages.get(doc_id)
+            if page_starts is None:
+                return None
+            content_tokens = page_starts[-1]
+            counts = {}
+            expansions = expansions if expansions is not None else {}
+            for term in terms:
+                if term not in expansions:
+                    expansions[term] = self._query_postings(term.strip())
+                for position in self._phrase_positions(doc_id, expansions[term]):
+                    if position < content_tokens:
+                        page_number = bisect.bisect_right(page_starts, position, 0, len(page_starts) - 1)
+                        counts[page_number] = counts.get(page_number, 0) + 1
+            return sorted(counts.items())
@@ -0,0 +1,156 @@
+import time
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+from src.models.user import db
+from src.models.document import SearchLog
+from src.utils.statistics import record_searches
+
+OVERFLOW_POLICIES = {'drop_oldest', 'drop_newest'}
+
+
+class SearchLogWriter:
+    """Buffers search log events in memory and writes them from a background thread.
+
+    Searches only append to a bounded buffer; a daemon thread inserts the
+    buffered rows and their statistics in one transaction once flush_size
+    events are waiting or flush_interval seconds have passed. When the
+    buffer is full, events are dropped according to the overflow policy
+    (drop_oldest keeps the most recent searches) and counted. Whatever is
+    still buffered is written when the process exits.
+    """
+
+    def __init__(self, flush_size=100, flush_interval=1.0, max_buffer=10000, overflow='drop_oldest',
+                 enabled=True):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow = overflow
+        self.enabled = enabled
+        self.app = None
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        # Serialises writes so an explicit flush() and the writer thread never insert concurrently
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopping = False
+        self._written = 0
+        self._dropped = 0
+        self._flushes = 0
+        self._failures = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_size = max(1, app.config.get('SEARCH_LOG_FLUSH_SIZE', self.flush_size))
+        self.flush_interval = app.config.get('SEARCH_LOG_FLUSH_INTERVAL', self.flush_interval)
+        self.max_buffer = max(1, app.config.get('SEARCH_LOG_MAX_BUFFER', self.max_buffer))
+        overflow = app.config.get('SEARCH_LOG_OVERFLOW', self.overflow)
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'SEARCH_LOG_OVERFLOW must be one of {sorted(OVERFLOW_POLICIES)}')
+        self.overflow = overflow
+        self.enabled = app.config.get('SEARCH_LOG_ASYNC', self.enabled)
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        # Started lazily so forking servers start it in each worker, not in the parent
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='search-log-writer', daemon=True)
+            self._thread.start()
+
+    def record(self, query, results_count, search_time, cache_hit=False):
+        """Queue one search event; returns False when it was dropped because the buffer is full"""
+        event = (query, results_count, search_time, bool(cache_hit), datetime.utcnow(), time.time())
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                self._dropped += 1
+                if self.overflow == 'drop_newest':
+                    return False
+                self._buffer.popleft()
+            self._buffer.append(event)
+            pending = len(self._buffer)
+            if not self._stopping:
+                self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _take(self):
+        with self._lock:
+            events = list(self._buffer)
+            self._buffer.clear()
+        return events
+
+    def flush(self):
+        """Write every buffered event now; returns the number of rows written"""
+        with self._flush_lock:
+            events = self._take()
+            if not events:
+                return 0
+            with self.app.app_context():
+                try:
+                    db.session.execute(SearchLog.__table__.insert(), [{
+                        'query': query,
+                        'results_count': results_count,
+                        'search_time': search_time,
+                        'cache_hit': cache_hit,
+                        'timestamp': timestamp
+                    } for query, results_count, search_time, cache_hit, timestamp, _ in events])
+                    record_searches([(event[2], event[5]) for event in events])
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self._failures += 1
+                    self._requeue(events)
+                    print(f"Error writing {len(events)} search log entries: {e}")
+                    return 0
+                finally:
+                    db.session.remove()
+            self._written += len(events)
+            self._flushes += 1
+            return len(events)
+
+    def _requeue(self, events):
+        """Put events from a failed write back in front of newer ones, within the buffer limit"""
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            kept = events[-room:] if room > 0 else []
+            self._dropped += len(events) - len(kept)
+            self._buffer.extendleft(reversed(kept))
+
+    def discard(self):
+        """Drop buffered events without writing them (used when the search log is reset)"""
+        with self._flush_lock:
+            return len(self._take())
+
+    def close(self):
+        """Stop the writer thread and write what is left in the buffer"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self.app is not None:
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            'enabled': self.enabled,
+            'buffered': buffered,
+            'written': self._written,
+            'dropped': self._dropped,
+            'flushes': self._flushes,
+            'failures': self._failures,
+            'flush_size': self.flush_size,
+            'flush_interval': self.flush_interval,
+            'max_buffer': self.max_buffer,
+            'overflow': self.overflow
+        }
@@ -0,0 +1,198 @@
+import threading
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import insert
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from src.models.user import db
+from src.models.document import Document, DocumentVector, VectorDeletion
+from src.models.corpus_state import CorpusState
+
+VECTOR_FEATURES = 2 ** 18
+BACKFILL_BATCH_SIZE = 200
+# Most recent vector deletions kept in the log; snapshots older than the pruned ones reload fully
+VECTOR_DELETIONS_KEPT = 10000
+
+_vectorizer = HashingVectorizer(n_features=VECTOR_FEATURES, alternate_sign=False, norm=None,
+                                stop_words='english', dtype=np.float32)
+
+
+def vectorize_texts(texts):
+    """Sublinear term-frequency vectors (1 + log tf) in the hashed feature space, one CSR row per text.
+
+    The hashing space needs no fitted vocabulary, so a vector computed at
+    ingestion stays valid however the corpus grows; IDF weights are applied
+    at query time from the document frequencies of the current snapshot.
+    """
+    matrix = _vectorizer.transform([text or '' for text in texts]).tocsr()
+    matrix.data = 1.0 + np.log(matrix.data)
+    return matrix
+
+
+def build_vector_rows(document_ids, texts, revision=None):
+    """DocumentVector rows for the given documents, computed with one transform"""
+    matrix = vectorize_texts(texts)
+    rows = []
+    for position, document_id in enumerate(document_ids):
+        start, end = matrix.indptr[position], matrix.indptr[position + 1]
+        rows.append(DocumentVector(
+            document_id=document_id,
+            n_features=VECTOR_FEATURES,
+            indices=matrix.indices[start:end].astype(np.int32).tobytes(),
+            weights=matrix.data[start:end].astype(np.float32).tobytes(),
+            revision=revision
+        ))
+    return rows
+
+
+def store_document_vectors(document_ids, texts):
+    """Add vectors for new documents to the session under a new vector version; the caller commits"""
+    if document_ids:
+        db.session.add_all(build_vector_rows(document_ids, texts, CorpusState.bump_vectors()))
+
+
+def delete_document_vectors(document_ids=None):
+    """Remove stored vectors (all of them when document_ids is None) and log the removal; the caller commits"""
+    if document_ids is None:
+        CorpusState.bump_vectors(reset=True)
+        DocumentVector.query.delete(synchronize_session=False)
+        VectorDeletion.query.delete(synchronize_session=False)
+        return
+    document_ids = sorted(set(document_ids))
+    if not document_ids:
+        return
+    revision = CorpusState.bump_vectors()
+    DocumentVector.query.filter(DocumentVector.document_id.in_(document_ids)).delete(synchronize_session=False)
+    db.session.execute(insert(VectorDeletion), [{'revision': revision, 'document_id': document_id}
+                                                for document_id in document_ids])
+
+
+def backfill_vectors():
+    """Compute vectors for documents stored without one (older rows, sample data)"""
+    created = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Document.id, Document.content_text_column()) \
+            .outerjoin(DocumentVector, DocumentVector.document_id == Document.id) \
+            .filter(DocumentVector.document_id.is_(None), Document.id > last_id) \
+            .order_by(Document.id).limit(BACKFILL_BATCH_SIZE).all()
+        if not rows:
+            break
+        store_document_vectors([row.id for row in rows], [row.content_text for row in rows])
+        db.session.commit()
+        created += len(rows)
+        last_id = rows[-1].id
+    if created:
+        print(f"Computed similarity vectors for {created} documents")
+    return created
+
+
+def prune_vector_deletions(keep=VECTOR_DELETIONS_KEPT):
+    """Drop all but the newest logged vector deletions and raise the floor past the dropped ones"""
+    cutoff = db.session.query(VectorDeletion.revision).order_by(VectorDeletion.revision.desc()) \
+        .offset(keep).limit(1).scalar()
+    if cutoff is None:
+        return 0
+    pruned = VectorDeletion.query.filter(VectorDeletion.revision <= cutoff).delete(synchronize_session=False)
+    CorpusState.query.filter(CorpusState.id == CorpusState.ROW_ID, CorpusState.vectors_floor < cutoff) \
+        .update({'vectors_floor': cutoff}, synchronize_session=False)
+    db.session.commit()
+    return pruned
+
+
+class VectorIndex:
+    """In-memory CSR snapshot of every stored document vector.
+
+    The snapshot follows CorpusState.vectors_version, which only changes when
+    vectors are stored or deleted (not when documents are relabelled). On a
+    change only the rows written since, and the logged deletions, are read;
+    a full reload happens on first use, after a reset of every vector, or
+    when the deletions needed were pruned from the log. Similarity is the
+    cosine of IDF-weighted vectors, computed for all documents at once as one
+    sparse matrix-vector product.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.document_ids = np.zeros(0, dtype=np.int64)
+        self.positions = {}
+        self.matrix = None
+        self._raw = None
+        self._lock = threading.Lock()
+
+    def ensure_current(self):
+        version, floor = CorpusState.vector_versions()
+        if self.matrix is not None and version == self.version:
+            return self
+        with self._lock:
+            if self.matrix is None or floor > self.version:
+                self._load(version)
+            elif version != self.version:
+                self._apply_changes(version)
+        return self
+
+    def _vector_rows(self):
+        return db.session.query(DocumentVector.document_id, DocumentVector.indices, DocumentVector.weights) \
+            .join(Document, Document.id == DocumentVector.document_id) \
+            .filter(DocumentVector.n_features == VECTOR_FEATURES)
+
+    def _read_rows(self, rows):
+        """(document ids, unweighted CSR matrix) of stored vector rows"""
+        document_ids = []
+        indptr = [0]
+        indices = []
+        weights = []
+        for row in rows:
+            document_ids.append(row.document_id)
+            indices.append(np.frombuffer(row.indices, dtype=np.int32))
+            weights.append(np.frombuffer(row.weights, dtype=np.float32))
+            indptr.append(indptr[-1] + len(indices[-1]))
+
+        matrix = sp.csr_matrix((
+            np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32),
+            np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32),
+            np.array(indptr, dtype=np.int64)
+        ), shape=(len(document_ids), VECTOR_FEATURES))
+        return np.array(document_ids, dtype=np.int64), matrix
+
+    def _load(self, version):
+        document_ids, raw = self._read_rows(self._vector_rows().order_by(DocumentVector.document_id).yield_per(500))
+        self._publish(document_ids, raw, version)
+
+    def _apply_changes(self, version):
+        """Drop deleted and rewritten rows, then append the rows written since the loaded version"""
+        removed = [document_id for document_id, in db.session.query(VectorDeletion.document_id)
+                   .filter(VectorDeletion.revision > self.version).all()]
+        added_ids, added = self._read_rows(self._vector_rows().filter(DocumentVector.revision > self.version)
+                                           .order_by(DocumentVector.document_id))
+        keep = ~np.isin(self.document_ids, np.concatenate([np.array(removed, dtype=np.int64), added_ids]))
+        self._publish(np.concatenate([self.document_ids[keep], added_ids]),
+                      sp.vstack([self._raw[keep], added], format='csr'), version)
+
+    def _publish(self, document_ids, raw, version):
+        # Smoothed IDF from the snapshot's document frequencies, then unit-length rows
+        document_frequency = np.bincount(raw.indices, minlength=VECTOR_FEATURES)
+        idf = np.log((1.0 + len(document_ids)) / (1.0 + document_frequency)).astype(np.float32) + 1.0
+        matrix = normalize(raw.multiply(idf).tocsr(), norm='l2', copy=False)
+
+        self._raw = raw
+        self.document_ids = document_ids
+        self.positions = {int(document_id): position for position, document_id in enumerate(document_ids)}
+        self.matrix = matrix
+        self.version = version
+
+    def similar(self, document_id, k=10):
+        """Return [(document_id, score)] of the k most similar documents, best first"""
+        matrix, positions, document_ids = self.matrix, self.positions, self.document_ids
+        position = positions.get(document_id)
+        if position is None or matrix is None or matrix[position].nnz == 0:
+            return []
+
+        scores = (matrix @ matrix[position].T).toarray().ravel()
+        scores[position] = 0.0
+        k = min(k, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(document_ids[index]), float(scores[index])) for index in top if scores[index] > 0]
@@ -0,0 +1,114 @@
+import heapq
+from bisect import bisect_right
+from src.utils.highlighter import MARK_OPEN, MARK_CLOSE
+
+ELLIPSIS = '...'
+
+
+class LineIndex:
+    """Start offsets of every line, built once per document, to map offsets to lines"""
+
+    def __init__(self, text):
+        self.text = text
+        self.starts = [0]
+        position = text.find('\n')
+        while position != -1:
+            self.starts.append(position + 1)
+            position = text.find('\n', position + 1)
+
+    @property
+    def line_count(self):
+        return len(self.starts)
+
+    def line_of(self, offset):
+        return bisect_right(self.starts, offset) - 1
+
+    def line_start(self, line):
+        return self.starts[line]
+
+    def line_end(self, line):
+        """Offset just past the last character of the line (excluding the newline)"""
+        if line + 1 < len(self.starts):
+            return self.starts[line + 1] - 1
+        return len(self.text)
+
+
+def _render(text, start, end, spans):
+    parts = []
+    position = start
+    for span_start, span_end, _ in spans:
+        parts.append(text[position:span_start])
+        parts.append(MARK_OPEN)
+        parts.append(text[span_start:span_end])
+        parts.append(MARK_CLOSE)
+        position = span_end
+    parts.append(text[position:end])
+    return ''.join(parts)
+
+
+def build_snippets(text, spans, max_snippets=5, context_lines=1, max_chars=600):
+    """Turn match spans into the best k snippets.
+
+    Each match opens a window of context_lines lines before and after its
+    line. Overlapping or touching windows are merged, each window is scored
+    by match density (distinct terms first, then matches per line), and only
+    the top max_snippets are rendered. Windows longer than max_chars are
+    clipped around their matches. Returns (snippets, total match count).
+    """
+    if not text or not spans:
+        return [], 0
+
+    line_index = LineIndex(text)
+    windows = []
+    for span in spans:
+        line = line_index.line_of(span[0])
+        first_line = max(0, line - context_lines)
+        last_line = min(line_index.line_count - 1, line + context_lines)
+        if windows and first_line <= windows[-1]['last_line'] + 1:
+            window = windows[-1]
+            window['last_line'] = max(window['last_line'], last_line)
+            window['spans'].append(span)
+        else:
+            windows.append({'first_line': first_line, 'last_line': last_line, 'spans': [span],
+                            'match_line': line})
+
+    def score(window):
+        line_count = window['last_line'] - window['first_line'] + 1
+        distinct_terms = len({term.lower() for _, _, term in window['spans']})
+        return distinct_terms, len(window['spans']) / line_count
+
+    best = heapq.nlargest(max_snippets, windows, key=score)
+
+    snippets = []
+    for window in best:
+        window_spans = window['spans']
+        start = line_index.line_start(window['first_line'])
+        end = line_index.line_end(window['last_line'])
+        prefix = suffix = ''
+        if end - start > max_chars:
+            # Clip around the first match and keep only the matches that fit
+            clip_start = max(start, window_spans[0][0] - max_chars // 4)
+            clip_end = min(end, clip_start + max_chars)
+            prefix = ELLIPSIS if clip_start > start else ''
+            suffix = ELLIPSIS if clip_end < end else ''
+            start, end = clip_start, clip_end
+            window_spans = [span for span in window_spans if span[0] >= start and span[1] <= end]
+
+        distinct_terms, density = score(window)
+        first_span = window_spans[0] if window_spans else window['spans'][0]
+        snippets.append({
+            'term': first_span[2],
+            'terms': sorted({term for _, _, term in window_spans}),
+            'line_number': window['match_line'] + 1,
+            'context': prefix + _render(text, start, end, window_spans) + suffix,
+            'context_start_line': window['first_line'] + 1,
+            'context_end_line': window['last_line'] + 1,
+            'match_line_in_context': window['match_line'] - window['first_line'],
+            'match_count': len(window['spans']),
+            'matches': [{'start': span_start, 'end': span_end, 'term': term}
+                        for span_start, span_end, term in window_spans],
+            'distinct_terms': distinct_terms,
+            'score': round(density, 4)
+        })
+
+    return snippets, len(spans)
@@ -0,0 +1,206 @@
+import math
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.models.user import db
+from src.models.document import Document, SearchLog
+from src.models.statistics import StatisticCounter, ClassificationTotal, SearchLatencyBucket
+
+DOCUMENTS = 'documents'
+TOTAL_SIZE = 'total_size'
+SEARCHES = 'searches'
+SEARCH_TIME = 'search_time'
+INITIALIZED = 'initialized'
+
+# Latency histogram: bucket i covers [MIN * RATIO**i, MIN * RATIO**(i + 1)), about 10% relative error
+LATENCY_MIN_SECONDS = 0.0001
+LATENCY_RATIO = 1.2
+LATENCY_BUCKETS = 80
+LATENCY_RETENTION_MINUTES = 7 * 24 * 60
+LATENCY_WINDOWS = {'last_hour': 60, 'last_24_hours': 24 * 60}
+
+_last_pruned_minute = None
+
+
+def _upsert_counter(name, delta):
+    statement = sqlite_insert(StatisticCounter).values(name=name, value=delta)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[StatisticCounter.name],
+        set_={'value': StatisticCounter.value + statement.excluded.value}
+    ))
+
+
+def _upsert_classification(classification, count_delta, size_delta):
+    statement = sqlite_insert(ClassificationTotal).values(classification=classification or '',
+                                                          document_count=count_delta, total_size=size_delta)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[ClassificationTotal.classification],
+        set_={'document_count': ClassificationTotal.document_count + statement.excluded.document_count,
+              'total_size': ClassificationTotal.total_size + statement.excluded.total_size}
+    ))
+
+
+def record_documents_added(documents):
+    """Count new documents, given as (classification, file_size) pairs, in the caller's transaction"""
+    _record_documents(documents, 1)
+
+
+def record_documents_removed(documents):
+    """Uncount deleted documents, given as (classification, file_size) pairs, in the caller's transaction"""
+    _record_documents(documents, -1)
+
+
+def _record_documents(documents, sign):
+    by_classification = {}
+    total_size = 0
+    for classification, file_size in documents:
+        count, size = by_classification.get(classification or '', (0, 0))
+        by_classification[classification or ''] = (count + 1, size + (file_size or 0))
+        total_size += file_size or 0
+    if not by_classification:
+        return
+    _upsert_counter(DOCUMENTS, sign * sum(count for count, _ in by_classification.values()))
+    _upsert_counter(TOTAL_SIZE, sign * total_size)
+    for classification, (count, size) in by_classification.items():
+        _upsert_classification(classification, sign * count, sign * size)
+
+
+def record_reclassified(changes):
+    """Move documents between classifications; changes are (old, new, file_size) triples"""
+    deltas = {}
+    for old, new, file_size in changes:
+        if (old or '') == (new or ''):
+            continue
+        for classification, sign in ((old or '', -1), (new or '', 1)):
+            count, size = deltas.get(classification, (0, 0))
+            deltas[classification] = (count + sign, size + sign * (file_size or 0))
+    for classification, (count, size) in deltas.items():
+        _upsert_classification(classification, count, size)
+
+
+def latency_bucket(seconds):
+    if seconds <= LATENCY_MIN_SECONDS:
+        return 0
+    return min(LATENCY_BUCKETS - 1, int(math.log(seconds / LATENCY_MIN_SECONDS) / math.log(LATENCY_RATIO)))
+
+
+def _bucket_value(bucket):
+    """Representative latency of a bucket (its geometric midpoint)"""
+    return LATENCY_MIN_SECONDS * LATENCY_RATIO ** (bucket + 0.5)
+
+
+def record_search(search_time, timestamp=None):
+    """Add one search to the running totals and the per-minute latency histogram (caller commits)"""
+    record_searches([(search_time, timestamp or time.time())])
+
+
+def record_searches(searches):
+    """Add (search_time, unix_timestamp) pairs, with one upsert per distinct minute and bucket (caller commits)"""
+    global _last_pruned_minute
+    histogram = {}
+    total_time = 0.0
+    for search_time, timestamp in searches:
+        key = (int(timestamp // 60), latency_bucket(search_time))
+        count, bucket_time = histogram.get(key, (0, 0.0))
+        histogram[key] = (count + 1, bucket_time + search_time)
+        total_time += search_time
+    if not histogram:
+        return
+
+    _upsert_counter(SEARCHES, sum(count for count, _ in histogram.values()))
+    _upsert_counter(SEARCH_TIME, total_time)
+    for (minute, bucket), (count, bucket_time) in histogram.items():
+        statement = sqlite_insert(SearchLatencyBucket).values(minute=minute, bucket=bucket, count=count,
+                                                              total_time=bucket_time)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[SearchLatencyBucket.minute, SearchLatencyBucket.bucket],
+            set_={'count': SearchLatencyBucket.count + statement.excluded.count,
+                  'total_time': SearchLatencyBucket.total_time + statement.excluded.total_time}
+        ))
+
+    # Drop histogram minutes past the retention period, at most once a minute per process
+    minute = max(minute for minute, _ in histogram)
+    if _last_pruned_minute != minute:
+        _last_pruned_minute = minute
+        SearchLatencyBucket.query.filter(SearchLatencyBucket.minute < minute - LATENCY_RETENTION_MINUTES) \
+            .delete(synchronize_session=False)
+
+
+def latency_summary(window_minutes, now=None, session=None):
+    """Count, average and p50/p95/p99 of the searches in the last window_minutes"""
+    session = session or db.session
+    current_minute = int((now or time.time()) // 60)
+    rows = session.query(SearchLatencyBucket.bucket, db.func.sum(SearchLatencyBucket.count),
+                            db.func.sum(SearchLatencyBucket.total_time)) \
+        .filter(SearchLatencyBucket.minute > current_minute - window_minutes) \
+        .group_by(SearchLatencyBucket.bucket).order_by(SearchLatencyBucket.bucket).all()
+
+    count = sum(row[1] for row in rows)
+    if not count:
+        return {'searches': 0, 'average': 0, 'p50': 0, 'p95': 0, 'p99': 0}
+
+    summary = {'searches': int(count), 'average': round(sum(row[2] for row in rows) / count, 4)}
+    for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99)):
+        rank = fraction * count
+        seen = 0
+        for bucket, bucket_count, _ in rows:
+            seen += bucket_count
+            if seen >= rank:
+                summary[name] = round(_bucket_value(bucket), 4)
+                break
+    return summary
+
+
+def rebuild_statistics():
+    """Recompute every counter from the tables (first start, and after bulk resets)"""
+    StatisticCounter.query.delete(synchronize_session=False)
+    ClassificationTotal.query.delete(synchronize_session=False)
+    SearchLatencyBucket.query.delete(synchronize_session=False)
+
+    _upsert_counter(DOCUMENTS, Document.query.count())
+    _upsert_counter(TOTAL_SIZE, db.session.query(db.func.sum(Document.file_size)).scalar() or 0)
+    for classification, count, size in db.session.query(Document.classification, db.func.count(Document.id),
+                                                        db.func.sum(Document.file_size)) \
+            .group_by(Document.classification):
+        _upsert_classification(classification, count, size or 0)
+
+    _upsert_counter(SEARCHES, 0)
+    _upsert_counter(SEARCH_TIME, 0)
+    since = datetime.utcnow() - timedelta(minutes=max(LATENCY_WINDOWS.values()))
+    record_searches([(search_time, (timestamp - datetime(1970, 1, 1)).total_seconds())
+                     for timestamp, search_time in db.session.query(SearchLog.timestamp, SearchLog.search_time)
+                     .filter(SearchLog.timestamp >= since).yield_per(1000)])
+    # Older searches only count towards the all-time totals
+    older_count, older_time = db.session.query(db.func.count(SearchLog.id), db.func.sum(SearchLog.search_time)) \
+        .filter(db.or_(SearchLog.timestamp < since, SearchLog.timestamp.is_(None))).one()
+    _upsert_counter(SEARCHES, older_count or 0)
+    _upsert_counter(SEARCH_TIME, older_time or 0)
+
+    _upsert_counter(INITIALIZED, 1)
+
+
+def ensure_statistics():
+    """Build the counters once for databases created before they existed"""
+    if db.session.get(StatisticCounter, INITIALIZED) is None:
+        rebuild_statistics()
+        db.session.commit()
+        print("Statistics counters rebuilt from the database")
+
+
+def get_statistics_snapshot(session=None):
+    """Counters, classification distribution and rolling latency windows, without scanning any table"""
+    session = session or db.session
+    counters = dict(session.query(StatisticCounter.name, StatisticCounter.value).all())
+    classification_distribution = {row.classification: row.document_count
+                                   for row in session.query(ClassificationTotal)
+                                   .order_by(ClassificationTotal.classification)
+                                   if row.classification and row.document_count > 0}
+    return {
+        'total_documents': int(counters.get(DOCUMENTS, 0)),
+        'total_size_bytes': int(counters.get(TOTAL_SIZE, 0)),
+        'classification_distribution': classification_distribution,
+        'total_searches': int(counters.get(SEARCHES, 0)),
+        'total_search_time': counters.get(SEARCH_TIME, 0.0),
+        'search_latency': {name: latency_summary(minutes, session=session)
+                           for name, minutes in LATENCY_WINDOWS.items()}
+    }
@@ -0,0 +1,134 @@
+from flask import current_app
+from flask.globals import app_ctx
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
+from src.models.user import db
+from src.models.document import DocumentContent, TEXT_CODECS, decompress_text
+
+READ_ENGINE_KEY = 'read_only_engine'
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+_read_sessions = scoped_session(sessionmaker(autoflush=False, expire_on_commit=False),
+                                scopefunc=lambda: id(app_ctx._get_current_object()))
+
+
+def sqlite_database_path(uri):
+    """Filesystem path of a file-backed SQLite URI, or None for other databases and in-memory SQLite"""
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMA statements run on every new connection, from the SQLITE_* settings"""
+    synchronous = str(config.get('SQLITE_SYNCHRONOUS', 'NORMAL')).upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {sorted(SYNCHRONOUS_MODES)}')
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size = -{int(config.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+        f"PRAGMA mmap_size = {int(config.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # WAL lets readers keep reading from the last committed snapshot while a write is in progress;
+        # synchronous=NORMAL is durable across application crashes in WAL mode
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+        pragmas.append(f"PRAGMA synchronous = {synchronous}")
+    return pragmas
+
+
+def install_pragmas(engine, pragmas):
+    """Run the pragmas on each connection the engine opens"""
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def install_sql_functions(engine):
+    """Register document_text(body, codec), which decompresses document_contents in SQL (FTS, projections)"""
+    @event.listens_for(engine, 'connect')
+    def register_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('document_text', 2, decompress_text, deterministic=True)
+
+
+def create_read_engine(path, config):
+    """Engine over the same SQLite file, opened read-only, with its own connection pool"""
+    connect_args = {'check_same_thread': False, 'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000.0}
+    engine = create_engine(f'sqlite:///file:{path}?mode=ro&uri=true', connect_args=connect_args,
+                           pool_size=config.get('SQLITE_READ_POOL_SIZE', 10),
+                           max_overflow=config.get('SQLITE_READ_MAX_OVERFLOW', 10),
+                           pool_timeout=config.get('SQLITE_POOL_TIMEOUT', 30))
+    install_pragmas(engine, sqlite_pragmas(config, read_only=True))
+    install_sql_functions(engine)
+    return engine
+
+
+def configure_storage(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS for file-backed SQLite; call before db.init_app"""
+    config = app.config
+    if sqlite_database_path(config['SQLALCHEMY_DATABASE_URI']) is None:
+        return
+    options = config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    connect_args = options.setdefault('connect_args', {})
+    # sqlite3's own lock wait, in seconds; the busy_timeout pragma sets the same limit on the connection
+    connect_args.setdefault('timeout', config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000.0)
+    # Pooled connections are handed between request, ingestion and log writer threads
+    connect_args.setdefault('check_same_thread', False)
+    options.setdefault('pool_size', config.get('SQLITE_POOL_SIZE', 5))
+    options.setdefault('max_overflow', config.get('SQLITE_MAX_OVERFLOW', 5))
+    options.setdefault('pool_timeout', config.get('SQLITE_POOL_TIMEOUT', 30))
+
+
+def init_storage(app):
+    """Install the connection pragmas and create the read-only engine; call after db.init_app, before any query"""
+    config = app.config
+    codec = config.get('DOCUMENT_TEXT_CODEC', DocumentContent.codec_for_new_rows)
+    if codec not in TEXT_CODECS:
+        raise ValueError(f'DOCUMENT_TEXT_CODEC must be one of {TEXT_CODECS}')
+    DocumentContent.codec_for_new_rows = codec
+
+    if make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'sqlite':
+        with app.app_context():
+            install_sql_functions(db.engine)
+    path = sqlite_database_path(config['SQLALCHEMY_DATABASE_URI'])
+    if path is None:
+        return
+    with app.app_context():
+        install_pragmas(db.engine, sqlite_pragmas(config))
+        # Switch the file to WAL before any read-only connection opens it (journal_mode is persistent)
+        with db.engine.connect():
+            pass
+    if config.get('SQLITE_READ_ONLY_ENGINE', True):
+        app.extensions[READ_ENGINE_KEY] = create_read_engine(path, config)
+        app.teardown_appcontext(_remove_read_session)
+
+
+def _remove_read_session(exception=None):
+    _read_sessions.remove()
+
+
+def read_session():
+    """Session for read-only endpoints, bound to the read-only engine when there is one.
+
+    Reads on it never take the database write lock, and in WAL mode they are
+    not blocked by a writer. Falls back to db.session when read-only engines
+    are disabled or the database is not a SQLite file.
+    """
+    engine = current_app.extensions.get(READ_ENGINE_KEY)
+    if engine is None:
+        return db.session
+    if not _read_sessions.registry.has():
+        return _read_sessions(bind=engine)
+    return _read_sessions()
+
@@ -0,0 +1,100 @@
+import os
+import time
+import uuid
+import hashlib
+
+CHUNK_SIZE = 64 * 1024
+TEMP_DIR = '.tmp'
+# Temp files older than this are leftovers of interrupted uploads
+STALE_TEMP_SECONDS = 3600
+
+
+def save_stream(stream, file_path, chunk_size=CHUNK_SIZE, sync=False):
+    """Copy a stream to disk in fixed-size chunks, hashing it on the way.
+
+    Returns (size in bytes, SHA-256 hex digest) so callers never have to
+    re-read the file. With sync=True the data is flushed to disk before
+    returning.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as output:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            output.write(chunk)
+            size += len(chunk)
+        if sync:
+            output.flush()
+            os.fsync(output.fileno())
+    return size, sha256.hexdigest()
+
+
+def hash_file(file_path, chunk_size=CHUNK_SIZE):
+    """SHA-256 hex digest of a file already on disk"""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class UploadStore:
+    """Uploaded files stored by content at <root>/<h[0:2]>/<h[2:4]>/<sha256><ext>.
+
+    An upload is streamed into a temporary file under <root>/.tmp while its
+    size and hash are computed, then renamed into its content-addressed
+    path in one step, so a file is either absent or complete. Uploads with
+    the same name never overwrite each other, and identical content is
+    stored once.
+    """
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def configure(self, chunk_size=None):
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+    def path_for(self, content_hash, extension):
+        return os.path.join(self.root, content_hash[:2], content_hash[2:4], content_hash + extension.lower())
+
+    def save(self, stream, filename):
+        """Store a stream; returns (file_path, size, content_hash)"""
+        temp_dir = os.path.join(self.root, TEMP_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        temp_path = os.path.join(temp_dir, uuid.uuid4().hex)
+        try:
+            size, content_hash = save_stream(stream, temp_path, self.chunk_size, sync=True)
+            file_path = self.path_for(content_hash, os.path.splitext(filename)[1])
+            if os.path.exists(file_path):
+                # Same content already stored
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return file_path, size, content_hash
+
+    def remove_stale_temp_files(self, max_age=STALE_TEMP_SECONDS):
+        """Delete temp files left by uploads interrupted before their rename"""
+        temp_dir = os.path.join(self.root, TEMP_DIR)
+        if not os.path.isdir(temp_dir):
+            return 0
+        removed = 0
+        cutoff = time.time() - max_age
+        for name in os.listdir(temp_dir):
+            path = os.path.join(temp_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed